@@ -0,0 +1,245 @@
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from prettytable import PrettyTable
+
+from mechabellum_replay_parser import (
+    BattleRecord,
+    DeploymentTracker,
+    battle_record_to_string,
+    extract_xml,
+    parse_battle_record,
+    write_battle_record,
+)
+
+# The replay generator lives with the tests, it is not part of the installed package.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+from synthetic import write_replays
+
+# Replay shapes benchmarked, passed to build_replay_bytes.
+SCENARIOS: Dict[str, dict] = {
+    "short": {"rounds": 8, "unit_count": 15},
+    "typical": {"rounds": 16, "unit_count": 40, "actions_per_round": 15},
+    "long": {"rounds": 30, "unit_count": 80, "actions_per_round": 30},
+    "late-observer": {"rounds": 16, "unit_count": 40, "first_round": 9},
+}
+
+
+def _extract_xml(paths: List[Path], records: List[BattleRecord]) -> None:
+    for path in paths:
+        extract_xml(path)
+
+
+def _parse(paths: List[Path], records: List[BattleRecord]) -> None:
+    for path in paths:
+        parse_battle_record(path)
+
+
+def _parse_streaming(paths: List[Path], records: List[BattleRecord]) -> None:
+    for path in paths:
+        parse_battle_record(path, streaming=True)
+
+
+def _deployments(paths: List[Path], records: List[BattleRecord]) -> None:
+    for record in records:
+        for player in record.player_records:
+            DeploymentTracker.from_record_list(
+                player.version, player.starting_officer, player.round_records
+            )
+
+
+def _render(paths: List[Path], records: List[BattleRecord]) -> None:
+    for record in records:
+        str(battle_record_to_string(record))
+
+
+def _render_stream(paths: List[Path], records: List[BattleRecord]) -> None:
+    for record in records:
+        write_battle_record(record, io.StringIO())
+
+
+def _render_plain(paths: List[Path], records: List[BattleRecord]) -> None:
+    for record in records:
+        write_battle_record(record, io.StringIO(), plain=True)
+
+
+BENCHMARKS: Dict[str, Callable[[List[Path], List[BattleRecord]], None]] = {
+    "extract_xml": _extract_xml,
+    "parse": _parse,
+    "parse_streaming": _parse_streaming,
+    "deployments": _deployments,
+    "render": _render,
+    "render_stream": _render_stream,
+    "render_plain": _render_plain,
+}
+
+
+def run_benchmark(
+    benchmark: Callable[[List[Path], List[BattleRecord]], None],
+    paths: List[Path],
+    records: List[BattleRecord],
+    repeat: int,
+) -> Dict[str, float]:
+    # The best of several runs is the least disturbed by the rest of the machine.
+    best = min(_timed(benchmark, paths, records) for _ in range(repeat))
+    megabytes = sum(path.stat().st_size for path in paths) / (1024 * 1024)
+
+    # Measured separately since tracing allocations slows everything down.
+    tracemalloc.start()
+    try:
+        benchmark(paths, records)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "replays_per_s": len(paths) / best,
+        "mb_per_s": megabytes / best,
+        "peak_kib": peak / 1024,
+    }
+
+
+def _timed(benchmark, paths: List[Path], records: List[BattleRecord]) -> float:
+    start = time.perf_counter()
+    benchmark(paths, records)
+    return time.perf_counter() - start
+
+
+def run_suite(
+    scenarios: List[str], benchmarks: List[str], replays: int, repeat: int
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario in scenarios:
+            paths = write_replays(
+                Path(directory) / scenario, replays, **SCENARIOS[scenario]
+            )
+            records = [parse_battle_record(path) for path in paths]
+            results[scenario] = {
+                name: run_benchmark(BENCHMARKS[name], paths, records, repeat)
+                for name in benchmarks
+            }
+    return results
+
+
+def _environment() -> Dict[str, str]:
+    try:
+        version = metadata.version("mechabellum-replay-parser")
+    except metadata.PackageNotFoundError:
+        version = "unknown"
+    return {
+        "parser": version,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+
+def display(results, baseline=None, threshold: float = 0.1) -> bool:
+    """Prints the results, returns True if any benchmark regressed past threshold."""
+    field_names = ["Scenario", "Benchmark", "Replays/s", "MB/s", "Peak KiB"]
+    if baseline is not None:
+        field_names += ["Replays/s vs baseline", "Peak vs baseline"]
+    table = PrettyTable()
+    table.field_names = field_names
+    table.align = "r"
+
+    regressed = False
+    for scenario, benchmarks in results.items():
+        for name, numbers in benchmarks.items():
+            row = [
+                scenario,
+                name,
+                f"{numbers['replays_per_s']:.1f}",
+                f"{numbers['mb_per_s']:.2f}",
+                f"{numbers['peak_kib']:.0f}",
+            ]
+            if baseline is not None:
+                base = baseline.get(scenario, {}).get(name)
+                if base is None:
+                    row += ["new", "new"]
+                else:
+                    # Positive means better for throughput, worse for memory.
+                    speed = numbers["replays_per_s"] / base["replays_per_s"] - 1
+                    memory = numbers["peak_kib"] / max(base["peak_kib"], 1) - 1
+                    slower = speed < -threshold
+                    bigger = memory > threshold
+                    regressed = regressed or slower or bigger
+                    row += [
+                        f"{speed:+.1%}" + (" !" if slower else ""),
+                        f"{memory:+.1%}" + (" !" if bigger else ""),
+                    ]
+            table.add_row(row)
+    print(table)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parser on synthetic replays."
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Replay shape to benchmark, can be repeated. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=list(BENCHMARKS),
+        help="Benchmark to run, can be repeated. Defaults to all of them.",
+    )
+    parser.add_argument(
+        "--replays", type=int, default=20, help="Replays generated per scenario."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed runs, the best one is kept."
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--compare",
+        help="Compare against results saved with --save, exits with 1 on a regression.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative change counted as a regression when comparing (default 0.1).",
+    )
+    args = parser.parse_args()
+
+    results = run_suite(
+        args.scenario or list(SCENARIOS),
+        args.benchmark or list(BENCHMARKS),
+        args.replays,
+        args.repeat,
+    )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            saved = json.load(file)
+        print(f"Baseline: {saved['environment']}")
+        baseline = saved["results"]
+    regressed = display(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(
+                {"environment": _environment(), "results": results}, file, indent=4
+            )
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 import argparse
 import os
-import statistics
 import unicodedata
 
+from array import array
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Tuple
 from collections import Counter
+from pathlib import Path
 
-from mechabellum_replay_parser import parse_battle_record
+try:
+    import numpy
+except ImportError:
+    # The group sums fall back to plain loops, which are linear but much slower.
+    numpy = None
+
+from mechabellum_replay_parser.bulk import parse_battle_records
+from mechabellum_replay_parser.cache import ParseCache
+from mechabellum_replay_parser.database import connect, ingest_replays
 
 
 def get_display_width(text: str) -> int:
@@ -21,12 +30,43 @@ def pad_text(text: str, width: int) -> str:
     return text + " " * pad_size
 
 
+AGGRO_MEAN_Y_DISTANCE = 120
+
+
+def group_sums(keys: Sequence[int], values: Optional[Sequence], groups: int):
+    """Sums values by their key, keys being indexes below groups.
+
+    Without values the keys are counted. Uses numpy when it is installed.
+    """
+    if numpy is not None:
+        return numpy.bincount(
+            numpy.asarray(keys),
+            weights=None if values is None else numpy.asarray(values),
+            minlength=groups,
+        )
+    sums = [0] * groups
+    if values is None:
+        for key in keys:
+            sums[key] += 1
+    else:
+        for key, value in zip(keys, values):
+            sums[key] += value
+    return sums
+
+
 @dataclass
 class Report:
+    """Mean y distance of each player of each replay, stored as columns."""
+
     successful: List[str] = field(default_factory=list)
     failed: Dict[str, str] = field(default_factory=dict)
-    player_statistics: List[Dict[str, str]] = field(default_factory=list)
-    game_styles: List[str] = field(default_factory=list)
+    replays: List[str] = field(default_factory=list)
+    # One entry per player of a replay.
+    player_replay: array = field(default_factory=lambda: array("q"))
+    player_name: List[str] = field(default_factory=list)
+    player_mean_y: array = field(default_factory=lambda: array("d"))
+    # Mean y distance of all units by round number, over every replay.
+    round_mean_y: Dict[int, float] = field(default_factory=dict)
 
     def add_success(self, file_path: str):
         self.successful.append(file_path)
@@ -34,33 +74,39 @@ class Report:
     def add_failure(self, file_path: str, error: str):
         self.failed[file_path] = error
 
-    def add_player_stat(
-        self, replay_name: str, player_name: str, mean_y_distance: float
-    ):
-        style = "aggro" if mean_y_distance < 120 else "standard"
-        self.player_statistics.append(
-            {
-                "replay": replay_name,
-                "player": player_name,
-                "mean_y_distance": mean_y_distance,
-                "style": style,
-            }
-        )
+    def add_replay(self, replay_name: str) -> int:
+        self.replays.append(replay_name)
+        return len(self.replays) - 1
 
-    def classify_game(self, replay_name: str):
-        styles = [
-            stat["style"]
-            for stat in self.player_statistics
-            if stat["replay"] == replay_name
+    def add_player_stat(self, replay: int, player_name: str, mean_y_distance: float):
+        self.player_replay.append(replay)
+        self.player_name.append(player_name)
+        self.player_mean_y.append(mean_y_distance)
+
+    @property
+    def player_styles(self) -> List[str]:
+        return [
+            "aggro" if mean_y < AGGRO_MEAN_Y_DISTANCE else "standard"
+            for mean_y in self.player_mean_y
         ]
-        if len(styles) == 2:
-            styles_sorted = sorted(styles)
-            if styles_sorted[0] == styles_sorted[1] == "aggro":
-                self.game_styles.append("headbutt")
-            elif styles_sorted[0] == styles_sorted[1] == "standard":
-                self.game_styles.append("standard")
-            else:
-                self.game_styles.append("aggro vs defense")
+
+    @property
+    def game_styles(self) -> List[str]:
+        """Classifies every replay with two players by counting its aggro players."""
+        groups = len(self.replays)
+        players = group_sums(self.player_replay, None, groups)
+        aggro = group_sums(
+            self.player_replay,
+            [mean_y < AGGRO_MEAN_Y_DISTANCE for mean_y in self.player_mean_y],
+            groups,
+        )
+        styles = []
+        for player_count, aggro_count in zip(players, aggro):
+            if player_count == 2:
+                styles.append(
+                    ("standard", "aggro vs defense", "headbutt")[int(aggro_count)]
+                )
+        return styles
 
     def display(self):
         print("\nProcessing Report:")
@@ -71,17 +117,17 @@ class Report:
         for file, error in self.failed.items():
             print(f"  - {file}: {error}")
 
-        if not self.player_statistics:
+        if not self.player_name:
             print("No valid data available.")
             return
 
         replay_col_width = max(
-            get_display_width(stat["replay"])
-            for stat in self.player_statistics + [{"replay": "Replay Name"}]
+            get_display_width(self.replays[replay])
+            for replay in set(self.player_replay)
         )
+        replay_col_width = max(replay_col_width, len("Replay Name"))
         player_col_width = max(
-            get_display_width(stat["player"])
-            for stat in self.player_statistics + [{"player": "Player Name"}]
+            get_display_width(name) for name in self.player_name + ["Player Name"]
         )
         distance_col_width = len("Mean Y Distance")
         style_col_width = len("Style")
@@ -91,18 +137,18 @@ class Report:
         print("\n" + header)
         print(separator)
 
-        mean_y_values = []
-        for stat in self.player_statistics:
+        for replay, player_name, mean_y_distance, style in zip(
+            self.player_replay, self.player_name, self.player_mean_y, self.player_styles
+        ):
             print(
-                f"{pad_text(stat['replay'], replay_col_width)} | "
-                f"{pad_text(stat['player'], player_col_width)} | "
-                f"{pad_text(str(round(stat['mean_y_distance'], 2)), distance_col_width)} | "
-                f"{pad_text(stat['style'], style_col_width)}"
+                f"{pad_text(self.replays[replay], replay_col_width)} | "
+                f"{pad_text(player_name, player_col_width)} | "
+                f"{pad_text(str(round(mean_y_distance, 2)), distance_col_width)} | "
+                f"{pad_text(style, style_col_width)}"
             )
-            mean_y_values.append(stat["mean_y_distance"])
 
         print(separator)
-        overall_mean = statistics.mean(mean_y_values)
+        overall_mean = sum(self.player_mean_y) / len(self.player_mean_y)
         print(
             f"{pad_text('Overall Mean Y Distance', replay_col_width + player_col_width + style_col_width + 6)} | "
             f"{pad_text(str(round(overall_mean, 2)), distance_col_width)}"
@@ -115,59 +161,238 @@ class Report:
             percentage = (count / total_games) * 100
             print(f"  {style}: {count} games ({percentage:.1f}%)")
 
+        if self.round_mean_y:
+            print("\nMean Y Distance by Round:")
+            for round_number, mean_y in sorted(self.round_mean_y.items()):
+                print(f"  {round_number}: {round(mean_y, 2)}")
+
+
+PlayerPositions = Tuple[str, int, array, array, array]
+
+
+def unit_y_positions(battle_record) -> List[PlayerPositions]:
+    """Runs in the parse workers so only positions are sent back, not the whole record.
+
+    Returns the name, the last round, the rounds with units on the board with the number
+    of units in each and the distance of every unit from the centre line, for each
+    player. The last round is the round of the final round record.
+    """
+    players = []
+    for player in battle_record.player_records:
+        rounds = array("q")
+        unit_counts = array("q")
+        y_positions = array("q")
+        if player.deployments and player.deployments.units:
+            for round_record, units in zip(
+                player.round_records, player.deployments.units
+            ):
+                count = len(y_positions)
+                for unit in units.units.values():
+                    if unit.position:
+                        y_positions.append(abs(unit.position.y))
+                if len(y_positions) > count:
+                    rounds.append(round_record.round)
+                    unit_counts.append(len(y_positions) - count)
+        last_round = player.round_records[-1].round if player.round_records else -1
+        players.append((player.name, last_round, rounds, unit_counts, y_positions))
+    return players
+
+
+@dataclass
+class PositionColumns:
+    """Unit positions of many replays gathered into flat columns.
+
+    Every (player, round) of every replay is a row of the player round columns and each
+    unit refers to its row by index, so all aggregates are group sums over the columns.
+    """
+
+    replays: List[str] = field(default_factory=list)
+    player_replay: array = field(default_factory=lambda: array("q"))
+    player_name: List[str] = field(default_factory=list)
+    # Player round row of each player's last round, -1 when it had no units.
+    player_last_row: array = field(default_factory=lambda: array("q"))
+    row_round: array = field(default_factory=lambda: array("q"))
+    unit_row: array = field(default_factory=lambda: array("q"))
+    unit_y: array = field(default_factory=lambda: array("q"))
+
+    def add_replay(self, replay_name: str, players: List[PlayerPositions]):
+        replay = len(self.replays)
+        self.replays.append(replay_name)
+        for player_name, last_round, rounds, unit_counts, y_positions in players:
+            if not player_name:
+                continue
+            first_row = len(self.row_round)
+            self.row_round.extend(rounds)
+            self.player_replay.append(replay)
+            self.player_name.append(player_name)
+            self.player_last_row.append(
+                len(self.row_round) - 1 if rounds and rounds[-1] == last_round else -1
+            )
+            # The units of a round are consecutive, their rows are repeated per round.
+            for row, count in enumerate(unit_counts, first_row):
+                self.unit_row.extend(array("q", [row]) * count)
+            self.unit_y.extend(y_positions)
+
+    def fill_report(self, report: Report):
+        row_count = len(self.row_round)
+        row_sums = group_sums(self.unit_row, self.unit_y, row_count)
+        row_units = group_sums(self.unit_row, None, row_count)
+
+        replay_indexes = {}
+        for replay, player_name, last_row in zip(
+            self.player_replay, self.player_name, self.player_last_row
+        ):
+            if last_row < 0:
+                continue
+            if replay not in replay_indexes:
+                replay_indexes[replay] = report.add_replay(self.replays[replay])
+            report.add_player_stat(
+                replay_indexes[replay],
+                player_name,
+                float(row_sums[last_row] / row_units[last_row]),
+            )
 
-def process_replay_files(directory: str, player_filter: str = None):
+        rounds = max(self.row_round, default=-1) + 1
+        round_sums = group_sums(self.row_round, row_sums, rounds)
+        round_units = group_sums(self.row_round, row_units, rounds)
+        report.round_mean_y = {
+            round_number: float(round_sums[round_number] / units)
+            for round_number, units in enumerate(round_units)
+            if units
+        }
+
+
+def process_replay_files(
+    directory: str,
+    player_filter: Optional[str] = None,
+    workers: Optional[int] = None,
+    cache: Optional[ParseCache] = None,
+):
     report = Report()
+    columns = PositionColumns()
 
     if not os.path.isdir(directory):
         print(f"Error: {directory} is not a valid directory.")
         return
 
-    for file_name in os.listdir(directory):
-        file_path = os.path.join(directory, file_name)
-        if not file_name.endswith(".grbr"):
+    file_paths = [
+        os.path.join(directory, file_name)
+        for file_name in os.listdir(directory)
+        if file_name.endswith(".grbr")
+    ]
+    for file_path, result in parse_battle_records(
+        file_paths, workers=workers, transform=unit_y_positions, cache=cache
+    ):
+        if isinstance(result, Exception):
+            report.add_failure(file_path, str(result))
             continue
-        try:
-            battle_record = parse_battle_record(file_path)
 
-            if player_filter and all(
-                player.name != player_filter for player in battle_record.player_records
-            ):
-                continue
-
-            report.add_success(file_path)
-
-            for player in battle_record.player_records:
-                if player.deployments and player.deployments.units:
-                    last_round_units = player.deployments.units[-1]
+        if player_filter and all(name != player_filter for name, *_ in result):
+            continue
 
-                    y_positions = [
-                        abs(unit.position.y)
-                        for unit in last_round_units.units.values()
-                        if unit.position
-                    ]
+        report.add_success(file_path)
+        columns.add_replay(os.path.basename(file_path), result)
 
-                    if y_positions and player.name:
-                        mean_y_distance = statistics.mean(y_positions)
-                        report.add_player_stat(file_name, player.name, mean_y_distance)
+    columns.fill_report(report)
+    report.display()
 
-            report.classify_game(file_name)
 
-        except Exception as e:
-            report.add_failure(file_path, str(e))
+LAST_ROUND_MEAN_Y_QUERY = """
+SELECT battles.file_name, players.name, AVG(ABS(deployments.y))
+FROM players
+JOIN battles ON battles.id = players.battle_id
+JOIN deployments ON deployments.battle_id = players.battle_id
+    AND deployments.player_id = players.player_id
+    AND deployments.round = players.last_round
+WHERE players.name != '' {player_filter}
+GROUP BY players.battle_id, players.player_id
+ORDER BY players.battle_id
+"""
+
+ROUND_MEAN_Y_QUERY = """
+SELECT deployments.round, AVG(ABS(deployments.y))
+FROM players
+JOIN deployments ON deployments.battle_id = players.battle_id
+    AND deployments.player_id = players.player_id
+WHERE players.name != '' {player_filter}
+GROUP BY deployments.round
+"""
+
+
+def process_database(database: str, player_filter: Optional[str] = None):
+    """Builds the same report as process_replay_files from a database made by ingest."""
+    report = Report()
+    connection = connect(database)
+    if player_filter:
+        condition = (
+            "AND players.battle_id IN (SELECT battle_id FROM players WHERE name = ?)"
+        )
+        parameters = (player_filter,)
+    else:
+        condition = ""
+        parameters = ()
+
+    previous_replay = None
+    for file_name, player_name, mean_y_distance in connection.execute(
+        LAST_ROUND_MEAN_Y_QUERY.format(player_filter=condition), parameters
+    ):
+        if file_name != previous_replay:
+            report.add_success(file_name)
+            replay = report.add_replay(file_name)
+            previous_replay = file_name
+        report.add_player_stat(replay, player_name, mean_y_distance)
+    report.round_mean_y = dict(
+        connection.execute(
+            ROUND_MEAN_Y_QUERY.format(player_filter=condition), parameters
+        )
+    )
+    connection.close()
 
     report.display()
 
 
 def main():
     parser = argparse.ArgumentParser(description="Process replay files in bulk.")
-    parser.add_argument("directory", help="Directory containing replay files.")
+    parser.add_argument(
+        "directory",
+        nargs="?",
+        help="Directory containing replay files. Optional with --database.",
+    )
     parser.add_argument(
         "--player", help="Only include replays involving this player name."
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes used to parse replays (default: all CPUs).",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path of a parse cache file, replays parsed before are loaded from it.",
+    )
+    parser.add_argument(
+        "--database",
+        help="Report from this replay database instead, new replays in the directory "
+        "are ingested into it first.",
+    )
     args = parser.parse_args()
 
-    process_replay_files(args.directory, player_filter=args.player)
+    if args.database:
+        if args.directory:
+            directory = Path(args.directory)
+            ingest_replays(
+                args.database, sorted(directory.glob("*.grbr")), workers=args.jobs
+            )
+        process_database(args.database, player_filter=args.player)
+        return
+    if not args.directory:
+        parser.error("a directory is required without --database")
+
+    cache = ParseCache(args.cache) if args.cache else None
+    process_replay_files(
+        args.directory, player_filter=args.player, workers=args.jobs, cache=cache
+    )
 
 
 if __name__ == "__main__":
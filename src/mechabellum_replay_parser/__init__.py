@@ -2,14 +2,53 @@ import xml.etree.ElementTree
 import xml.etree.ElementTree as ET
 import re
 import json
-import copy
-from dataclasses import dataclass, field
-from typing import List, Optional, Union, Dict, Any
-from prettytable import PrettyTable, ALL
+import bisect
+import dataclasses
+import functools
+import mmap
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import InitVar, dataclass, field
+from types import MappingProxyType
+from typing import (
+    List,
+    Optional,
+    Union,
+    Dict,
+    Any,
+    Iterator,
+    Tuple,
+    Callable,
+    Mapping,
+    Sequence,
+    Iterable,
+    TextIO,
+    BinaryIO,
+    TYPE_CHECKING,
+)
 from pathlib import Path
 
+from .lookups import DATA_DIR, LOOKUPS, LookupTables
+
+# Part of the package API, per version overrides are registered through it.
+from .lookups import LookupRegistry as LookupRegistry
+from .profiling import (
+    ACTIVE_PROFILE,
+    ParseProfile,
+    ProfileCallback,
+    count_end_events,
+    profile_count,
+    profile_stage,
+    profiled,
+)
+
+if TYPE_CHECKING:
+    # Only needed for the header date, scan_replay_header imports it once it reads one.
+    import datetime
+
 HERE = Path(__file__)
-DATA_DIR = HERE.parent / "data"
 
 
 def _load_data_file(name: str) -> dict[str, Any]:
@@ -17,448 +56,48 @@ def _load_data_file(name: str) -> dict[str, Any]:
         return json.load(filepath)
 
 
-COMMAND_TOWER_SKILLS = {
-    1: "Loan",
-    3: "Mass Recruit",
-    4: "Elite Recruit",
-    5: "Enhanced Range",
-    6: "High Mobility",
-}
+# The id to name tables are loaded from the data directory on first use, see
+# LookupRegistry. Code in this module reads them through _lookups() so that the
+# overrides for the game version being parsed apply.
+_ACTIVE_LOOKUPS: ContextVar[Optional[LookupTables]] = ContextVar(
+    "mechabellum_lookups", default=None
+)
 
-RESEARCH_TOWER_SKILLS = {
-    1: "Oil Bomb",
-    2: "Field Recovery",
-    3: "Mobile Beacon",
-    4: "Attack Enhancement",
-    5: "Defense Enhancement",
-    401: "Attack Enhancement II",
-    501: "Defense Enhancement II",
-}
 
-OFFICER_LOOKUP = {
-    # Starting Specialists
-    10002: "Supply Specialist",
-    10010: "Quick Supply Specialist",
-    10011: "Missile Specialist",
-    10013: "Amplify Specialist",
-    10014: "Training Specialist",
-    20005: "Giant Specialist",
-    20021: "Aerial Specialist",
-    20024: "Speed Specialist",
-    20029: "Marksman Specialist",
-    20032: "Elite Specialist",
-    20036: "Sabertooth Specialist",
-    20037: "Farseer Specialist",
-    20033: "Rhino Specialist",
-    20034: "Cost Control Specialist",
-    20035: "Heavy Armor Specialist",
-    20038: "Fire Badger Specialist",
-    20039: "Typhoon Specialist",
-    # Other "officers" which are a combination of
-    # unit upgrade cards and what used to be specialists.
-    10001: "Quick Cooldown",
-    10003: "Super Supply Enhancement",
-    10004: "Additional Deployment Slot",
-    10007: "Advanced Shield Device",
-    10008: "Advanced Missile Device",
-    10009: "Quick Teleport",
-    20001: "Advanced Defense Tactics",
-    20002: "Advanced Offensive Tactics",
-    20003: "Efficient Tech Research",
-    20004: "Advanced Power System",
-    20006: "Advanced Targeting System",
-    20007: "Supply Enhancement",
-    20022: "Efficient Giant Manufacturing",
-    20023: "Efficient Light Manufacturing",
-    30101: "Mass Produced Fortress",
-    30102: "Assault Fortress",
-    30104: "Improved Fortress",
-    30105: "Extended Range Fortress",
-    30201: "Extended Range Marksman",
-    30202: "Smart Marksman",
-    30203: "Subsidized Marksman",
-    30204: "Elite Marksman",
-    30301: "Extended Range Vulcan",
-    30302: "Assault Vulcan",
-    30401: "Assault Melting Point",
-    30402: "Improved Melting Point",
-    30403: "Mass Produced Melting Point",
-    30501: "Mass Produced Rhino",
-    30502: "Berserk Rhino",
-    30503: "Elite Rhino",
-    30601: "Mass Produced Wasp",
-    30602: "Improved Wasp",
-    30604: "Elite Wasp",
-    30701: "Subsidized Mustang",
-    30702: "Fortified Mustang",
-    30703: "Elite Mustang",
-    30801: "Subsidized Steel Ball",
-    30803: "Improved Steel Ball",
-    30804: "Elite Steel Ball",
-    30901: "Elite Fang",
-    30902: "Assault Fang",
-    31001: "Subsidized Crawler",
-    31002: "Elite Crawler",
-    31101: "Fortified Overlord",
-    31102: "Mass Produced Overlord",
-    31104: "Improved Overlord",
-    31201: "Assault Stormcaller",
-    31202: "Extended Range Stormcaller",
-    31203: "Subsidized Stormcaller",
-    31301: "Mass Produced Sledgehammer",
-    31302: "Extended Range Sledgehammer",
-    31304: "Improved Sledgehammer",
-    31305: "Elite Sledgehammer",
-    31402: "Fortified Hacker",
-    31403: "Elite Hacker",
-    31501: "Subsidized Arclight",
-    31502: "Smart Arclight",
-    31503: "Fortified Arclight",
-    31504: "Extended Range Arclight",
-    31601: "Mass Produced Phoenix",
-    31602: "Extended Range Phoenix",
-    31603: "Improved Phoenix",
-    31604: "Elite Phoenix",
-    31701: "Extended Range War Factory",
-    31702: "Improved War Factory",
-    31801: "Mass Produced Wraith",
-    31802: "Improved Wraith",
-    31901: "Assault Scorpion",
-    31902: "Mass Produced Scorpion",
-    31903: "Improved Scorpion",
-    32301: "Improved Sandworm",
-    32302: "Mass Produced Sandworm",
-    32401: "Improved Tarantula",
-    32402: "Elite Tarantula",
-    32501: "Extended Range Phantom Ray",
-}
+def _lookups() -> LookupTables:
+    return _ACTIVE_LOOKUPS.get() or LOOKUPS.base
 
-SKILL_LOOKUP = {
-    100002: "Incendiary Bomb",
-    200001: "Electromagnetic Impact",
-    200002: "Electromagnetic Blast",
-    200003: "Photon Emission",
-    300001: "Missile Strike",
-    300003: "Orbital Bombardment",
-    300004: "Nuke",
-    300005: "Lightning Storm",
-    300006: "Ion Blast",
-    300007: "Orbital Javelin",
-    400002: "Sticky Oil Bomb Tower",
-    400003: "Sticky Oil Bomb Spell",
-    500002: "Acid Blast",
-    600002: "Smoke Bomb",
-    800001: "Shield Airdrop",
-    900001: "Field Recovery",
-    1000001: "Redeployment",
-    1100001: "Intensive Training",
-    1200001: "Underground Threat",
-    1200002: "Rhino Assault",
-    1200003: "Wasp Swarm",
-    1200004: "Mobilize Battleship",
-    1200005: "Vulcan's Descent",
-    1500001: "Mobile Beacon Tower",
-    1500002: "Mobile Beacon Spell",
-}
 
-ITEM_LOOKUP = {
-    1305003: "Photon Coating",
-    1306001: "Tank Production Line",
-    1306002: "Mustang Production Line",
-    1306003: "Steel Ball Production Line",
-    1307001: "Barrier",
-    1308001: "Anti Interference Module",
-    1309001: "Absorption Module",
-    13010001: "Portable Shield",
-    13020001: "Nano Repair Kit",
-    13030001: "Laser Sights",
-    13030002: "Heavy Armor",
-    13030003: "Improved Firepower Control System",
-    13030004: "Enhancement Module",
-    13030005: "Haste Module",
-    13030006: "Super Heavy Armor",
-    13030007: "Amplifying Core",
-    13040001: "Deployment Module",
+# The tables used to be module level dicts, they are still available under those names.
+_TABLE_ATTRIBUTES = {
+    "COMMAND_TOWER_SKILLS": "command_tower_skills",
+    "RESEARCH_TOWER_SKILLS": "research_tower_skills",
+    "OFFICER_LOOKUP": "officers",
+    "SKILL_LOOKUP": "skills",
+    "ITEM_LOOKUP": "items",
+    "CARD_LOOKUP": "cards",
+    "CONTRAPTION_LOOKUP": "contraptions",
+    "UNIT_LOOKUP": "units",
+    "UNIT_DATA": "unit_data",
+    "TECH_LOOKUP": "techs",
 }
 
-# Pool of all reinforcement card selections a player can make not including unit reinforcements.
-CARD_LOOKUP = {
-    0: "Skip",
-    **ITEM_LOOKUP,
-    **SKILL_LOOKUP,
-    **OFFICER_LOOKUP,
-}
 
-CONTRAPTION_LOOKUP = {
-    30001: "Missile Interceptor",
-    20001: "Sentry Missile",
-    10001: "Shield Generator",
-}
-
-UNIT_LOOKUP = {
-    1: "fortress",
-    2: "marksmen",
-    3: "vulcan",
-    4: "melting point",
-    5: "rhino",
-    6: "wasp",
-    7: "mustang",
-    8: "steel ball",
-    9: "fang",
-    10: "crawler",
-    11: "overlord",
-    12: "stormcaller",
-    13: "sledgehammer",
-    14: "hacker",
-    15: "arclight",
-    16: "phoenix",
-    17: "warfactory",
-    18: "wraith",
-    19: "scorpion",
-    20: "fire badger",
-    21: "sabertooth",
-    22: "typhoon",
-    23: "sandworm",
-    24: "tarantula",
-    25: "phantom ray",
-    26: "farseer",
-    27: "raiden",
-    28: "hound",
-    29: "abyss",
-}
+def __getattr__(name: str) -> Any:
+    table = _TABLE_ATTRIBUTES.get(name)
+    if table is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(LOOKUPS.base, table)
 
-UNIT_DATA = _load_data_file("unit_data.json")
-
-TECH_LOOKUP = {
-    # Crawler techs
-    10510: "Mechanical rage",
-    180110: "Replicate",
-    2610: "Subterranean blitz",
-    2710: "Acidic explosion",
-    10710: "Impact drill",
-    3510: "Loose formation",
-    # Fang techs
-    180209: "Ignite",
-    10209: "Range enhancement",
-    10509: "Mechanical rage",
-    209: "Portable shield",
-    10609: "Armor piercing bullets",
-    # Fortress techs
-    1001: "Barrier",
-    10201: "Range enhancement",
-    1105: "Anti air barrage",
-    1201: "Fang production",
-    10301: "Launcher overload",
-    10801: "Elite marksman",
-    701: "Doubleshot",
-    3001: "Armor enhancement",
-    110201: "Rocket punch",
-    # Marksman techs
-    702: "Doubleshot",
-    10202: "Range enhancement",
-    10402: "Quick reload",
-    1802: "Electromagnetic shot",
-    10802: "Elite marksman",
-    1202: "Shooting squad",
-    10102: "Assault mode",
-    3202: "Aerial specialisation",
-    # Vulcan techs
-    180203: "Ignite",
-    10203: "Range enhancement",
-    1103: "Incendiary bomb",
-    10603: "Scorching fire",
-    1203: "Best partner",
-    11010: "Sticky oil bomb",
-    3003: "Armor enhancement",
-    # Melting point techs
-    304: "Energy absorption",
-    10204: "Range enhancement",
-    1107: "Energy diffraction",
-    1106: "Electromagnetic barrage",
-    1204: "Crawler production",
-    3004: "Armor enhancement",
-    # Rhino techs
-    1109: "Whirlwind",
-    180305: "Photon coating",
-    905: "Field maintenance",
-    2805: "Final blitz",
-    10505: "Mechanical rage",
-    2305: "Wreckage recycling",
-    2505: "Power armor",
-    3005: "Armor enhancement",
-    # Wasp techs
-    206: "Energy shield",
-    10206: "Range enhancement",
-    1606: "Jump drive",
-    506: "Ground specialization",
-    10806: "Elite marksman",
-    180206: "Ignite",
-    1806: "Electromagnetic shot",
-    406: "High explosive ammo",
-    10606: "Armor piercing bullets",
-    3206: "Aerial specialization",
-    # Mustang techs
-    3307: "Missile interceptor",
-    10207: "Range enhancement",
-    407: "High explosive ammo",
-    3207: "Aerial specialization",
-    10607: "Armor piercing bullets",
-    # Steel ball techs
-    308: "Energy absorption",
-    608: "Damage sharing",
-    10208: "Range enhancement",
-    1308: "Mechanical division",
-    3008: "Armor enhancement",
-    2408: "Fortified target lock",
-    # Overlord techs
-    1108: "Overlord artillery",
-    10311: "Launcher overload",
-    1211: "Mothership",
-    1611: "Jump drive",
-    180311: "Photon emission",
-    10211: "Range enhancement",
-    3011: "Armor enhancement",
-    911: "Field maintenance",
-    411: "High explosive ammo",
-    # Stormcaller techs
-    812: "Incendiary bomb",
-    10212: "Range enhancement",
-    10312: "Launcher overload",
-    412: "High explosive ammo",
-    1812: "Electromagnetic explosion",
-    10912: "High explosive anti tank shells",
-    # Sledgehammer techs
-    913: "Field maintenance",
-    613: "Damage sharing",
-    10513: "Mechanical rage",
-    10213: "Range enhancement",
-    1813: "Electromagnetic shot",
-    10613: "Armor piercing bullets",
-    3013: "Armor enhancement",
-    # Hacker techs
-    11014: "Multi control",
-    1014: "Barrier",
-    10214: "Range enhancement",
-    1714: "Enhanced control",
-    1814: "Electromagnetic interference",
-    # Arclight techs
-    10215: "Range enhancement",
-    1815: "Electromagnetic shot",
-    10915: "Charged shot",
-    3015: "Armor enhancement",
-    3115: "Anti aircraft ammunition",
-    10815: "Elite marksman",
-    # Phoenix techs
-    2916: "Quantum reassembly",
-    10216: "Range enhancement",
-    10316: "Launcher overload",
-    216: "Energy shield",
-    1616: "Jump drive",
-    1816: "Electromagnetic shot",
-    10816: "Elite marksman",
-    10916: "Charged shot",
-    # War factory techs
-    10217: "Range enhancement",
-    3417: "Efficient maintenance",
-    12017: "Phoenix production",
-    12117: "Steel ball production",
-    12217: "Sledgehammer production",
-    3317: "Missile interceptor",
-    10317: "Launcher overload",
-    180317: "Photon coating",
-    3017: "Armor enhancement",
-    417: "High explosive ammo",
-    # Wraith techs
-    110181: "Floating artillery array",
-    10218: "Range enhancement",
-    3018: "Armor enhancement",
-    180418: "Degeneration beam",
-    918: "Field maintenance",
-    418: "High explosive ammo",
-    # Scorpion techs
-    180519: "Acid attack",
-    10019: "Siege mode",
-    10219: "Range enhancement",
-    719: "Doubleshot",
-    919: "Field maintenance",
-    3019: "Armor enhancement",
-    # Fire badger techs
-    10220: "Range enhancement",
-    820: "Napalm",
-    180220: "Ignite",
-    920: "Field maintenance",
-    10620: "Scorching fire",
-    # Sabertooth techs
-    10221: "Range enhancement",
-    10321: "Field maintenance",
-    3321: "Missile interceptor",
-    721: "Doubleshot",
-    110211: "Secondary Armament",
-    # Typhoon techs
-    3022: "Mechanical rage",
-    3222: "Aerial specialisation",
-    1022: "Barrier",
-    11022: "Homing missile",
-    # Sandworm techs
-    10523: "Mechanical rage",
-    3023: "Armor enhancement",
-    13023: "Mechanical division",
-    3123: "Anti aerial",
-    923: "Burrow maintenance",
-    3623: "Replicate",
-    3723: "Sandstorm",
-    3823: "Strike",
-    # Tarantula techs
-    11024: "Spider mine",
-    10224: "Range enhancement",
-    10524: "Mechanical rage",
-    10624: "Armor piercing bullets",
-    924: "Field maintenance",
-    3024: "Armor enhancement",
-    3124: "Anti aircraft ammunition",
-    424: "High explosive ammo",
-    # Farseer techs
-    180326: "Photon emission",
-    180526: "Scanning radar",
-    3326: "Missile interceptor",
-    1826: "Electromagnetic explosion",
-    10226: "Range enhancement",
-    # Phantom ray techs
-    725: "Burst mode",
-    10225: "Range enhancement",
-    3025: "Armor enhancement",
-    11025: "Sticky oil bomb",
-    3925: "Stealth cloak",
-    425: "High explosive ammo",
-    225: "Energy shield",
-    # Raiden techs
-    10227: "Range enhancement",
-    4027: "Chain",
-    110271: "Fork",
-    1827: "Electromagnetic Shot",
-    4127: "Ionization",
-    # Hound techs
-    10228: "Mechanical rage",
-    10528: "Enhanced range",
-    4228: "Fire extinguisher",
-    11028: "Incendiary bomb",
-    3028: "Armor enhancement",
-    # Abyss techs
-    10299: "Range enhancement",
-    12029: "Dark companion",
-    3429: "Efficient maintenance",
-    11029: "Disintegration",
-    110291: "Swarm missiles",
-    4329: "Vertical sweep",
-    2329: "Wreckage recycling",
-    180329: "Photon coating",
-}
 
 # 2001 death knell
 # 2002 mountain
 
+# A long replay produces tens of thousands of the classes below, so they are slotted
+# to drop the per instance __dict__.
 
-@dataclass
+
+@dataclass(slots=True)
 class Point:
     x: int
     y: int
@@ -475,7 +114,7 @@ class Point:
         return cls(0, 0)
 
 
-@dataclass
+@dataclass(slots=True)
 class Unit:
     unit_name: str
     ident: int
@@ -487,16 +126,17 @@ class Unit:
 
     @classmethod
     def from_xml(cls, unit_element: xml.etree.ElementTree.Element) -> "Unit":
+        ident = int(unit_element.find("id").text)
         return cls(
-            unit_name=UNIT_LOOKUP.get(int(unit_element.find("id").text)),
-            ident=int(unit_element.find("id").text),
+            unit_name=_lookups().units.get(ident),
+            ident=ident,
             sell_supply=int(unit_element.find("SellSupply").text),
             position=Point.from_xml(unit_element.find("Position")),
         )
 
     @classmethod
     def from_name(cls, name: str) -> "Unit":
-        data = UNIT_DATA.get(name)
+        data = _lookups().unit_data.get(name)
 
         return cls(
             unit_name=name,
@@ -507,66 +147,86 @@ class Unit:
 
     def set_level(self, level: int) -> "Unit":
         upgrade_cost = self.sell_supply // 2
-        base_value = UNIT_DATA.get(self.unit_name).get("value")
+        base_value = _lookups().unit_data.get(self.unit_name).get("value")
         self.sell_supply = base_value + (level - 1) * upgrade_cost
         return self
 
 
-def _get_special_case_unit_spawning(version: str) -> dict[tuple[int, str], Unit]:
-    if int(version) < 1503:
-        return {
-            (2, "Marksman Specialist"): Unit.from_name("marksmen").set_level(3),
-            (2, "Sabertooth Specialist"): Unit.from_name("sabertooth"),
-            (2, "Fire Badger Specialist"): Unit.from_name("fire badger"),
-            (3, "Typhoon Specialist"): Unit.from_name("typhoon"),
-            (3, "Farseer Specialist"): Unit.from_name("farseer"),
-            (4, "Rhino Specialist"): Unit.from_name("rhino").set_level(2),
-        }
-    elif int(version) <= 1527:
-        return {
-            (2, "Marksman Specialist"): Unit.from_name("marksmen").set_level(3),
-            (2, "Sabertooth Specialist"): Unit.from_name("sabertooth"),
-            (2, "Fire Badger Specialist"): Unit.from_name("fire badger"),
-            (4, "Rhino Specialist"): Unit.from_name("rhino").set_level(2),
-            (4, "Typhoon Specialist"): Unit.from_name("typhoon"),
-            (4, "Farseer Specialist"): Unit.from_name("farseer"),
-        }
-    elif int(version) <= 1532:  # new in version 1532
-        return {
-            (2, "Marksman Specialist"): Unit.from_name("marksmen").set_level(3),
-            (1, "Sabertooth Specialist"): Unit.from_name("sabertooth"),
-            (1, "Fire Badger Specialist"): Unit.from_name("fire badger"),
-            (4, "Rhino Specialist"): Unit.from_name("rhino").set_level(2),
-            (4, "Typhoon Specialist"): Unit.from_name("typhoon"),
-            (4, "Farseer Specialist"): Unit.from_name("farseer"),
-        }
-    else:
-        return {
-            (2, "Marksman Specialist"): Unit.from_name("marksmen").set_level(3),
-            (3, "Sabertooth Specialist"): Unit.from_name("sabertooth"),
-            (3, "Fire Badger Specialist"): Unit.from_name("fire badger"),
-            (4, "Rhino Specialist"): Unit.from_name("rhino").set_level(2),
-            (4, "Typhoon Specialist"): Unit.from_name("typhoon"),
-            (4, "Farseer Specialist"): Unit.from_name("farseer"),
-        }
+@dataclass(frozen=True, slots=True)
+class _SpawnTemplate:
+    unit_name: str
+    level: int
 
+    def instantiate(self) -> Unit:
+        return Unit.from_name(self.unit_name).set_level(self.level)
 
-@dataclass
+
+SpawnTable = Mapping[Tuple[int, str], _SpawnTemplate]
+
+
+@functools.cache
+def _special_case_spawn_index() -> Tuple[List[int], List[SpawnTable]]:
+    """Loads special_case_spawns.json into sorted version boundaries and their tables.
+
+    Ranges are listed in version order, each one covering the versions up to and
+    including its max_version. The last range has no max_version and covers every newer
+    version.
+    """
+    boundaries = []
+    tables = []
+    for version_range in _load_data_file("special_case_spawns.json")["ranges"]:
+        if version_range["max_version"] is not None:
+            boundaries.append(version_range["max_version"])
+        tables.append(
+            MappingProxyType(
+                {
+                    (spawn["round"], spawn["officer"]): _SpawnTemplate(
+                        spawn["unit"], spawn["level"]
+                    )
+                    for spawn in version_range["spawns"]
+                }
+            )
+        )
+    return boundaries, tables
+
+
+@functools.cache
+def _get_special_case_unit_spawning(version: str) -> SpawnTable:
+    boundaries, tables = _special_case_spawn_index()
+    return tables[bisect.bisect_left(boundaries, int(version))]
+
+
+@dataclass(slots=True)
 class UnitCollection:
+    # Copies share the units dict and the Unit objects in it until one of them changes,
+    # see copy(). Units in a collection are therefore never modified in place, a changed
+    # unit is replaced with a new Unit instead.
     units: Dict[int, Unit] = field(default_factory=dict)
     next_index: int = 0
+    _shared: bool = field(default=False, repr=False, compare=False)
 
     @classmethod
     def from_xml(cls, round_element: xml.etree.ElementTree.Element) -> "UnitCollection":
-        units_element = round_element.find("playerData/units")
+        return cls.from_player_data(round_element.find("playerData"))
+
+    @classmethod
+    def from_player_data(
+        cls, player_data_element: xml.etree.ElementTree.Element
+    ) -> "UnitCollection":
         units = cls()
-        for unit_element in units_element.findall("NewUnitData"):
+        for unit_element in player_data_element.find("units").findall("NewUnitData"):
             unit = Unit.from_xml(unit_element)
             units.add_unit(unit, int(unit_element.find("Index").text))
-        units.next_index = int(round_element.find("playerData/unitIndex").text)
+        units.next_index = int(player_data_element.find("unitIndex").text)
         return units
 
+    def _own_units(self) -> None:
+        if self._shared:
+            self.units = dict(self.units)
+            self._shared = False
+
     def add_unit(self, unit: Unit, index: Optional[int] = None) -> int:
+        self._own_units()
         if index is None:
             index = self.next_index
         self.units[index] = unit
@@ -575,8 +235,14 @@ class UnitCollection:
 
     def delete_unit(self, index: int) -> None:
         if index in self.units:
+            self._own_units()
             del self.units[index]
 
+    def move_unit(self, index: int, position: Point) -> None:
+        unit = self.units[index]
+        self._own_units()
+        self.units[index] = dataclasses.replace(unit, position=position)
+
     def get_unit(self, index: int) -> Optional[Unit]:
         return self.units.get(index)
 
@@ -584,10 +250,25 @@ class UnitCollection:
         return index in self.units
 
     def copy(self) -> "UnitCollection":
-        return copy.deepcopy(self)
+        """Snapshots the collection without copying any units.
 
+        The units dict is only copied, shallowly, by whichever of the two collections is
+        changed first, so keeping a snapshot per round costs one dict of references for
+        each round that changed the board.
+        """
+        self._shared = True
+        return UnitCollection(self.units, self.next_index, _shared=True)
 
-@dataclass
+
+ActionFields = Dict[str, xml.etree.ElementTree.Element]
+
+
+def _action_fields(element: xml.etree.ElementTree.Element) -> ActionFields:
+    """Reads the children of an action element into a dict keyed by tag in one pass."""
+    return {child.tag: child for child in element}
+
+
+@dataclass(slots=True)
 class BuyAction:
     unit: str
 
@@ -596,10 +277,14 @@ class BuyAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        return cls(unit=UNIT_LOOKUP.get(int(action_element.find("UID").text)))
+        return cls.from_fields(_action_fields(action_element))
 
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        return cls(unit=_lookups().units.get(int(fields["UID"].text)))
 
-@dataclass
+
+@dataclass(slots=True)
 class UnlockAction:
     unit: str
 
@@ -608,10 +293,14 @@ class UnlockAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        return cls(unit=UNIT_LOOKUP.get(int(action_element.find("UID").text)))
+        return cls.from_fields(_action_fields(action_element))
 
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        return cls(unit=_lookups().units.get(int(fields["UID"].text)))
 
-@dataclass
+
+@dataclass(slots=True)
 class DeviceAction:
     device: str
 
@@ -620,14 +309,16 @@ class DeviceAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
         return cls(
-            device=CONTRAPTION_LOOKUP.get(
-                int(action_element.find("ContraptionID").text)
-            )
+            device=_lookups().contraptions.get(int(fields["ContraptionID"].text))
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class TechAction:
     unit: str
     tech: str
@@ -637,15 +328,19 @@ class TechAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        tech_id = int(action_element.find("TechID").text)
-        tech_name = TECH_LOOKUP.get(tech_id, tech_id)
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        tech_id = int(fields["TechID"].text)
+        tech_name = _lookups().techs.get(tech_id, tech_id)
         return cls(
-            unit=UNIT_LOOKUP.get(int(action_element.find("UID").text)),
+            unit=_lookups().units.get(int(fields["UID"].text)),
             tech=tech_name,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class UpgradeAction:
     unit: Unit
 
@@ -656,11 +351,15 @@ class UpgradeAction:
     def from_xml(
         cls, action_element: xml.etree.ElementTree.Element, units: UnitCollection
     ):
+        return cls.from_fields(_action_fields(action_element), units)
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields, units: UnitCollection):
         # TODO: Bug here: sometimes the upgraded unit is not in the list for some reason.
         # typically its out of bounds by 1 past the last unit. Buying and selling may shift
         # the unit data and I am not accounting for that. Upgrades done at the beginning of a turn
         # seem to always be correct.
-        unit_index = int(action_element.find("UIDX").text)
+        unit_index = int(fields["UIDX"].text)
         if unit_index not in units:
             return None
         return cls(
@@ -668,7 +367,7 @@ class UpgradeAction:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandCenterTowerAction:
     skill_name: str
 
@@ -677,14 +376,18 @@ class CommandCenterTowerAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        skill_id = int(action_element.find("SkillID").text)
-        skill_name = COMMAND_TOWER_SKILLS.get(skill_id, skill_id)
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        skill_id = int(fields["SkillID"].text)
+        skill_name = _lookups().command_tower_skills.get(skill_id, skill_id)
         return cls(
             skill_name=skill_name,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ResearchCenterTowerAction:
     skill_name: str
 
@@ -693,14 +396,18 @@ class ResearchCenterTowerAction:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        skill_id = int(action_element.find("ID").text)
-        skill_name = RESEARCH_TOWER_SKILLS.get(skill_id, skill_id)
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        skill_id = int(fields["ID"].text)
+        skill_name = _lookups().research_tower_skills.get(skill_id, skill_id)
         return cls(
             skill_name=skill_name,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class UnitDrop:
     count: int
     level: int
@@ -720,18 +427,22 @@ class UnitDrop:
         )
         match = unit_drop_regex.match(unit_drop_data)
         data = {k: int(v) for (k, v) in match.groupdict().items()}
-        data["unit"] = UNIT_LOOKUP.get(data["unit"])
+        data["unit"] = _lookups().units.get(data["unit"])
         data["round"] = round_number
         return cls(**data)
 
     @classmethod
     def from_xml(cls, round_number: int, action_element: xml.etree.ElementTree.Element):
+        return cls.from_fields(round_number, _action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, round_number: int, fields: ActionFields):
         return cls.from_round_number_and_identifier(
-            round_number, int(action_element.find("ID").text)
+            round_number, int(fields["ID"].text)
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ReinforcementSelection:
     card_name: str
 
@@ -740,12 +451,16 @@ class ReinforcementSelection:
 
     @classmethod
     def from_xml(cls, action_element: xml.etree.ElementTree.Element):
-        ident = int(action_element.find("ID").text)
-        card_name = CARD_LOOKUP.get(ident, ident)
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields):
+        ident = int(fields["ID"].text)
+        card_name = _lookups().cards.get(ident, ident)
         return cls(card_name=card_name)
 
 
-@dataclass
+@dataclass(slots=True)
 class SkillAction:
     skill_name: str
     target_unit_index: Optional[int] = None
@@ -760,21 +475,25 @@ class SkillAction:
     def from_xml(
         cls, action_element: xml.etree.ElementTree.Element, skills: "SkillCollection"
     ):
+        return cls.from_fields(_action_fields(action_element), skills)
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields, skills: "SkillCollection"):
         # The game supposedly uses the <id> field to track which skill is being used. However, in practice
         # a lot of times this field is simply set to 0 for unknown reasons. Instead of relying on this field
         # we can use the <SkillIndex> field to determine the index in the player's skill list of the skill.
         # This is more work since we manually need to track this using the SkillCollection class, but is required
         # for consistency.
-        skill_index = int(action_element.find("SkillIndex").text)
+        skill_index = int(fields["SkillIndex"].text)
         skill_name = skills.get_skill(skill_index)
-        unit_index = action_element.find("UnitIndex")
+        unit_index = fields.get("UnitIndex")
         return cls(
             skill_name=skill_name,
             target_unit_index=int(unit_index.text) if unit_index is not None else None,
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class MoveUnitAction:
     unit_index: int
     rotate: bool
@@ -784,11 +503,15 @@ class MoveUnitAction:
     def from_xml(
         cls, action_element: xml.etree.ElementTree.Element
     ) -> "MoveUnitAction":
-        move_element = action_element.find("moveUnitDatas/MoveUnitData")
+        return cls.from_fields(_action_fields(action_element))
+
+    @classmethod
+    def from_fields(cls, fields: ActionFields) -> "MoveUnitAction":
+        move = _action_fields(fields["moveUnitDatas"].find("MoveUnitData"))
         return cls(
-            unit_index=int(move_element.find("unitIndex").text),
-            rotate=move_element.find("isRotate").text == "true",
-            position=Point.from_xml(move_element.find("position")),
+            unit_index=int(move["unitIndex"].text),
+            rotate=move["isRotate"].text == "true",
+            position=Point.from_xml(move["position"]),
         )
 
 
@@ -807,7 +530,7 @@ PlayerAction = Union[
 ]
 
 
-@dataclass
+@dataclass(slots=True)
 class SkillCollection:
     skills: Dict[int, str] = field(default_factory=dict)
     next_index: int = 0
@@ -816,12 +539,18 @@ class SkillCollection:
     def from_xml(
         cls, round_element: xml.etree.ElementTree.Element
     ) -> "SkillCollection":
-        commander_skills_element = round_element.find("playerData/commanderSkills")
+        return cls.from_player_data(round_element.find("playerData"))
+
+    @classmethod
+    def from_player_data(
+        cls, player_data_element: xml.etree.ElementTree.Element
+    ) -> "SkillCollection":
+        commander_skills_element = player_data_element.find("commanderSkills")
         collection = cls()
         for skill_element in commander_skills_element.findall("CommanderSkillData"):
             index = int(skill_element.find("index").text)
             skill_id = int(skill_element.find("id").text)
-            skill_name = SKILL_LOOKUP.get(skill_id, skill_id)
+            skill_name = _lookups().skills.get(skill_id, skill_id)
             collection.add_skill(skill_name, index)
         return collection
 
@@ -838,7 +567,7 @@ class SkillCollection:
             if action.skill_name in ("Oil Bomb", "Field Recovery", "Mobile Beacon"):
                 self.add_skill(action.skill_name)
         elif isinstance(action, ReinforcementSelection):
-            if action.card_name in SKILL_LOOKUP.values():
+            if action.card_name in _lookups().skills.values():
                 self.add_skill(action.card_name)
 
     def get_skill(self, skill_index: int) -> str:
@@ -847,62 +576,267 @@ class SkillCollection:
         )
 
 
+@dataclass(slots=True)
+class CreateActionContext:
+    """The per round state an action decoder may need besides the action's fields."""
+
+    units: UnitCollection
+    round_number: int
+    reinforce_rounds: List[int]
+    skills: SkillCollection
+
+
+ActionDecoder = Callable[[ActionFields, CreateActionContext], Optional[PlayerAction]]
+
+
+def _decode_reinforce_item(
+    fields: ActionFields, context: CreateActionContext
+) -> PlayerAction:
+    if context.round_number in context.reinforce_rounds:
+        return UnitDrop.from_fields(context.round_number, fields)
+    return ReinforcementSelection.from_fields(fields)
+
+
+# Maps the xsi:type of a MatchActionData to the function decoding its fields. Action
+# types missing from the table are skipped.
+ACTION_DECODERS: Dict[str, ActionDecoder] = {
+    "PAD_BuyUnit": lambda fields, context: BuyAction.from_fields(fields),
+    "PAD_UnlockUnit": lambda fields, context: UnlockAction.from_fields(fields),
+    "PAD_ReleaseContraption": lambda fields, context: DeviceAction.from_fields(fields),
+    "PAD_UpgradeTechnology": lambda fields, context: TechAction.from_fields(fields),
+    "PAD_UpgradeUnit": lambda fields, context: UpgradeAction.from_fields(
+        fields, context.units
+    ),
+    "PAD_ActiveEnergyTowerSkill": lambda fields, context: (
+        CommandCenterTowerAction.from_fields(fields)
+    ),
+    "PAD_ActiveBlueprint": lambda fields, context: (
+        ResearchCenterTowerAction.from_fields(fields)
+    ),
+    "PAD_ChooseReinforceItem": _decode_reinforce_item,
+    "PAD_ReleaseCommanderSkill": lambda fields, context: SkillAction.from_fields(
+        fields, context.skills
+    ),
+    "PAD_MoveUnit": lambda fields, context: MoveUnitAction.from_fields(fields),
+}
+
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+
+def register_action_decoder(action_type: str, decoder: ActionDecoder) -> None:
+    """Registers (or replaces) the decoder used for actions of the given xsi:type.
+
+    The decoder is called with the action's child elements keyed by tag and the
+    CreateActionContext of the round, and returns the action or None to skip it.
+    """
+    ACTION_DECODERS[action_type] = decoder
+
+
+def decode_action(
+    action_element: xml.etree.ElementTree.Element, context: CreateActionContext
+) -> Optional[PlayerAction]:
+    decoder = ACTION_DECODERS.get(action_element.get(XSI_TYPE))
+    if decoder is None:
+        return None
+    return decoder(_action_fields(action_element), context)
+
+
 def create_action_from_xml_element(
     action_element: xml.etree.ElementTree.Element,
-    units: Dict[int, str],
+    units: UnitCollection,
     round_number: int,
-    reinforce_rounds: List[
-        int
-    ],  # If the number of extra arguments grows past reinforce_rounds
-    skills: SkillCollection,  # and skills, then they should be wrapped in a CreateActionContext class.
+    reinforce_rounds: List[int],
+    skills: SkillCollection,
 ) -> Optional[PlayerAction]:
-    action_type = action_element.get("{http://www.w3.org/2001/XMLSchema-instance}type")
-    if action_type == "PAD_BuyUnit":
-        return BuyAction.from_xml(action_element)
-    elif action_type == "PAD_UnlockUnit":
-        return UnlockAction.from_xml(action_element)
-    elif action_type == "PAD_ReleaseContraption":
-        return DeviceAction.from_xml(action_element)
-    elif action_type == "PAD_UpgradeTechnology":
-        return TechAction.from_xml(action_element)
-    elif action_type == "PAD_UpgradeUnit":
-        return UpgradeAction.from_xml(action_element, units)
-    elif action_type == "PAD_ActiveEnergyTowerSkill":
-        return CommandCenterTowerAction.from_xml(action_element)
-    elif action_type == "PAD_ActiveBlueprint":
-        return ResearchCenterTowerAction.from_xml(action_element)
-    elif action_type == "PAD_ChooseReinforceItem" and round_number in reinforce_rounds:
-        return UnitDrop.from_xml(round_number, action_element)
-    elif action_type == "PAD_ChooseReinforceItem":
-        return ReinforcementSelection.from_xml(action_element)
-    elif action_type == "PAD_ReleaseCommanderSkill":
-        return SkillAction.from_xml(action_element, skills)
-    elif action_type == "PAD_MoveUnit":
-        return MoveUnitAction.from_xml(action_element)
-    return None
+    return decode_action(
+        action_element,
+        CreateActionContext(units, round_number, reinforce_rounds, skills),
+    )
 
 
+class _LazyFields:
+    """Lets a dataclass fill some of its fields in on first access.
+
+    A deferred field is removed from the instance and its loader registered under the
+    field name. The first read of the field calls loader(instance), which sets the field
+    (and possibly others sharing the same loader) as a plain attribute so later reads
+    cost nothing. Pickling and copying load everything first.
+    """
+
+    def _defer(self, names: Tuple[str, ...], loader: Callable[[Any], None]) -> None:
+        loaders = self.__dict__.setdefault("_lazy_loaders", {})
+        # Load in the context the record was parsed in, so the same lookup tables apply.
+        loader = functools.partial(copy_context().run, loader)
+        for name in names:
+            self.__dict__.pop(name, None)
+            loaders[name] = loader
+
+    def __getattr__(self, name: str) -> Any:
+        loaders = self.__dict__.get("_lazy_loaders")
+        if not loaders or name not in loaders:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        loaders[name](self)
+        for loaded in [key for key in loaders if key in self.__dict__]:
+            del loaders[loaded]
+        return self.__dict__[name]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        for name in list(self.__dict__.get("_lazy_loaders", ())):
+            getattr(self, name)
+        state = self.__dict__.copy()
+        state.pop("_lazy_loaders", None)
+        return state
+
+
+def _lazy_dataclass(cls: type) -> type:
+    # Field defaults are left on the class by @dataclass. They would shadow a deferred
+    # field and keep __getattr__ from ever being reached, so drop them. __init__ keeps
+    # its defaults.
+    for data_field in dataclasses.fields(cls):
+        if data_field.name in cls.__dict__:
+            delattr(cls, data_field.name)
+    return cls
+
+
+@_lazy_dataclass
 @dataclass
-class PlayerRoundRecord:
+class PlayerRoundRecord(_LazyFields):
     round: int
     player_hp: int
     starting_units: List[Unit] = field(default_factory=list)
     actions: List[PlayerAction] = field(default_factory=list)
 
 
+@dataclass(frozen=True, slots=True)
+class UnitAdded:
+    index: int
+    unit: Unit
+
+
+@dataclass(frozen=True, slots=True)
+class UnitMoved:
+    index: int
+    position: Point
+
+
+@dataclass(frozen=True, slots=True)
+class UnitRemoved:
+    index: int
+
+
+UnitDelta = Union[UnitAdded, UnitMoved, UnitRemoved]
+
+
+class _RecordingBoard:
+    """Applies changes to a round's board while logging them as deltas."""
+
+    __slots__ = ("units", "deltas")
+
+    def __init__(self, units: UnitCollection, deltas: List[UnitDelta]):
+        self.units = units
+        self.deltas = deltas
+
+    def add_unit(self, unit: Unit, index: Optional[int] = None) -> int:
+        index = self.units.add_unit(unit, index)
+        self.deltas.append(UnitAdded(index, unit))
+        return index
+
+    def delete_unit(self, index: int) -> None:
+        self.units.delete_unit(index)
+        self.deltas.append(UnitRemoved(index))
+
+    def move_unit(self, index: int, position: Point) -> None:
+        self.units.move_unit(index, position)
+        self.deltas.append(UnitMoved(index, position))
+
+    def get_unit(self, index: int) -> Optional[Unit]:
+        return self.units.get_unit(index)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.units
+
+
+class RoundBoards(Sequence[UnitCollection]):
+    """The board at the end of each round of a DeploymentTracker, built on access."""
+
+    __slots__ = ("tracker",)
+
+    def __init__(self, tracker: "DeploymentTracker"):
+        self.tracker = tracker
+
+    def __len__(self) -> int:
+        return len(self.tracker.deltas)
+
+    def __getitem__(self, record_number):
+        if isinstance(record_number, slice):
+            return [self[i] for i in range(len(self))[record_number]]
+        return self.tracker.board(record_number)
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+
 @dataclass
 class DeploymentTracker:
+    """Unit count, value and board of a player for every round.
+
+    The boards are not stored. Each round starts from the units the replay lists for it,
+    kept on the round record, and the tracker only logs the changes the round's actions
+    made to them in deltas. board() rebuilds a round from that snapshot and its deltas,
+    so any round is as cheap to reach as any other, and units exposes them as a list.
+
+    Boards can still be passed in as units, or assigned to it, they are kept as
+    keyframes without deltas. units itself is read-only, assign a new list instead of
+    changing it.
+
+    extend() processes further rounds, for replays that are still being recorded.
+    """
+
     count: List[int] = field(default_factory=list)
     # Value here encompasses the unit purchase cost only. Upgrades and tech not included yet.
     # TODO add tech tracker
     value: List[int] = field(default_factory=list)
-    units: List[UnitCollection] = field(default_factory=list)
+    # Replaced by the units property below the class.
+    units: InitVar[Optional[List[UnitCollection]]] = None
+    version: Optional[str] = None
+    officer: Optional[str] = None
+    # Units at the start of each round, shared with the round records.
+    keyframes: List[UnitCollection] = field(default_factory=list)
+    deltas: List[List[UnitDelta]] = field(default_factory=list)
+    _last_board: Optional[Tuple[int, UnitCollection]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     @classmethod
     def from_record_list(
         cls, version: str, officer: str, records: List[PlayerRoundRecord]
     ) -> "DeploymentTracker":
-        tracker = cls(count=[5], value=[700])
+        tracker = cls(count=[5], value=[700], version=version, officer=officer)
+        tracker.extend(records)
+        return tracker
+
+    def __post_init__(self, units: Optional[List[UnitCollection]]) -> None:
+        if units is not None:
+            self._set_boards(units)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_last_board"] = None
+        return state
+
+    def _round_boards(self) -> RoundBoards:
+        return RoundBoards(self)
+
+    def _set_boards(self, boards: Iterable[UnitCollection]) -> None:
+        self.keyframes = list(boards)
+        self.deltas = [[] for _ in self.keyframes]
+        self._last_board = None
+
+    @profiled("deployments")
+    def extend(self, records: Iterable[PlayerRoundRecord]) -> None:
+        """Processes the records of the rounds following the ones already tracked."""
         # This is a little confusing since record_number and record.round seem to be used
         # interchangeably. record.round is the actual in game round, even in the event that
         # the replay was missing some starting rounds. record_number is just the number of
@@ -911,26 +845,50 @@ class DeploymentTracker:
         # 0, 1, 2, 3. That means for things that trigger on a round number like spawning a
         # farseer for farseer spec we need to use the record.round number. But for internal
         # bookkeeping we use record_number.
-        for record_number, record in enumerate(records):
-            units = record.starting_units.copy()
-            tracker.ensure_round_number(record_number)
-            cls._pre_action_unit_setup(version, record.round, officer, units)
+        for record_number, record in enumerate(records, len(self.deltas)):
+            deltas = []
+            units = _RecordingBoard(record.starting_units.copy(), deltas)
+            self.ensure_round_number(record_number)
+            self._pre_action_unit_setup(self.version, record.round, self.officer, units)
             for action in record.actions:
                 if isinstance(action, BuyAction):
-                    tracker.buy(record_number, action, units)
+                    self.buy(record_number, action, units)
                 elif isinstance(action, UpgradeAction):
-                    tracker.upgrade(record_number, action)
+                    self.upgrade(record_number, action)
                 elif (
                     isinstance(action, SkillAction)
                     and action.skill_name == "Field Recovery"
                 ):
-                    tracker.sell(record_number, action, units)
+                    self.sell(record_number, action, units)
                 elif isinstance(action, UnitDrop):
-                    tracker.process_unit_drop(record_number, action, units)
+                    self.process_unit_drop(record_number, action, units)
                 elif isinstance(action, MoveUnitAction):
-                    tracker.move(action, units)
-            tracker.units.append(units)
-        return tracker
+                    self.move(action, units)
+            self.keyframes.append(record.starting_units)
+            self.deltas.append(deltas)
+            self._last_board = (record_number, units.units)
+
+    def board(self, record_number: int) -> UnitCollection:
+        """The units on the board at the end of the round, after its actions.
+
+        Returns a copy, changing it leaves the tracker alone.
+        """
+        if record_number < 0:
+            record_number += len(self.deltas)
+        if self._last_board is not None and self._last_board[0] == record_number:
+            return self._last_board[1].copy()
+
+        units = self.keyframes[record_number].copy()
+        for delta in self.deltas[record_number]:
+            if isinstance(delta, UnitMoved):
+                units.move_unit(delta.index, delta.position)
+            elif isinstance(delta, UnitAdded):
+                units.add_unit(delta.unit, delta.index)
+            else:
+                units.delete_unit(delta.index)
+        # Kept since rounds are mostly read in order, or the same one repeatedly.
+        self._last_board = (record_number, units)
+        return units.copy()
 
     @classmethod
     def _pre_action_unit_setup(
@@ -940,10 +898,10 @@ class DeploymentTracker:
         cases = _get_special_case_unit_spawning(version)
 
         key = (round_number, officer)
-        unit = cases.get(key)
+        template = cases.get(key)
 
-        if unit is not None:
-            units.add_unit(unit)
+        if template is not None:
+            units.add_unit(template.instantiate())
 
     def ensure_round_number(self, round_number: int):
         if round_number >= len(self.count):
@@ -951,17 +909,16 @@ class DeploymentTracker:
             self.value.append(self.value[round_number - 1])
 
     def move(self, move: MoveUnitAction, units: UnitCollection):
-        unit = units.get_unit(move.unit_index)
-        unit.position = move.position
+        units.move_unit(move.unit_index, move.position)
 
     def buy(self, round_number: int, buy: BuyAction, units: UnitCollection):
         self.count[round_number] += 1
-        self.value[round_number] += UNIT_DATA.get(buy.unit).get("value")
+        self.value[round_number] += _lookups().unit_data.get(buy.unit).get("value")
         units.add_unit(Unit.from_name(buy.unit))
 
     def upgrade(self, round_number: int, upgrade: UpgradeAction):
         self.value[round_number] += (
-            UNIT_DATA.get(upgrade.unit.unit_name, {}).get("value", 0) // 2
+            _lookups().unit_data.get(upgrade.unit.unit_name, {}).get("value", 0) // 2
         )
         # TODO: Potentially better here to update the UnitCollection and then
         # at the end of a turn we can total the units' SellSupply values. This will
@@ -984,8 +941,16 @@ class DeploymentTracker:
             self.value[round_number] += new_unit.sell_supply
 
 
+# Set after the class, a property in its body would become the default of the units
+# InitVar.
+DeploymentTracker.units = property(
+    DeploymentTracker._round_boards, DeploymentTracker._set_boards
+)
+
+
+@_lazy_dataclass
 @dataclass
-class PlayerRecord:
+class PlayerRecord(_LazyFields):
     version: str
     id: str
     name: str
@@ -1003,6 +968,42 @@ class PlayerRecord:
                 self.round_records,
             )
 
+    @classmethod
+    def lazy(
+        cls,
+        version: str,
+        id: str,
+        name: str,
+        tech_choices: Dict[str, List[str]],
+        load_rounds: Callable[[], "_PlayerRoundParser"],
+    ) -> "PlayerRecord":
+        """Creates a record whose rounds and deployments are parsed when first read."""
+
+        def load_round_fields(record: PlayerRecord) -> None:
+            rounds = load_rounds()
+            record.round_records = rounds.round_records
+            record.starting_units = rounds.starting_units
+            record.starting_officer = rounds.starting_officer
+
+        def load_deployments(record: PlayerRecord) -> None:
+            record.deployments = DeploymentTracker.from_record_list(
+                record.version, record.starting_officer, record.round_records
+            )
+
+        # An empty tracker keeps __post_init__ from building one off the missing rounds.
+        record = cls(
+            version=version,
+            id=id,
+            name=name,
+            deployments=DeploymentTracker(),
+            tech_choices=tech_choices,
+        )
+        record._defer(
+            ("round_records", "starting_units", "starting_officer"), load_round_fields
+        )
+        record._defer(("deployments",), load_deployments)
+        return record
+
 
 @dataclass
 class BattleRecord:
@@ -1010,53 +1011,321 @@ class BattleRecord:
     player_records: List[PlayerRecord]
 
 
-def extract_xml(file_path: Path) -> str:
-    """Extracts the XML portion from a file containing a binary blob with XML content."""
-    with open(file_path, "rb") as file:
-        content = file.read()
+@dataclass(frozen=True)
+class ArchiveMember:
+    """A replay stored in a zip or tar archive, read without extracting it to disk."""
+
+    archive: Union[str, Path]
+    name: str
 
+    def read(self) -> bytes:
+        # Imported here as the archive modules are a noticeable part of the import time.
+        import tarfile
+        import zipfile
+
+        if zipfile.is_zipfile(self.archive):
+            with zipfile.ZipFile(self.archive) as archive:
+                try:
+                    return archive.read(self.name)
+                except KeyError:
+                    pass
+        else:
+            with tarfile.open(self.archive) as archive:
+                try:
+                    member = archive.extractfile(self.name)
+                except KeyError:
+                    member = None
+                if member is not None:
+                    return member.read()
+        raise FileNotFoundError(f"No replay {self.name} in {self.archive}.")
+
+
+# A replay file, its content, a binary file object positioned at its start or a member
+# of an archive.
+ReplaySource = Union[str, Path, bytes, bytearray, memoryview, BinaryIO, ArchiveMember]
+
+
+def _is_path(source: ReplaySource) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _source_name(source: ReplaySource) -> Optional[str]:
+    # What a replay is reported as, None for content held in memory.
+    if _is_path(source):
+        return str(source)
+    if isinstance(source, ArchiveMember):
+        return os.path.join(source.archive, source.name)
+    # File objects opened from a descriptor are named by the integer.
+    name = getattr(source, "name", None)
+    return name if isinstance(name, str) else None
+
+
+def _read_source(source: ReplaySource) -> Union[bytes, bytearray, memoryview]:
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    if isinstance(source, memoryview):
+        return source.cast("B") if source.format != "B" else source
+    if isinstance(source, ArchiveMember):
+        return source.read()
+    if hasattr(source, "read"):
+        content = source.read()
+        if not isinstance(content, bytes):
+            raise TypeError("Replay file objects must be opened in binary mode.")
+        return content
+    with open(source, "rb") as file:
+        return file.read()
+
+
+_XML_START_REGEX = re.compile(rb"<\?xml")
+_XML_END_REGEX = re.compile(rb"BattleRecord>")
+
+
+def _find_xml_bounds(
+    content: Union[bytes, bytearray, memoryview, mmap.mmap],
+) -> Tuple[int, int]:
     # Locate the XML start and end of the XML embedded in the binary file.
-    start = content.find(b"<?xml")
-    # The name of the players appears in the footer of the file in binary. If we just search for > a player name with
-    # > in it will be found and give us incorrect xml boundaries. We search for BattleRecord> instead to give a more
-    # unique sentinel value to look for. If a player has that in their name they deserve to have their
-    # replays be un-parsable.
-    end = content.rfind(b"BattleRecord>") + 13
+    if isinstance(content, memoryview):
+        # A memoryview has no find, regexes search it without copying it.
+        start_match = _XML_START_REGEX.search(content)
+        start = start_match.start() if start_match else -1
+        # Matches hold on to the buffer, keep none of them around.
+        del start_match
+        end = max(
+            (match.start() for match in _XML_END_REGEX.finditer(content)), default=-1
+        )
+    else:
+        start = content.find(b"<?xml")
+        # The name of the players appears in the footer of the file in binary. If we just search for > a player name with
+        # > in it will be found and give us incorrect xml boundaries. We search for BattleRecord> instead to give a more
+        # unique sentinel value to look for. If a player has that in their name they deserve to have their
+        # replays be un-parsable.
+        end = content.rfind(b"BattleRecord>")
     if start == -1 or end == -1:
         raise ValueError("No XML content found in the file.")
 
-    return content[start:end].decode("utf-8")
+    return start, end + 13
 
 
-def parse_battle_record(file_path: Path) -> BattleRecord:
-    """Parses the BattleRecord XML file to extract player records and their details."""
-    # Extract XML content from the binary file
-    xml_content = extract_xml(file_path)
+def _extract_xml_bytes(source: ReplaySource) -> Union[bytes, bytearray, memoryview]:
+    content = _read_source(source)
+    start, end = _find_xml_bounds(content)
+    return content[start:end]
 
-    # Parse the XML content
-    root = ET.fromstring(xml_content)
 
-    # Find the unit drop rounds
-    reinforce_rounds = []
+def extract_xml(file_path: ReplaySource) -> str:
+    """Extracts the XML portion from a file containing a binary blob with XML content.
 
-    # Iterate through all MatchSnapshotData elements
-    for snapshot in reversed(root.findall("matchDatas/MatchSnapshotData")):
-        # Extract reinforcement rounds from the current snapshot
-        rounds = [
-            int(node.text) for node in snapshot.findall("unitReinforceRounds/int")
-        ]
+    Besides a path, file_path can be the content of a replay, a binary file object or an
+    ArchiveMember.
+    """
+    return str(_extract_xml_bytes(file_path), "utf-8")
 
-        # If we found values, store them and stop searching
-        # Sometimes these are empty for some reason in round 0, so we can't just assume
-        # it will always be in a particular round. I assume it will always be in at
-        # the very least the first round the drops arrive.
-        # New development since version 1571: the rounds are no longer fully described.
-        # The list contains only the set of reinforcement rounds that have all ready
-        # occurred including the current round. So to get all the reinforcement rounds
-        # we need to start at the last round.
-        if rounds:
-            reinforce_rounds = rounds
-            break
+
+@contextmanager
+def extract_xml_view(file_path: ReplaySource) -> Iterator[memoryview]:
+    """Memory maps the replay and yields a read-only view of its embedded XML.
+
+    Nothing is copied or decoded: the sentinels are searched for on the mapping itself
+    and the view can be handed straight to the XML parser. The view is only valid inside
+    the with block. Sources other than paths are read into memory and viewed there.
+    """
+    with _replay_buffer(file_path) as (buffer, start, end):
+        with memoryview(buffer) as whole, whole[start:end] as xml_view:
+            with xml_view.toreadonly() as view:
+                yield view
+
+
+@contextmanager
+def _replay_buffer(
+    file_path: ReplaySource,
+) -> Iterator[Tuple[Union[bytes, bytearray, memoryview, mmap.mmap], int, int]]:
+    # The whole replay, mapped when it is a file, with the bounds of its XML.
+    if not _is_path(file_path):
+        content = _read_source(file_path)
+        yield (content, *_find_xml_bounds(content))
+        return
+
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError("No XML content found in the file.")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            yield (mapping, *_find_xml_bounds(mapping))
+
+
+def _buffer_find(
+    buffer: Union[bytes, bytearray, memoryview, mmap.mmap],
+    needle: bytes,
+    start: int,
+    end: int,
+) -> int:
+    if isinstance(buffer, memoryview):
+        # A memoryview has no find, a regex searches it without copying it.
+        match = re.compile(re.escape(needle)).search(buffer, start, end)
+        return match.start() if match else -1
+    return buffer.find(needle, start, end)
+
+
+def iter_archive_replays(
+    archive: Union[str, Path, BinaryIO],
+) -> Iterator[Tuple[str, bytes]]:
+    """Yields (member name, content) for every .grbr in a zip or tar archive.
+
+    Members are read one after the other in archive order and nothing is extracted to
+    disk. Tar archives, compressed or not, are read as a stream, so archive can also be
+    a pipe or a non-seekable file object.
+    """
+    import tarfile
+    import zipfile
+
+    if _is_zip(archive):
+        with zipfile.ZipFile(archive) as zip_archive:
+            for info in zip_archive.infolist():
+                if not info.is_dir() and info.filename.endswith(".grbr"):
+                    yield info.filename, zip_archive.read(info)
+        return
+
+    # Closed when the generator is, even if it is not run to the end.
+    source = {"name": archive} if _is_path(archive) else {"fileobj": archive}
+    with tarfile.open(mode="r|*", **source) as tar_archive:
+        for member in tar_archive:
+            if member.isfile() and member.name.endswith(".grbr"):
+                yield member.name, tar_archive.extractfile(member).read()
+
+
+def _is_zip(archive: Union[str, Path, BinaryIO]) -> bool:
+    import zipfile
+
+    if _is_path(archive):
+        return zipfile.is_zipfile(archive)
+    if not archive.seekable():
+        return False
+    position = archive.tell()
+    try:
+        return zipfile.is_zipfile(archive)
+    finally:
+        archive.seek(position)
+
+
+def parse_battle_record(
+    file_path: ReplaySource,
+    streaming: bool = False,
+    memory_map: bool = False,
+    lazy: bool = False,
+    profile: Union[ParseProfile, ProfileCallback, None] = None,
+) -> BattleRecord:
+    """Parses the BattleRecord XML file to extract player records and their details.
+
+    file_path can also be the content of a replay as bytes or a memoryview, as received
+    in an upload, a binary file object or an ArchiveMember. These are read into memory,
+    never written to disk.
+
+    With streaming=True the XML is fed through a pull parser and each PlayerRoundRecord
+    is parsed and discarded as soon as its closing tag arrives, so the full document
+    tree is never held in memory. With memory_map=True the replay is mapped instead of
+    read, see extract_xml_view. The resulting BattleRecord is the same either way.
+
+    With lazy=True only the version, player ids, names and tech choices are parsed up
+    front. Round records, starting units and officer, deployments and each round's
+    actions are parsed the first time they are read. The document tree is kept alive
+    until then, so lazy cannot be combined with streaming.
+
+    Pass a ParseProfile as profile to have the time spent in each stage of the parse and
+    the number of elements and actions recorded into it. Pass any other callable to get
+    a new ParseProfile handed to it once the parse finished or failed, which also works
+    for module level functions sent to bulk workers. Without a profile the stages are
+    not measured at all.
+    """
+    if lazy and streaming:
+        raise ValueError("lazy and streaming parsing cannot be combined.")
+
+    if lazy:
+        parse = functools.partial(_parse_battle_record_tree, lazy=True)
+    elif streaming:
+        parse = _parse_battle_record_streaming
+    else:
+        parse = _parse_battle_record_tree
+    if profile is None:
+        return _read_and_parse(file_path, parse, memory_map)
+
+    callback = None
+    if not isinstance(profile, ParseProfile):
+        callback, profile = profile, ParseProfile()
+    name = _source_name(file_path)
+    if name is not None:
+        profile.file_path = name
+    token = ACTIVE_PROFILE.set(profile)
+    start = time.perf_counter_ns()
+    try:
+        return _read_and_parse(file_path, parse, memory_map)
+    finally:
+        profile.wall_ns += time.perf_counter_ns() - start
+        ACTIVE_PROFILE.reset(token)
+        if callback is not None:
+            callback(profile)
+
+
+def _read_and_parse(
+    file_path: ReplaySource,
+    parse: Callable[[Union[bytes, memoryview]], BattleRecord],
+    memory_map: bool,
+) -> BattleRecord:
+    if memory_map and _is_path(file_path):
+        with ExitStack() as stack:
+            with profile_stage("extract_xml"):
+                xml_content = stack.enter_context(extract_xml_view(file_path))
+            return _parse_with_lookups(parse, xml_content)
+
+    # Extract XML content from the binary file. The parser takes the raw bytes and
+    # handles the encoding itself, so there is no need to decode them first.
+    with profile_stage("extract_xml"):
+        xml_content = _extract_xml_bytes(file_path)
+    return _parse_with_lookups(parse, xml_content)
+
+
+def _parse_with_lookups(
+    parse: Callable[[Union[bytes, memoryview]], BattleRecord],
+    xml_content: Union[bytes, memoryview],
+) -> BattleRecord:
+    with profile_stage("lookups"):
+        tables = _lookups_for_content(xml_content)
+    if tables is None:
+        return parse(xml_content)
+
+    token = _ACTIVE_LOOKUPS.set(tables)
+    try:
+        return parse(xml_content)
+    finally:
+        _ACTIVE_LOOKUPS.reset(token)
+
+
+def _lookups_for_content(
+    xml_content: Union[bytes, memoryview],
+) -> Optional[LookupTables]:
+    # Loads the tables on first use and applies the overrides for the replay's version.
+    # None when there are no overrides, every version then uses the base tables and
+    # there is no need to look for the version.
+    if not LOOKUPS.overrides:
+        return None
+
+    version_match = _VERSION_REGEX.search(xml_content)
+    version = version_match.group(1).decode("utf-8") if version_match else None
+    # The match holds on to the buffer, which would keep a memory map from closing.
+    del version_match
+    return LOOKUPS.for_version(version)
+
+
+def _parse_battle_record_tree(
+    xml_content: Union[bytes, memoryview], lazy: bool = False
+) -> BattleRecord:
+    # Parse the XML content
+    with profile_stage("fromstring"):
+        root = ET.fromstring(xml_content)
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.count("elements", sum(1 for _ in root.iter()))
+
+    # Find the unit drop rounds
+    reinforce_rounds = _scan_reinforce_rounds(xml_content)
 
     # Navigate to player records
     player_records_element = root.find("playerRecords")
@@ -1065,73 +1334,31 @@ def parse_battle_record(file_path: Path) -> BattleRecord:
 
     player_records = []
     for player_element in player_records_element.findall("PlayerRecord"):
-        player_id = player_element.find("id").text
-        player_name = player_element.find("name").text
-
-        # Parse their tech choices
-        unit_datas_element = player_element.find("data/unitDatas")
-        unit_data = {
-            UNIT_LOOKUP.get(
-                int(data_element.find("id").text), data_element.find("id").text
-            ): [
-                TECH_LOOKUP.get(int(tech_element.get("data")), tech_element.get("data"))
-                for tech_element in data_element.find("techs").findall("tech")
-            ]
-            for data_element in unit_datas_element.findall("unitData")
-            if data_element.find("id").text
-            != "2001"  # For now a special case for death knell to just keep it out.
-        }
-
         # Parse round records
-        round_records_element = player_element.find("playerRoundRecords")
-        round_records = []
-        starting_units = []
-        starting_officer = None
-        if round_records_element is not None:
-            extracted_starting_units_and_officer = False
-            for round_element in round_records_element.findall("PlayerRoundRecord"):
-                round_number = int(round_element.find("round").text)
-                player_hp = int(round_element.find("playerData/reactorCore").text)
-                units = UnitCollection.from_xml(round_element)
-
-                # The information about your starting pack is entirely determined by the seed
-                # and the index of which option you picked and is simulated in-game. So
-                # there is no way to reverse engineer that in a way that will be durable to game
-                # changes. Instead, just look at what units were pre-placed on round 1 and which
-                # officer the player has as those will be what were in the starting pack.
-                # Addendum:
-                # When you join a game to observe late you only have the rounds you observed. That
-                # means in a common case round 1 can be missing, we cannot extract the officer and
-                # starting units from it reliably. Instead, we look at the lowest non-zero round
-                # and get the 0th officer, and the units labeled with indexes 1-5 as those do not
-                # change. In the event that they were sold they will simply be missing from the
-                # report as I do not want to guess.
-                if round_number > 0 and extracted_starting_units_and_officer is False:
-                    starting_units = units.copy()
-                    starting_officer = _parse_round_officers(round_element)[0]
-                    extracted_starting_units_and_officer = True
-
-                action_records = _parse_actions(
-                    round_element, round_number, reinforce_rounds
-                )
-                round_records.append(
-                    PlayerRoundRecord(
-                        round=round_number,
-                        player_hp=player_hp,
-                        starting_units=units,
-                        actions=action_records,
-                    )
+        load_rounds = functools.partial(
+            _parse_player_rounds,
+            player_element.find("playerRoundRecords"),
+            reinforce_rounds,
+            lazy,
+        )
+        if lazy:
+            player_records.append(
+                PlayerRecord.lazy(
+                    root.find("Version").text,
+                    player_element.find("id").text,
+                    player_element.find("name").text,
+                    _parse_tech_choices(player_element),
+                    load_rounds,
                 )
+            )
+            continue
 
         player_records.append(
-            PlayerRecord(
-                version=root.find("Version").text,
-                id=player_id,
-                name=player_name,
-                round_records=round_records,
-                starting_units=starting_units,
-                starting_officer=starting_officer,
-                tech_choices=unit_data,
+            load_rounds().to_player_record(
+                root.find("Version").text,
+                player_element.find("id").text,
+                player_element.find("name").text,
+                _parse_tech_choices(player_element),
             )
         )
 
@@ -1141,35 +1368,440 @@ def parse_battle_record(file_path: Path) -> BattleRecord:
     )
 
 
+def get_reinforce_rounds(file_path: Path) -> List[int]:
+    """Reads the rounds a replay's unit reinforcements arrive in without parsing it."""
+    with extract_xml_view(file_path) as view:
+        return _scan_reinforce_rounds(view)
+
+
+_MATCH_DATAS_START = b"<matchDatas>"
+_MATCH_DATAS_END = b"</matchDatas>"
+_REINFORCE_ROUNDS_START = b"<unitReinforceRounds>"
+_REINFORCE_ROUNDS_REGEX = re.compile(
+    rb"<unitReinforceRounds>(.*?)</unitReinforceRounds>", re.DOTALL
+)
+_INT_ELEMENT_REGEX = re.compile(rb"<int>\s*(-?\d+)\s*</int>")
+# Bytes copied at a time when searching a memory view backwards.
+REVERSE_SCAN_WINDOW = 64 * 1024
+
+
+@profiled("reinforce_rounds")
+def _scan_reinforce_rounds(xml_content: Union[bytes, memoryview]) -> List[int]:
+    # Every MatchSnapshotData has a unitReinforceRounds list and the last non-empty one
+    # is used. Sometimes these are empty for some reason in round 0, so we can't just
+    # assume it will always be in a particular round. I assume it will always be in at
+    # the very least the first round the drops arrive.
+    # New development since version 1571: the rounds are no longer fully described.
+    # The list contains only the set of reinforcement rounds that have all ready
+    # occurred including the current round. So to get all the reinforcement rounds
+    # we need to start at the last round.
+    # The lists are searched for in the raw bytes from the end of matchDatas backwards,
+    # which usually stops at the last snapshot. Only lists inside matchDatas count, an
+    # element of the same name elsewhere in the document is not a snapshot's. Empty
+    # lists are written as a self closing tag and are skipped by the search.
+    end = _rfind(xml_content, _MATCH_DATAS_END, len(xml_content))
+    section_start = _rfind(xml_content, _MATCH_DATAS_START, max(end, 0))
+    if section_start == -1:
+        return []
+    while True:
+        start = _rfind(xml_content, _REINFORCE_ROUNDS_START, end, section_start)
+        if start == -1:
+            return []
+        match = _REINFORCE_ROUNDS_REGEX.match(xml_content, start, end)
+        span = match.span(1) if match else None
+        # The match holds on to the buffer, which would keep a memory map from closing.
+        del match
+        if span is not None:
+            rounds = [
+                int(value) for value in _INT_ELEMENT_REGEX.findall(xml_content, *span)
+            ]
+            if rounds:
+                return rounds
+        end = start
+
+
+def _rfind(
+    content: Union[bytes, memoryview], sub: bytes, end: int, lowest: int = 0
+) -> int:
+    if not isinstance(content, memoryview):
+        return content.rfind(sub, lowest, end)
+    # Memory views cannot be searched directly, copy windows from the end instead.
+    while end > lowest:
+        start = max(lowest, end - REVERSE_SCAN_WINDOW)
+        with content[start:end] as window:
+            found = window.tobytes().rfind(sub)
+        if found != -1:
+            return start + found
+        if start == lowest:
+            break
+        # Overlap the windows so a match across the boundary is not missed.
+        end = start + len(sub) - 1
+    return -1
+
+
+# Size of the slices handed to the pull parser in streaming mode.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_battle_record_streaming(
+    xml_content: Union[bytes, memoryview],
+) -> BattleRecord:
+    parser = ET.XMLPullParser(events=("start", "end"))
+    # Open elements from the root down, used to tell which level a closing tag belongs
+    # to and to detach finished subtrees from their parent.
+    open_elements = []
+    version = None
+    # Found up front so that rounds can be decoded as soon as they arrive, even when the
+    # matchDatas come after the player records.
+    reinforce_rounds = _scan_reinforce_rounds(xml_content)
+    saw_player_records = False
+    current_rounds = None
+    players = []
+    profile = ACTIVE_PROFILE.get()
+
+    def handle_events():
+        nonlocal version, saw_player_records, current_rounds
+        events = parser.read_events()
+        if profile is not None:
+            events = count_end_events(events, profile)
+        for event, element in events:
+            if event == "start":
+                if (
+                    element.tag == "PlayerRecord"
+                    and open_elements[-1].tag == "playerRecords"
+                ):
+                    current_rounds = _PlayerRoundParser(reinforce_rounds)
+                open_elements.append(element)
+                continue
+
+            open_elements.pop()
+            parent_tag = open_elements[-1].tag if open_elements else None
+            if (
+                element.tag == "PlayerRoundRecord"
+                and parent_tag == "playerRoundRecords"
+            ):
+                current_rounds.add_round(element)
+            elif element.tag == "PlayerRecord" and parent_tag == "playerRecords":
+                players.append(
+                    (
+                        element.find("id").text,
+                        element.find("name").text,
+                        _parse_tech_choices(element),
+                        current_rounds,
+                    )
+                )
+            elif element.tag == "MatchSnapshotData" and parent_tag == "matchDatas":
+                # Already scanned, only detached to keep the tree small.
+                pass
+            elif element.tag == "playerRecords" and parent_tag == "BattleRecord":
+                saw_player_records = True
+            elif element.tag == "Version" and parent_tag == "BattleRecord":
+                version = element.text
+            else:
+                continue
+
+            if open_elements:
+                open_elements[-1].remove(element)
+
+    with profile_stage("feed"), memoryview(xml_content) as view:
+        for offset in range(0, len(view), STREAM_CHUNK_SIZE):
+            with view[offset : offset + STREAM_CHUNK_SIZE] as chunk:
+                parser.feed(chunk)
+            handle_events()
+        parser.close()
+        handle_events()
+
+    if not saw_player_records:
+        raise Exception("No player records found.")
+
+    player_records = []
+    for player_id, player_name, tech_choices, rounds in players:
+        player_records.append(
+            rounds.to_player_record(version, player_id, player_name, tech_choices)
+        )
+
+    return BattleRecord(version=version, player_records=player_records)
+
+
+def _parse_tech_choices(
+    player_element: xml.etree.ElementTree.Element,
+) -> Dict[str, List[str]]:
+    unit_datas_element = player_element.find("data/unitDatas")
+    return {
+        _lookups().units.get(
+            int(data_element.find("id").text), data_element.find("id").text
+        ): [
+            _lookups().techs.get(
+                int(tech_element.get("data")), tech_element.get("data")
+            )
+            for tech_element in data_element.find("techs").findall("tech")
+        ]
+        for data_element in unit_datas_element.findall("unitData")
+        if data_element.find("id").text
+        != "2001"  # For now a special case for death knell to just keep it out.
+    }
+
+
+def _parse_player_rounds(
+    round_records_element: Optional[xml.etree.ElementTree.Element],
+    reinforce_rounds: List[int],
+    lazy_actions: bool = False,
+) -> "_PlayerRoundParser":
+    rounds = _PlayerRoundParser(reinforce_rounds, lazy_actions)
+    if round_records_element is not None:
+        for round_element in round_records_element.findall("PlayerRoundRecord"):
+            rounds.add_round(round_element)
+    return rounds
+
+
+class _PlayerRoundParser:
+    """Accumulates the round records of one player a PlayerRoundRecord at a time."""
+
+    def __init__(self, reinforce_rounds: List[int], lazy_actions: bool = False):
+        self.reinforce_rounds = reinforce_rounds
+        self.lazy_actions = lazy_actions
+        self.round_records = []
+        self.starting_units = []
+        self.starting_officer = None
+
+    @profiled("player_rounds")
+    def add_round(self, round_element: xml.etree.ElementTree.Element) -> None:
+        round_number = int(round_element.find("round").text)
+        player_data_element = round_element.find("playerData")
+        player_hp = int(player_data_element.find("reactorCore").text)
+        # One collection per round, shared by the round record and the action decoding.
+        units = UnitCollection.from_player_data(player_data_element)
+
+        # The information about your starting pack is entirely determined by the seed
+        # and the index of which option you picked and is simulated in-game. So
+        # there is no way to reverse engineer that in a way that will be durable to game
+        # changes. Instead, just look at what units were pre-placed on round 1 and which
+        # officer the player has as those will be what were in the starting pack.
+        # Addendum:
+        # When you join a game to observe late you only have the rounds you observed. That
+        # means in a common case round 1 can be missing, we cannot extract the officer and
+        # starting units from it reliably. Instead, we look at the lowest non-zero round
+        # and get the 0th officer, and the units labeled with indexes 1-5 as those do not
+        # change. In the event that they were sold they will simply be missing from the
+        # report as I do not want to guess.
+        if round_number > 0 and self.starting_officer is None:
+            self.starting_units = units.copy()
+            self.starting_officer = _parse_officers(player_data_element)[0]
+
+        round_record = PlayerRoundRecord(
+            round=round_number,
+            player_hp=player_hp,
+            starting_units=units,
+        )
+        if self.lazy_actions:
+
+            def load_actions(record: PlayerRoundRecord) -> None:
+                record.actions = _parse_actions(
+                    round_element,
+                    round_number,
+                    self.reinforce_rounds,
+                    units,
+                    SkillCollection.from_player_data(player_data_element),
+                )
+
+            round_record._defer(("actions",), load_actions)
+        else:
+            round_record.actions = _parse_actions(
+                round_element,
+                round_number,
+                self.reinforce_rounds,
+                units,
+                SkillCollection.from_player_data(player_data_element),
+            )
+        self.round_records.append(round_record)
+
+    def to_player_record(
+        self,
+        version: str,
+        player_id: str,
+        player_name: str,
+        tech_choices: Dict[str, List[str]],
+    ) -> PlayerRecord:
+        return PlayerRecord(
+            version=version,
+            id=player_id,
+            name=player_name,
+            round_records=self.round_records,
+            starting_units=self.starting_units,
+            starting_officer=self.starting_officer,
+            tech_choices=tech_choices,
+        )
+
+
+@profiled("actions")
 def _parse_actions(
     round_element: xml.etree.ElementTree.Element,
     round_number: int,
     reinforce_rounds: List[int],
+    units: "UnitCollection",
+    skills: "SkillCollection",
 ):
     action_records = []
-    units = UnitCollection.from_xml(round_element)
-    skills = SkillCollection.from_xml(round_element)
+    context = CreateActionContext(units, round_number, reinforce_rounds, skills)
 
     for action_element in round_element.findall("actionRecords/MatchActionData"):
-        action = create_action_from_xml_element(
-            action_element, units, round_number, reinforce_rounds, skills
-        )
+        action = decode_action(action_element, context)
         skills.add_skill_from_action(action)
         if action is not None:
             action_records.append(action)
 
+    profile_count("actions", len(action_records))
     return action_records
 
 
 def _parse_round_officers(round_element: xml.etree.ElementTree.Element) -> List[str]:
-    officer_elements = round_element.find("playerData/officers")
+    return _parse_officers(round_element.find("playerData"))
+
+
+def _parse_officers(player_data_element: xml.etree.ElementTree.Element) -> List[str]:
+    officer_elements = player_data_element.find("officers")
     return [
-        OFFICER_LOOKUP.get(int(officer_element.text), officer_element.text)
+        _lookups().officers.get(int(officer_element.text), officer_element.text)
         for officer_element in officer_elements.findall("int")
     ]
 
 
+@dataclass
+class PlayerHeader:
+    id: str
+    name: str
+    starting_officer: Optional[str] = None
+
+
+@dataclass
+class ReplayHeader:
+    version: str
+    players: List[PlayerHeader]
+    date: Optional["datetime.date"] = None
+    match_id: Optional[str] = None
+
+
+# Replay files are saved by the game as
+# <version>_<date>--<match id>_[<player>]VS[<player>].grbr
+REPLAY_FILE_NAME_REGEX = re.compile(
+    r"^(?P<version>\d+)_(?P<date>\d{8})-+(?P<match_id>\d+)"
+)
+_VERSION_REGEX = re.compile(rb"<Version>([^<]*)</Version>")
+_PLAYER_RECORD_TAG = b"<PlayerRecord"
+_ROOT_START_TAG_REGEX = re.compile(rb"<BattleRecord[^>]*>")
+HEADER_CHUNK_SIZE = 16 * 1024
+
+
+def scan_replay_header(
+    file_path: ReplaySource, players: Optional[int] = 2
+) -> ReplayHeader:
+    """Reads the version, players and starting officers of a replay, not its rounds.
+
+    The replay is memory mapped and only the bytes around each PlayerRecord's id, name
+    and first non-zero round are fed to the XML parser, everything else is skipped over
+    with a byte search. The date and match id come from the file name when it has the
+    game's naming scheme, replays held in memory have neither.
+
+    The search stops once players PlayerRecords were read, so the rounds of the last one
+    are never touched. Pass None to read every player, which searches to the end of the
+    document.
+    """
+    with (
+        _replay_buffer(file_path) as (buffer, xml_start, xml_end),
+        memoryview(buffer) as whole,
+        whole[xml_start:xml_end] as view,
+    ):
+        version_match = _VERSION_REGEX.search(view)
+        version = version_match.group(1).decode("utf-8") if version_match else None
+        # Drop the match so it does not hold on to the mapping.
+        del version_match
+        # The root start tag is fed ahead of each PlayerRecord so that the namespace
+        # prefixes it declares are bound.
+        root_match = _ROOT_START_TAG_REGEX.search(view)
+        root_start_tag = root_match.group(0) if root_match else b"<BattleRecord>"
+        del root_match
+        token = _ACTIVE_LOOKUPS.set(LOOKUPS.for_version(version))
+        try:
+            player_headers = []
+            position = xml_start
+            while players is None or len(player_headers) < players:
+                # A plain byte search on the buffer, each one starting from the previous
+                # PlayerRecord so that nothing is searched twice.
+                start = _buffer_find(buffer, _PLAYER_RECORD_TAG, position, xml_end)
+                if start == -1:
+                    break
+                position = start + len(_PLAYER_RECORD_TAG)
+                if buffer[position] not in b"> \t\r\n":
+                    continue
+                player_headers.append(
+                    _scan_player_header(view, start - xml_start, root_start_tag)
+                )
+        finally:
+            _ACTIVE_LOOKUPS.reset(token)
+
+    if version is None:
+        raise ValueError("No Version found in the replay.")
+
+    header = ReplayHeader(version=version, players=player_headers)
+    name = _source_name(file_path)
+    file_name_match = (
+        REPLAY_FILE_NAME_REGEX.match(os.path.basename(name)) if name else None
+    )
+    if file_name_match is not None:
+        import datetime
+
+        header.date = datetime.datetime.strptime(
+            file_name_match.group("date"), "%Y%m%d"
+        ).date()
+        header.match_id = file_name_match.group("match_id")
+    return header
+
+
+def _scan_player_header(
+    view: memoryview, start: int, root_start_tag: bytes
+) -> PlayerHeader:
+    parser = ET.XMLPullParser(events=("start", "end"))
+    parser.feed(root_start_tag)
+    # Depth of the open elements, the BattleRecord root is 1 and the PlayerRecord 2.
+    depth = 0
+    fields = {}
+    for offset in range(start, len(view), HEADER_CHUNK_SIZE):
+        with view[offset : offset + HEADER_CHUNK_SIZE] as chunk:
+            parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 2 and element.tag in ("id", "name"):
+                fields[element.tag] = element.text
+            elif depth == 3 and element.tag == "PlayerRoundRecord":
+                # Same rule as the full parser, the lowest non-zero round has the
+                # starting officer.
+                if (
+                    "starting_officer" not in fields
+                    and int(element.find("round").text) > 0
+                ):
+                    fields["starting_officer"] = _parse_round_officers(element)[0]
+                element.clear()
+
+            # The parser is abandoned as soon as everything is known, it never sees the
+            # bytes past the end of this PlayerRecord.
+            if depth == 1 or len(fields) == 3:
+                return PlayerHeader(
+                    id=fields.get("id"),
+                    name=fields.get("name"),
+                    starting_officer=fields.get("starting_officer"),
+                )
+
+    raise ValueError("Truncated PlayerRecord in the replay.")
+
+
 def _setup_pretty_table_with_players(players: List[PlayerRecord]):
+    # Imported here as only the table output needs it, not parsing.
+    from prettytable import ALL, PrettyTable
+
     pretty_table = PrettyTable()
     pretty_table.hrules = ALL
     pretty_table.align = "l"
@@ -1186,17 +1818,14 @@ def _player_start_to_string(player: PlayerRecord) -> str:
     )
 
 
-def battle_record_to_string(battle_record: BattleRecord) -> str:
-    """Displays the battle record in a tabular format."""
+def _battle_record_rows(battle_record: BattleRecord) -> Iterator[List[str]]:
+    """Yields the cells of every row of the battle table, a round and one per player."""
     max_rounds = max(
         len(player.round_records) for player in battle_record.player_records
     )
-    table = _setup_pretty_table_with_players(battle_record.player_records)
-
-    table.add_row(
-        ["0"]
-        + [_player_start_to_string(player) for player in battle_record.player_records]
-    )
+    yield ["0"] + [
+        _player_start_to_string(player) for player in battle_record.player_records
+    ]
 
     for i, round_idx in enumerate(range(max_rounds)[1:]):
         players_actions = []
@@ -1227,6 +1856,71 @@ def battle_record_to_string(battle_record: BattleRecord) -> str:
 
             players_actions.append("\n".join(player_actions))
 
-        table.add_row([f"{i + 1}"] + [actions for actions in players_actions])
+        yield [f"{i + 1}"] + players_actions
 
+
+def battle_record_to_string(battle_record: BattleRecord) -> str:
+    """Displays the battle record in a tabular format."""
+    table = _setup_pretty_table_with_players(battle_record.player_records)
+    for row in _battle_record_rows(battle_record):
+        table.add_row(row)
     return table
+
+
+def _text_width(text: str) -> int:
+    if text.isascii():
+        return len(text)
+    # Wide characters, as in CJK player names, take two columns as PrettyTable counts.
+    # wcwidth comes with PrettyTable, which also only imports it once a table needs it.
+    try:
+        from wcwidth import wcswidth
+    except ImportError:
+        import unicodedata
+
+        return sum(
+            2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text
+        )
+    width = wcswidth(text)
+    return width if width >= 0 else len(text)
+
+
+def write_battle_record(
+    battle_record: BattleRecord, stream: TextIO, plain: bool = False
+) -> None:
+    """Writes the table of battle_record_to_string to a text stream, row by row.
+
+    The column widths are found in a single pass over the cells, then each row is
+    written as soon as it is laid out, producing the same text as printing the
+    PrettyTable.
+
+    With plain=True there is no layout at all: every round of every player is written as
+    one line as soon as it is produced, its cell lines separated by semicolons.
+    """
+    names = [f"{player.name}" for player in battle_record.player_records]
+    if plain:
+        for row in _battle_record_rows(battle_record):
+            for name, cell in zip(names, row[1:]):
+                cell = cell.replace("\n", "; ")
+                stream.write(f"{row[0]} {name}: {cell}\n")
+        return
+
+    header = [["Round"]] + [[name] for name in names]
+    rows = [header] + [
+        [cell.split("\n") for cell in row] for row in _battle_record_rows(battle_record)
+    ]
+    widths = [
+        max(_text_width(line) for row in rows for line in row[column])
+        for column in range(len(rows[0]))
+    ]
+    border = "+" + "+".join("-" * (width + 1) for width in widths) + "+\n"
+
+    stream.write(border)
+    for row in rows:
+        height = max(len(lines) for lines in row)
+        for line_number in range(height):
+            stream.write("|")
+            for lines, width in zip(row, widths):
+                line = lines[line_number] if line_number < len(lines) else ""
+                stream.write(f" {line}{' ' * (width - _text_width(line))}|")
+            stream.write("\n")
+        stream.write(border)
@@ -0,0 +1,363 @@
+"""asyncio entry points: parse replays on a process pool without blocking the loop."""
+
+import asyncio
+import functools
+import json
+import os
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import BattleRecord, ReplaySource, parse_battle_record
+
+# Uploads larger than this are refused by the HTTP server.
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+
+# The HTTP server answers 503 once this many uploads are being received, waiting for a
+# parser or being parsed.
+MAX_WAITING = 256
+
+# Seconds the HTTP server gives a request to arrive in full, head and body.
+READ_TIMEOUT = 60.0
+
+# Requests with more header lines than this are refused by the HTTP server.
+MAX_HEADERS = 100
+
+
+def _parse_source(
+    source: ReplaySource,
+    transform: Optional[Callable[[BattleRecord], Any]],
+    parse_kwargs: dict,
+) -> Any:
+    battle_record = parse_battle_record(source, **parse_kwargs)
+    return transform(battle_record) if transform else battle_record
+
+
+class ReplayScheduler:
+    """Parses replays for asyncio code on a process pool, a bounded number at a time.
+
+    At most max_concurrency parses are handed to the pool, by default one per worker.
+    Further calls to parse wait on the event loop for a slot, so a burst of requests
+    queues up as suspended coroutines instead of as replays held in the pool's queue,
+    and parse_many only takes the next source once a slot is free.
+
+    Paths are read by the worker, bytes are sent to it. Sources are pickled to reach the
+    worker, so read file objects and memoryviews into bytes first. A parse keeps its
+    slot until the pool is done with it: cancelling the caller withdraws a parse that
+    has not started, one that is already running finishes in its worker and its result
+    is dropped.
+
+    The scheduler can be used from several event loops, each gets its own slots.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.waiting = 0
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._slots = weakref.WeakKeyDictionary()
+
+    async def __aenter__(self) -> "ReplayScheduler":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def parse(
+        self,
+        source: ReplaySource,
+        transform: Optional[Callable[[BattleRecord], Any]] = None,
+        **parse_kwargs,
+    ) -> Any:
+        """Parses a replay, returning the BattleRecord or what transform made of it.
+
+        transform runs in the worker, it must be a module level function. Any other
+        keyword arguments are passed on to parse_battle_record.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._slots_for(loop)
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            future = self._pool().submit(_parse_source, source, transform, parse_kwargs)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(functools.partial(_release_slot, loop, slots))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    async def parse_many(
+        self,
+        sources: Union[Iterable[ReplaySource], AsyncIterable[ReplaySource]],
+        transform: Optional[Callable[[BattleRecord], Any]] = None,
+        **parse_kwargs,
+    ) -> AsyncIterator[Tuple[ReplaySource, Any]]:
+        """Yields (source, result) as parses complete, the exception as result on error.
+
+        Sources are taken one at a time as slots free up. Closing the iterator early
+        cancels the parses still in flight.
+        """
+        pending = set()
+        try:
+            async for source in _iterate(sources):
+                if len(pending) >= self.max_concurrency:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield task.result()
+                pending.add(
+                    asyncio.ensure_future(
+                        self._parse_result(source, transform, parse_kwargs)
+                    )
+                )
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _parse_result(
+        self,
+        source: ReplaySource,
+        transform: Optional[Callable[[BattleRecord], Any]],
+        parse_kwargs: dict,
+    ) -> Tuple[ReplaySource, Any]:
+        try:
+            return source, await self.parse(source, transform, **parse_kwargs)
+        except Exception as error:
+            return source, error
+
+    def _slots_for(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        slots = self._slots.get(loop)
+        if slots is None:
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+
+def _release_slot(
+    loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore, future: Future
+) -> None:
+    # Called from the pool's thread once the parse finished or was withdrawn.
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # The loop is closed, nobody is waiting for the slot any more.
+        pass
+
+
+async def _iterate(
+    sources: Union[Iterable[ReplaySource], AsyncIterable[ReplaySource]],
+) -> AsyncIterator[ReplaySource]:
+    if hasattr(sources, "__aiter__"):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+
+_default_scheduler = None
+
+
+def default_scheduler() -> ReplayScheduler:
+    """The scheduler used when none is passed, with one worker per CPU."""
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = ReplayScheduler()
+    return _default_scheduler
+
+
+async def parse_battle_record_async(
+    source: ReplaySource,
+    scheduler: Optional[ReplayScheduler] = None,
+    transform: Optional[Callable[[BattleRecord], Any]] = None,
+    **parse_kwargs,
+) -> Any:
+    """Parses a replay or its content on a process pool, see ReplayScheduler.parse."""
+    scheduler = scheduler or default_scheduler()
+    return await scheduler.parse(source, transform, **parse_kwargs)
+
+
+async def iter_directory_async(
+    directory: Union[str, Path],
+    scheduler: Optional[ReplayScheduler] = None,
+    transform: Optional[Callable[[BattleRecord], Any]] = None,
+    **parse_kwargs,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Yields (path, result) for every replay in directory, in completion order."""
+    scheduler = scheduler or default_scheduler()
+    paths = await asyncio.to_thread(lambda: sorted(Path(directory).glob("*.grbr")))
+    async for path, result in scheduler.parse_many(paths, transform, **parse_kwargs):
+        yield str(path), result
+
+
+async def serve_http(
+    host: str,
+    port: int,
+    scheduler: Optional[ReplayScheduler] = None,
+    transform: Optional[Callable[[BattleRecord], Any]] = None,
+    max_upload_bytes: int = MAX_UPLOAD_BYTES,
+    max_waiting: int = MAX_WAITING,
+    started: Optional[Callable[[asyncio.Server], Any]] = None,
+    read_timeout: float = READ_TIMEOUT,
+) -> None:
+    """Serves POST /parse requests, the body being a replay file, until cancelled.
+
+    transform must turn the BattleRecord into something JSON serialisable, it is sent
+    back as the response. Uploads are parsed on the scheduler. Each one takes a place
+    before its body is read and keeps it until it is parsed, once max_waiting places
+    are taken further requests are refused with 503 without reading their body. At
+    most max_waiting uploads of max_upload_bytes are therefore held in memory.
+
+    A request has read_timeout seconds to arrive in full, a slower one is answered with
+    408. Requests with more than MAX_HEADERS header lines are refused with 431. started
+    is called with the server once it listens.
+    """
+    scheduler = scheduler or default_scheduler()
+    # Created here as a semaphore belongs to the event loop it is first used on.
+    uploads = asyncio.Semaphore(max_waiting)
+    handler = functools.partial(
+        _handle_request, scheduler, transform, max_upload_bytes, uploads, read_timeout
+    )
+    server = await asyncio.start_server(handler, host, port)
+    async with server:
+        if started is not None:
+            started(server)
+        await server.serve_forever()
+
+
+async def _handle_request(
+    scheduler: ReplayScheduler,
+    transform: Optional[Callable[[BattleRecord], Any]],
+    max_upload_bytes: int,
+    uploads: asyncio.Semaphore,
+    read_timeout: float,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> None:
+    try:
+        status, body = await _respond(
+            scheduler,
+            transform,
+            max_upload_bytes,
+            uploads,
+            read_timeout,
+            reader,
+            writer,
+        )
+        payload = json.dumps(body).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode(
+                "ascii"
+            )
+            + payload
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _read_head(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[List[str], Dict[str, str]]]:
+    """Reads the request line and headers, None when there are more than MAX_HEADERS."""
+    request_line = (await reader.readline()).decode("latin-1").split()
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return request_line, headers
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return None
+
+
+async def _respond(
+    scheduler: ReplayScheduler,
+    transform: Optional[Callable[[BattleRecord], Any]],
+    max_upload_bytes: int,
+    uploads: asyncio.Semaphore,
+    read_timeout: float,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> Tuple[str, Any]:
+    # One deadline for the whole request, a client trickling in bytes gains nothing.
+    deadline = asyncio.get_running_loop().time() + read_timeout
+    try:
+        async with asyncio.timeout_at(deadline):
+            head = await _read_head(reader)
+    except TimeoutError:
+        return "408 Request Timeout", {"error": "The request was not sent in time."}
+    except ValueError:
+        # A line longer than the reader's limit.
+        head = None
+    if head is None:
+        return "431 Request Header Fields Too Large", {"error": "Too many headers."}
+    request_line, headers = head
+
+    if request_line[:2] != ["POST", "/parse"]:
+        return "404 Not Found", {"error": "POST replays to /parse."}
+    try:
+        length = int(headers["content-length"])
+    except (KeyError, ValueError):
+        return "411 Length Required", {"error": "Content-Length is required."}
+    if length < 0:
+        return "400 Bad Request", {"error": "Content-Length cannot be negative."}
+    if length > max_upload_bytes:
+        return "413 Content Too Large", {"error": "The replay is too large."}
+    # Checked and taken without awaiting in between, so no other request can slip in.
+    if uploads.locked():
+        return "503 Service Unavailable", {"error": "Too many replays queued."}
+
+    async with uploads:
+        if headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            async with asyncio.timeout_at(deadline):
+                content = await reader.readexactly(length)
+        except TimeoutError:
+            return "408 Request Timeout", {"error": "The replay was not sent in time."}
+        try:
+            return "200 OK", await scheduler.parse(content, transform)
+        except Exception as error:
+            return "422 Unprocessable Content", {"error": str(error)}
@@ -0,0 +1,237 @@
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from . import BattleRecord, iter_archive_replays, parse_battle_record
+from .cache import ParseCache
+
+# Files are grouped into chunks of roughly this many bytes so that a worker handles
+# several small replays per round trip instead of paying the IPC cost for each one.
+# Chunks are also kept small enough that every worker gets at least one.
+CHUNK_BYTES = 4 * 1024 * 1024
+MAX_CHUNK_FILES = 64
+
+ParseResult = Tuple[str, Union[BattleRecord, Any, Exception]]
+
+# Chunks handed to the pool ahead of the results, per worker. Further chunks are only
+# submitted, and archive members only read, once a result came back, so memory stays
+# bounded however many replays there are.
+CHUNKS_AHEAD = 2
+
+
+def parse_battle_records(
+    paths: Iterable[Union[str, Path]],
+    workers: Optional[int] = None,
+    transform: Optional[Callable[[BattleRecord], Any]] = None,
+    cache: Optional[ParseCache] = None,
+    executor: Optional[Executor] = None,
+    **parse_kwargs,
+) -> Iterator[ParseResult]:
+    """Parses replays over a process pool, yielding (path, result) as chunks complete.
+
+    The result is the parsed BattleRecord, or the exception raised while parsing that
+    file. Results arrive in completion order, not input order.
+
+    A full BattleRecord is a large object graph and pickling it back to the parent can
+    cost as much as parsing it. When only part of it is needed pass a module level
+    transform function: it runs in the worker and only its return value is sent back.
+
+    With a ParseCache, records are looked up in and stored to it by the workers.
+
+    workers defaults to the number of CPUs. With workers=1 everything runs in this
+    process. To reuse a pool across calls pass it as executor, the pool is left running
+    and workers should be its size. Any other keyword arguments are passed on to
+    parse_battle_record.
+    """
+    paths = [str(path) for path in paths]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor is None and workers <= 1:
+        try:
+            for path in paths:
+                yield _parse_one(path, transform, cache, parse_kwargs)
+        finally:
+            if cache is not None:
+                cache.flush()
+        return
+
+    chunks = _chunk_paths(paths, workers)
+    args = (transform, cache, parse_kwargs)
+    if executor is not None:
+        yield from _parse_over(executor, _parse_chunk, chunks, args, workers)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _parse_over(pool, _parse_chunk, chunks, args, workers)
+
+
+def _parse_over(
+    executor: Executor,
+    parse_chunk: Callable[..., List[ParseResult]],
+    chunks: Iterator[list],
+    args: tuple,
+    workers: int,
+) -> Iterator[ParseResult]:
+    # Chunks are lists of paths or of (name, content) pairs.
+    futures = {}
+    try:
+        for chunk in chunks:
+            if len(futures) >= CHUNKS_AHEAD * workers:
+                yield from _completed_results(futures)
+            names = [item if isinstance(item, str) else item[0] for item in chunk]
+            futures[executor.submit(parse_chunk, chunk, *args)] = names
+        while futures:
+            yield from _completed_results(futures)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _completed_results(futures: dict) -> Iterator[ParseResult]:
+    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+    for future in done:
+        names = futures.pop(future)
+        try:
+            results = future.result()
+        except Exception as error:
+            # The worker died or its results could not be pickled, every file in the
+            # chunk is reported with that error.
+            results = [(name, error) for name in names]
+        yield from results
+
+
+def _chunk_paths(paths: List[str], workers: int) -> Iterator[List[str]]:
+    max_files = min(MAX_CHUNK_FILES, math.ceil(len(paths) / workers))
+    chunk = []
+    chunk_bytes = 0
+    for path in paths:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # Let the worker report the error for this file.
+            size = 0
+        if chunk and (chunk_bytes + size > CHUNK_BYTES or len(chunk) >= max_files):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(path)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def _parse_one(
+    path: str,
+    transform: Optional[Callable[[BattleRecord], Any]],
+    cache: Optional[ParseCache],
+    parse_kwargs: dict,
+) -> ParseResult:
+    try:
+        if cache is not None:
+            battle_record = cache.parse_battle_record(path, **parse_kwargs)
+        else:
+            battle_record = parse_battle_record(path, **parse_kwargs)
+        return path, transform(battle_record) if transform else battle_record
+    except Exception as error:
+        return path, error
+
+
+def _parse_chunk(
+    paths: List[str],
+    transform: Optional[Callable[[BattleRecord], Any]],
+    cache: Optional[ParseCache],
+    parse_kwargs: dict,
+) -> List[ParseResult]:
+    try:
+        return [_parse_one(path, transform, cache, parse_kwargs) for path in paths]
+    finally:
+        # The cache was unpickled for this chunk, write back its hits and close it.
+        if cache is not None:
+            cache.close()
+
+
+def parse_archive_records(
+    archive: Union[str, Path, BinaryIO],
+    workers: Optional[int] = None,
+    transform: Optional[Callable[[BattleRecord], Any]] = None,
+    executor: Optional[Executor] = None,
+    **parse_kwargs,
+) -> Iterator[ParseResult]:
+    """Parses every replay in a zip or tar archive, yielding (member name, result).
+
+    Members are read one after the other with iter_archive_replays and their content is
+    handed to the workers, nothing is extracted to disk. Results arrive in completion
+    order, failures are reported as for parse_battle_records. An archive that cannot be
+    read raises.
+
+    workers, transform, executor and any other keyword arguments work as for
+    parse_battle_records.
+    """
+    members = iter_archive_replays(archive)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if executor is None and workers <= 1:
+        for name, content in members:
+            yield _parse_member(name, content, transform, parse_kwargs)
+        return
+
+    chunks = _chunk_members(members)
+    args = (transform, parse_kwargs)
+    if executor is not None:
+        yield from _parse_over(executor, _parse_member_chunk, chunks, args, workers)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _parse_over(pool, _parse_member_chunk, chunks, args, workers)
+
+
+def _chunk_members(
+    members: Iterator[Tuple[str, bytes]],
+) -> Iterator[List[Tuple[str, bytes]]]:
+    chunk = []
+    chunk_bytes = 0
+    for name, content in members:
+        if chunk and (
+            chunk_bytes + len(content) > CHUNK_BYTES or len(chunk) >= MAX_CHUNK_FILES
+        ):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+        chunk.append((name, content))
+        chunk_bytes += len(content)
+    if chunk:
+        yield chunk
+
+
+def _parse_member(
+    name: str,
+    content: bytes,
+    transform: Optional[Callable[[BattleRecord], Any]],
+    parse_kwargs: dict,
+) -> ParseResult:
+    try:
+        battle_record = parse_battle_record(content, **parse_kwargs)
+        return name, transform(battle_record) if transform else battle_record
+    except Exception as error:
+        return name, error
+
+
+def _parse_member_chunk(
+    members: List[Tuple[str, bytes]],
+    transform: Optional[Callable[[BattleRecord], Any]],
+    parse_kwargs: dict,
+) -> List[ParseResult]:
+    return [
+        _parse_member(name, content, transform, parse_kwargs)
+        for name, content in members
+    ]
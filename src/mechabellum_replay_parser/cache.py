@@ -0,0 +1,268 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from importlib import metadata
+from pathlib import Path
+from typing import Optional, Union
+
+from . import BattleRecord, _special_case_spawn_index, parse_battle_record
+from .lookups import LOOKUPS
+
+# Bump this whenever the shape of the parsed dataclasses changes so that records pickled
+# by an older parser are never handed back.
+CACHE_FORMAT_VERSION = 3
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Hits only bump their last used time in memory and new records are held back, both are
+# written in batches so that a run is not one transaction per replay.
+TOUCH_FLUSH_INTERVAL = 256
+PUT_FLUSH_INTERVAL = 64
+
+
+def _parser_version() -> str:
+    try:
+        return metadata.version("mechabellum-replay-parser")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _lookup_tables_digest() -> str:
+    encoded = json.dumps(
+        [LOOKUPS.digest(), _special_case_spawn_index()], sort_keys=True, default=str
+    ).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def parser_fingerprint() -> str:
+    """Identifies the parser and lookup tables that produced a cached record."""
+    return f"{CACHE_FORMAT_VERSION}:{_parser_version()}:{_lookup_tables_digest()}"
+
+
+class ParseCache:
+    """Persistent cache of parsed BattleRecords stored in a single sqlite file.
+
+    Entries are keyed by the replay file and by parser_fingerprint(), so a new parser
+    version or a change to the lookup tables misses automatically; entries left over
+    from an older fingerprint are purged when the cache is opened. With key="stat" a
+    file is identified by its path, size, mtime and inode which costs a single stat
+    call. With key="content" the file contents are hashed, which also survives renames
+    and copies.
+
+    Once the stored records grow past max_bytes the least recently used ones are
+    evicted. The total size is kept up to date by triggers, so checking it does not read
+    the table.
+
+    The cache can be pickled and shared with worker processes, each process opens its
+    own connection on first use and writes its records when it flushes or closes.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        key: str = "stat",
+    ):
+        if key not in ("stat", "content"):
+            raise ValueError(f"Unknown cache key type {key!r}.")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.key = key
+        self.fingerprint = parser_fingerprint()
+        self._connection = None
+        self._pending_touches = {}
+        self._pending_puts = {}
+        self._pending_bytes = 0
+        self._stored_bytes = 0
+        # Set up once here rather than by every worker the cache is sent to.
+        self._create_tables()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_connection"] = None
+        state["_pending_touches"] = {}
+        state["_pending_puts"] = {}
+        state["_pending_bytes"] = 0
+        return state
+
+    def __enter__(self) -> "ParseCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection = connection
+            self._stored_bytes = self._read_total()
+        return self._connection
+
+    def _create_tables(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.path, timeout=60) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL, data BLOB NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS totals ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+            )
+            # Caches written before the totals table existed start from their sum.
+            connection.execute(
+                "INSERT OR IGNORE INTO totals "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM entries"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size; END"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_update "
+                "AFTER UPDATE OF size ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes + NEW.size - OLD.size; END"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries "
+                "BEGIN UPDATE totals SET bytes = bytes - OLD.size; END"
+            )
+            connection.execute(
+                "DELETE FROM entries WHERE fingerprint != ?", (self.fingerprint,)
+            )
+        connection.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def entry_key(self, file_path: Union[str, Path]) -> str:
+        if self.key == "content":
+            with open(file_path, "rb") as file:
+                identity = hashlib.file_digest(file, "blake2b").hexdigest()
+        else:
+            stat = os.stat(file_path)
+            identity = (
+                f"{os.path.abspath(file_path)}:{stat.st_size}:"
+                f"{stat.st_mtime_ns}:{stat.st_ino}"
+            )
+        return hashlib.blake2b(
+            f"{self.fingerprint}:{identity}".encode("utf-8"), digest_size=20
+        ).hexdigest()
+
+    def get(self, file_path: Union[str, Path]) -> Optional[BattleRecord]:
+        return self._get(self.entry_key(file_path))
+
+    def _get(self, key: str) -> Optional[BattleRecord]:
+        pending = self._pending_puts.get(key)
+        if pending is not None:
+            data = pending[2]
+        else:
+            row = self.connection.execute(
+                "SELECT data FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            data = row[0]
+
+        self._pending_touches[key] = time.time()
+        if len(self._pending_touches) >= TOUCH_FLUSH_INTERVAL:
+            self.flush()
+        return pickle.loads(zlib.decompress(data))
+
+    def put(self, file_path: Union[str, Path], battle_record: BattleRecord) -> None:
+        self._put(self.entry_key(file_path), battle_record)
+
+    def _put(self, key: str, battle_record: BattleRecord) -> None:
+        data = zlib.compress(
+            pickle.dumps(battle_record, protocol=pickle.HIGHEST_PROTOCOL), 1
+        )
+        self._pending_puts[key] = (len(data), time.time(), data)
+        self._pending_bytes += len(data)
+        if (
+            len(self._pending_puts) >= PUT_FLUSH_INTERVAL
+            or self._stored_bytes + self._pending_bytes > self.max_bytes
+        ):
+            self.flush()
+
+    def parse_battle_record(
+        self, file_path: Union[str, Path], **parse_kwargs
+    ) -> BattleRecord:
+        """Returns the cached record for file_path, parsing and storing it on a miss."""
+        # Worked out once, with key="content" it means hashing the whole replay.
+        key = self.entry_key(file_path)
+        battle_record = self._get(key)
+        if battle_record is None:
+            battle_record = parse_battle_record(file_path, **parse_kwargs)
+            self._put(key, battle_record)
+        return battle_record
+
+    def flush(self) -> None:
+        """Writes the held back records and last used times, then evicts if needed."""
+        if not self._pending_touches and not self._pending_puts:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE "
+                "SET size = excluded.size, last_used = excluded.last_used, "
+                "data = excluded.data",
+                [
+                    (key, self.fingerprint, size, used, data)
+                    for key, (size, used, data) in self._pending_puts.items()
+                ],
+            )
+            self.connection.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._pending_touches.items()],
+            )
+        self._pending_puts = {}
+        self._pending_bytes = 0
+        self._pending_touches = {}
+        self._stored_bytes = self._read_total()
+        self._evict()
+
+    def clear(self) -> None:
+        self._pending_touches = {}
+        self._pending_puts = {}
+        self._pending_bytes = 0
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+        self._stored_bytes = 0
+
+    def total_bytes(self) -> int:
+        self.flush()
+        return self._read_total()
+
+    def _read_total(self) -> int:
+        return self.connection.execute("SELECT bytes FROM totals").fetchone()[0]
+
+    def _evict(self) -> None:
+        excess = self._stored_bytes - self.max_bytes
+        if excess <= 0:
+            return
+
+        evicted = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM entries ORDER BY last_used"
+        ):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        with self.connection:
+            self.connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+        self._stored_bytes = self._read_total()
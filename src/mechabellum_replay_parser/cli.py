@@ -1,54 +1,420 @@
 import argparse
+import glob
+import io
+import json
+import os
+import sys
 from pathlib import Path
+from typing import Any, Iterable, List, Tuple
+from xml.etree.ElementTree import ParseError
 
 from prettytable import PrettyTable
 
-from . import parse_battle_record
-from . import battle_record_to_string
+from . import BattleRecord, MoveUnitAction
+from . import write_battle_record
 
+# The modules behind each subcommand are imported by its handler, so that --help and the
+# other subcommands do not pay for process pools, sqlite or asyncio.
 
-def show_battle_record(args):
-    battle_record = parse_battle_record(Path(args.file).absolute())
-    table = battle_record_to_string(battle_record)
-    print(table)
+# Default manifest of the watch command, kept in the watched directory.
+MANIFEST_NAME = ".replay-watch.sqlite"
 
 
-def show_tech(args):
-    battle_record = parse_battle_record(Path(args.file).absolute())
+def _battle_table(battle_record: BattleRecord) -> str:
+    output = io.StringIO()
+    write_battle_record(battle_record, output)
+    # print adds the last newline.
+    return output.getvalue()[:-1]
+
+
+def _battle_plain(battle_record: BattleRecord) -> str:
+    output = io.StringIO()
+    write_battle_record(battle_record, output, plain=True)
+    return output.getvalue()[:-1]
+
+
+def _battle_json(battle_record: BattleRecord) -> dict:
+    players = []
+    for player in battle_record.player_records:
+        rounds = []
+        for round_idx, round_record in enumerate(player.round_records):
+            rounds.append(
+                {
+                    "round": round_record.round,
+                    "hp": round_record.player_hp,
+                    "actions": [
+                        str(action)
+                        for action in round_record.actions
+                        if not isinstance(action, MoveUnitAction)
+                    ],
+                    "deployments": player.deployments.count[round_idx],
+                    "value_on_board": player.deployments.value[round_idx],
+                }
+            )
+        players.append(
+            {
+                "id": player.id,
+                "name": player.name,
+                "starting_officer": player.starting_officer,
+                "starting_units": [
+                    unit.unit_name for unit in player.starting_units.units.values()
+                ],
+                "rounds": rounds,
+            }
+        )
+    return {"players": players}
+
+
+def _tech_table(battle_record: BattleRecord) -> str:
+    lines = []
     for player in battle_record.player_records:
-        print(player.name)
+        lines.append(player.name)
         table = PrettyTable()
         table.align = "l"
         table.field_names = ["Unit", "Techs"]
         for unit, techs in player.tech_choices.items():
             table.add_row([unit, "\n".join(techs)])
             table.add_divider()
-        print(table)
-        print()
+        lines.append(str(table))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _tech_plain(battle_record: BattleRecord) -> str:
+    return "\n".join(
+        f"{player.name} {unit}: {', '.join(techs)}"
+        for player in battle_record.player_records
+        for unit, techs in player.tech_choices.items()
+    )
+
+
+def _tech_json(battle_record: BattleRecord) -> dict:
+    return {
+        "players": [
+            {"id": player.id, "name": player.name, "techs": player.tech_choices}
+            for player in battle_record.player_records
+        ]
+    }
+
+
+# Renderers run in the parser processes so only the rendered output is sent back.
+RENDERERS = {
+    "battle": {"table": _battle_table, "plain": _battle_plain, "json": _battle_json},
+    "tech": {"table": _tech_table, "plain": _tech_plain, "json": _tech_json},
+}
+
+
+FORMATS_SHOWN = ["table", "plain", "json"]
+
+
+def _in_input_order(paths: List[str], results: Iterable[Tuple[str, Any]]):
+    """Yields (path, result) in the order of paths while results arrive in any order."""
+    pending = {}
+    position = 0
+    for path, result in results:
+        pending.setdefault(path, []).append(result)
+        while position < len(paths) and pending.get(paths[position]):
+            yield paths[position], pending[paths[position]].pop(0)
+            position += 1
+
+
+def _print_result(path: str, result, format: str, header: bool) -> bool:
+    """Prints a rendered replay or its parse error, returns False for an error."""
+    if isinstance(result, Exception):
+        if format == "json":
+            print(json.dumps({"replay": path, "error": str(result)}))
+        else:
+            print(f"Failed to parse {path}: {result}", file=sys.stderr)
+    elif format == "json":
+        print(json.dumps({"replay": path, **result}))
+    else:
+        if header:
+            print(path)
+        print(result)
+    sys.stdout.flush()
+    return not isinstance(result, Exception)
+
+
+def show_records(args):
+    from .bulk import parse_battle_records
+
+    paths = [str(path.absolute()) for path in _replay_paths(args.paths)]
+    renderer = RENDERERS[args.command][args.format]
+    failed = 0
+    # A single replay is parsed here, starting a pool would only add to its time.
+    workers = args.jobs if len(paths) > 1 else 1
+    results = parse_battle_records(paths, workers=workers, transform=renderer)
+    for path, result in _in_input_order(paths, results):
+        if not _print_result(path, result, args.format, len(paths) > 1):
+            failed += 1
+    if failed:
+        sys.exit(1)
+
+
+def watch_records(args):
+    from .watch import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, ReplayWatcher
+
+    directory = Path(args.directory).absolute()
+    manifest = args.manifest or directory / MANIFEST_NAME
+
+    def sink(path, result):
+        _print_result(path, result, args.format, True)
+
+    with ReplayWatcher(
+        directory,
+        sink,
+        manifest,
+        workers=args.jobs,
+        transform=RENDERERS[args.show][args.format],
+        settle_seconds=DEFAULT_SETTLE_SECONDS if args.settle is None else args.settle,
+    ) as watcher:
+        if args.skip_existing:
+            print(f"Skipped {watcher.skip_existing()} existing replays.")
+        try:
+            watcher.run(
+                DEFAULT_POLL_INTERVAL if args.interval is None else args.interval
+            )
+        except KeyboardInterrupt:
+            pass
+
+
+def _replay_paths(paths):
+    for path in paths:
+        # Shells on Windows leave wildcards to the program.
+        if glob.has_magic(path) and not os.path.exists(path):
+            yield from sorted(Path(match) for match in glob.glob(path))
+            continue
+        path = Path(path)
+        if path.is_dir():
+            yield from sorted(path.glob("*.grbr"))
+        else:
+            yield path
+
+
+def export_records(args):
+    from .bulk import parse_battle_records
+    from .export import ColumnarWriter
+
+    failed = 0
+    with ColumnarWriter(args.output, format=args.format) as writer:
+        for path, result in parse_battle_records(
+            _replay_paths(args.paths), workers=args.jobs
+        ):
+            if isinstance(result, Exception):
+                failed += 1
+                print(f"Failed to parse {path}: {result}", file=sys.stderr)
+                continue
+            writer.write(Path(path).name, result)
+    if failed:
+        print(f"{failed} replays could not be exported.", file=sys.stderr)
+        sys.exit(1)
+
+
+def ingest_records(args):
+    from .database import ingest_replays
+
+    report = ingest_replays(args.database, _replay_paths(args.paths), workers=args.jobs)
+    for path, error in report.failed.items():
+        print(f"Failed to parse {path}: {error}", file=sys.stderr)
+    print(
+        f"Ingested {len(report.ingested)} replays, skipped {len(report.skipped)} "
+        f"already in the database, {len(report.failed)} failed."
+    )
+    if report.failed:
+        sys.exit(1)
+
+
+def dedup_records(args):
+    from .dedup import DedupIndex
+
+    with DedupIndex(args.index) as index:
+        for path in _replay_paths(args.paths):
+            try:
+                index.add(path.absolute())
+            except (OSError, ValueError, ParseError) as error:
+                print(f"Failed to read {path}: {error}")
+        battles = 0
+        for _, copies in index.duplicates():
+            battles += 1
+            print(copies[0])
+            for copy in copies[1:]:
+                print(f"  duplicate: {copy}")
+    print(
+        f"{battles} battles have more than one copy, the most complete is listed first."
+    )
+
+
+def serve_records(args):
+    import asyncio
+
+    from .aio import ReplayScheduler, serve_http
+
+    def started(server):
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"Listening on http://{host}:{port}/parse")
+        sys.stdout.flush()
+
+    async def serve():
+        async with ReplayScheduler(workers=args.jobs) as scheduler:
+            await serve_http(
+                args.host,
+                args.port,
+                scheduler,
+                transform=RENDERERS[args.show]["json"],
+                started=started,
+            )
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
+    from .export import FORMATS
+
     parser = argparse.ArgumentParser(description="Mechabellum replay file parser")
     subparsers = parser.add_subparsers(dest="command")
 
     battle_parser = subparsers.add_parser(
-        "battle", help="Parse a Mechabellum replay file (.grbr)"
+        "battle", help="Parse Mechabellum replay files (.grbr)"
     )
-    battle_parser.add_argument(
-        "file", help="Path to the Mechabellum replay file (.grbr)"
+    tech_parser = subparsers.add_parser(
+        "tech", help="Show tech information of both players in replay files."
     )
-    battle_parser.set_defaults(func=show_battle_record)
+    for show_parser in (battle_parser, tech_parser):
+        show_parser.add_argument(
+            "paths",
+            nargs="+",
+            help="Replay files (.grbr), glob patterns or directories containing replay "
+            "files.",
+        )
+        show_parser.add_argument(
+            "--format",
+            choices=FORMATS_SHOWN,
+            default="table",
+            help="plain prints a line per player and round without laying out a table, "
+            "json prints one JSON object per replay and line.",
+        )
+        show_parser.add_argument(
+            "--jobs",
+            type=int,
+            default=None,
+            help="Number of parser processes, defaults to the number of CPUs.",
+        )
+        show_parser.set_defaults(func=show_records)
 
-    tech_parser = subparsers.add_parser(
-        "tech", help="Show tech information of both players in a replay file."
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export replays to columnar tables of rounds, actions, units and techs.",
+    )
+    export_parser.add_argument(
+        "paths", nargs="+", help="Replay files or directories containing replay files."
+    )
+    export_parser.add_argument(
+        "--output", required=True, help="Directory the tables are written to."
+    )
+    export_parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="parquet",
+        help="parquet and arrow need pyarrow installed, columns has no dependencies.",
+    )
+    export_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of parser processes."
+    )
+    export_parser.set_defaults(func=export_records)
+
+    ingest_parser = subparsers.add_parser(
+        "ingest", help="Parse replays into a sqlite database, skipping known replays."
+    )
+    ingest_parser.add_argument(
+        "paths", nargs="+", help="Replay files or directories containing replay files."
+    )
+    ingest_parser.add_argument(
+        "--database", required=True, help="Path of the sqlite database."
+    )
+    ingest_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of parser processes."
+    )
+    ingest_parser.set_defaults(func=ingest_records)
+
+    dedup_parser = subparsers.add_parser(
+        "dedup", help="List replays that are copies of the same battle."
+    )
+    dedup_parser.add_argument(
+        "paths", nargs="+", help="Replay files or directories containing replay files."
+    )
+    dedup_parser.add_argument(
+        "--index",
+        default=":memory:",
+        help="sqlite file to keep the index in, so later runs only add new replays.",
+    )
+    dedup_parser.set_defaults(func=dedup_records)
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Parse replays as they are added to a directory."
+    )
+    watch_parser.add_argument("directory", help="Directory replays are saved to.")
+    watch_parser.add_argument(
+        "--show",
+        choices=list(RENDERERS),
+        default="battle",
+        help="What to print for each new replay, like the battle and tech commands.",
+    )
+    watch_parser.add_argument("--format", choices=FORMATS_SHOWN, default="table")
+    watch_parser.add_argument(
+        "--manifest",
+        help=f"File recording the processed replays, {MANIFEST_NAME} in the directory "
+        "by default.",
+    )
+    watch_parser.add_argument(
+        "--skip-existing",
+        action="store_true",
+        help="Only parse replays added from now on.",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        help="Seconds between checks for new replays, 2 by default.",
+    )
+    watch_parser.add_argument(
+        "--settle",
+        type=float,
+        help="Seconds a replay must stay unchanged before it is parsed, 2 by default.",
+    )
+    watch_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of parser processes."
+    )
+    watch_parser.set_defaults(func=watch_records)
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Serve an HTTP endpoint that parses replays POSTed to /parse into JSON.",
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument(
+        "--show",
+        choices=list(RENDERERS),
+        default="battle",
+        help="What to answer with, the JSON of the battle or tech command.",
+    )
+    serve_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of parser processes."
     )
-    tech_parser.add_argument("file", help="Path to the Mechabellum replay file (.grbr)")
-    tech_parser.set_defaults(func=show_tech)
+    serve_parser.set_defaults(func=serve_records)
 
     args = parser.parse_args()
 
     if args.command:
-        args.func(args)
+        try:
+            args.func(args)
+        except BrokenPipeError:
+            # The output was piped into a program that quit early, like head or less.
+            # Point stdout at devnull so flushing it on exit does not raise again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
     else:
         parser.print_help()
 
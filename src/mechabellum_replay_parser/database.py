@@ -0,0 +1,268 @@
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from . import BattleRecord
+from .bulk import parse_battle_records
+from .export import battle_record_rows
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS battles (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    version TEXT,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    player_id TEXT,
+    name TEXT,
+    starting_officer TEXT,
+    last_round INTEGER
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    player_id TEXT,
+    player_name TEXT,
+    round INTEGER,
+    player_hp INTEGER,
+    deployment_count INTEGER,
+    deployment_value INTEGER,
+    action_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS actions (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    player_id TEXT,
+    round INTEGER,
+    sequence INTEGER,
+    action_type TEXT,
+    subject TEXT,
+    detail TEXT,
+    count INTEGER,
+    level INTEGER,
+    unit_index INTEGER,
+    x INTEGER,
+    y INTEGER
+);
+CREATE TABLE IF NOT EXISTS deployments (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    player_id TEXT,
+    round INTEGER,
+    unit_index INTEGER,
+    unit_name TEXT,
+    ident INTEGER,
+    sell_supply INTEGER,
+    x INTEGER,
+    y INTEGER
+);
+CREATE TABLE IF NOT EXISTS techs (
+    battle_id INTEGER NOT NULL REFERENCES battles (id),
+    player_id TEXT,
+    unit TEXT,
+    position INTEGER,
+    tech TEXT
+);
+CREATE INDEX IF NOT EXISTS players_battle ON players (battle_id);
+CREATE INDEX IF NOT EXISTS players_name ON players (name);
+CREATE INDEX IF NOT EXISTS players_player_id ON players (player_id);
+CREATE INDEX IF NOT EXISTS rounds_battle ON rounds (battle_id, player_id, round);
+CREATE INDEX IF NOT EXISTS actions_battle ON actions (battle_id, player_id, round);
+CREATE INDEX IF NOT EXISTS actions_type ON actions (action_type, subject);
+CREATE INDEX IF NOT EXISTS deployments_battle
+    ON deployments (battle_id, player_id, round);
+CREATE INDEX IF NOT EXISTS techs_battle ON techs (battle_id, player_id);
+"""
+
+# Export tables are stored under the same name apart from the end of round boards.
+TABLE_NAMES = {
+    "rounds": "rounds",
+    "actions": "actions",
+    "units": "deployments",
+    "techs": "techs",
+}
+
+# Battles written per transaction by the writer thread.
+BATCH_BATTLES = 500
+
+PlayerRow = Tuple[Optional[str], Optional[str], Optional[str], Optional[int]]
+
+
+def connect(database_path: Union[str, Path]) -> sqlite3.Connection:
+    """Opens the replay database, creating the schema if needed."""
+    connection = sqlite3.connect(database_path)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def content_hash(file_path: Union[str, Path]) -> str:
+    with open(file_path, "rb") as file:
+        return hashlib.file_digest(file, "blake2b").hexdigest()
+
+
+def known_content_hashes(connection: sqlite3.Connection) -> Set[str]:
+    return {row[0] for row in connection.execute("SELECT content_hash FROM battles")}
+
+
+@dataclass
+class FlatBattle:
+    """A BattleRecord flattened into rows, compact enough to send between processes."""
+
+    version: str
+    players: List[PlayerRow]
+    rows: Dict[str, list]
+
+
+def flatten_battle_record(battle_record: BattleRecord) -> FlatBattle:
+    return FlatBattle(
+        version=battle_record.version,
+        players=[
+            (
+                player.id,
+                player.name,
+                player.starting_officer,
+                player.round_records[-1].round if player.round_records else None,
+            )
+            for player in battle_record.player_records
+        ],
+        # The replay column is replaced by the battle id once the battle is inserted.
+        rows=battle_record_rows(None, battle_record),
+    )
+
+
+@dataclass
+class IngestReport:
+    ingested: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+def ingest_replays(
+    database_path: Union[str, Path],
+    paths: Iterable[Union[str, Path]],
+    workers: Optional[int] = None,
+    batch_battles: int = BATCH_BATTLES,
+) -> IngestReport:
+    """Parses replays in parallel and inserts them into the sqlite database.
+
+    Replays whose content hash is already in the database are skipped before parsing.
+    Parsing and flattening happen in worker processes, a single writer thread inserts
+    the rows with executemany, committing every batch_battles battles.
+    """
+    report = IngestReport()
+    connection = connect(database_path)
+    known_hashes = known_content_hashes(connection)
+    connection.close()
+
+    paths = [str(path) for path in paths]
+    hashes = {}
+    with ThreadPoolExecutor() as executor:
+        for path, digest in zip(paths, executor.map(_try_content_hash, paths)):
+            if isinstance(digest, Exception):
+                report.failed[path] = str(digest)
+            elif digest in known_hashes:
+                report.skipped.append(path)
+            else:
+                known_hashes.add(digest)
+                hashes[path] = digest
+
+    writer = _DatabaseWriter(database_path, batch_battles)
+    writer.start()
+    try:
+        for path, result in parse_battle_records(
+            list(hashes), workers=workers, transform=flatten_battle_record
+        ):
+            if isinstance(result, Exception):
+                report.failed[path] = str(result)
+                continue
+            writer.put((hashes[path], Path(path).name, result))
+            report.ingested.append(path)
+    finally:
+        writer.finish()
+    return report
+
+
+def _try_content_hash(file_path: str) -> Union[str, Exception]:
+    try:
+        return content_hash(file_path)
+    except OSError as error:
+        return error
+
+
+class _DatabaseWriter(threading.Thread):
+    def __init__(self, database_path: Union[str, Path], batch_battles: int):
+        super().__init__(name="replay-database-writer", daemon=True)
+        self.database_path = database_path
+        self.batch_battles = batch_battles
+        # Bounded so that parsing cannot run arbitrarily far ahead of the inserts.
+        self.battles = queue.Queue(maxsize=4 * batch_battles)
+        self.error = None
+
+    def put(self, battle: Tuple[str, str, FlatBattle]) -> None:
+        if self.error is not None:
+            raise self.error
+        self.battles.put(battle)
+
+    def finish(self) -> None:
+        self.battles.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self) -> None:
+        connection = None
+        done = False
+        try:
+            connection = connect(self.database_path)
+            while not done:
+                batch = []
+                while len(batch) < self.batch_battles:
+                    battle = self.battles.get()
+                    if battle is None:
+                        done = True
+                        break
+                    batch.append(battle)
+                if batch:
+                    with connection:
+                        for battle in batch:
+                            self._insert(connection, *battle)
+        except Exception as error:
+            self.error = error
+            # Keep draining so the producer never blocks on a full queue.
+            while not done:
+                done = self.battles.get() is None
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _insert(
+        self,
+        connection: sqlite3.Connection,
+        digest: str,
+        file_name: str,
+        battle: FlatBattle,
+    ) -> None:
+        battle_id = connection.execute(
+            "INSERT INTO battles (content_hash, file_name, version, ingested_at) "
+            "VALUES (?, ?, ?, ?)",
+            (digest, file_name, battle.version, time.time()),
+        ).lastrowid
+        connection.executemany(
+            "INSERT INTO players VALUES (?, ?, ?, ?, ?)",
+            [(battle_id,) + player for player in battle.players],
+        )
+        for name, rows in battle.rows.items():
+            if not rows:
+                continue
+            placeholders = ", ".join("?" * len(rows[0]))
+            connection.executemany(
+                f"INSERT INTO {TABLE_NAMES[name]} VALUES ({placeholders})",
+                [(battle_id,) + row[1:] for row in rows],
+            )
@@ -0,0 +1,234 @@
+import os
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from . import (
+    BattleRecord,
+    PlayerRecord,
+    PlayerRoundRecord,
+    ReplayHeader,
+    extract_xml_view,
+    parse_battle_record,
+    scan_replay_header,
+)
+
+# The round child of a PlayerRoundRecord, after any leaf elements that come before it.
+# Snapshots in matchDatas have round elements as well, those do not count.
+_ROUND_RECORD_REGEX = re.compile(
+    rb"<PlayerRoundRecord(?:\s[^>]*)?>(?:\s*<(\w+)>[^<]*</\1>)*?\s*<round>(\d+)</round>"
+)
+
+
+def battle_fingerprint(header: ReplayHeader) -> Optional[str]:
+    """Identifies the battle a replay was recorded from, the same for every copy of it.
+
+    Built from the game version, the match id in the file name and the player ids. None
+    when the file was renamed and the match id is unknown.
+    """
+    if header.match_id is None:
+        return None
+    player_ids = ",".join(sorted(player.id for player in header.players))
+    return f"{header.version}:{header.match_id}:{player_ids}"
+
+
+def recorded_rounds(file_path: Union[str, Path]) -> Set[int]:
+    """The rounds of the player round records in a replay, found with a byte search."""
+    with extract_xml_view(file_path) as view:
+        return {int(match[2]) for match in _ROUND_RECORD_REGEX.finditer(view)}
+
+
+@dataclass
+class IndexedReplay:
+    path: str
+    fingerprint: Optional[str]
+    rounds: int
+    # The most complete copy of the battle known to the index, possibly this replay.
+    canonical: str
+    # True when another copy of the battle was indexed before.
+    duplicate: bool
+
+
+class DedupIndex:
+    """Groups replay files by battle_fingerprint in a sqlite file.
+
+    Adding a replay costs a header scan and one indexed lookup, however many replays are
+    in the index. Among the copies of a battle the one with the most rounds, then the
+    largest, is the canonical one: late joining observers miss the early rounds.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS replays (path TEXT PRIMARY KEY, "
+                "fingerprint TEXT, rounds INTEGER NOT NULL, size INTEGER NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS replays_fingerprint "
+                "ON replays (fingerprint, rounds DESC, size DESC)"
+            )
+
+    def __enter__(self) -> "DedupIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def add(self, file_path: Union[str, Path]) -> IndexedReplay:
+        path = str(file_path)
+        fingerprint = battle_fingerprint(scan_replay_header(Path(path)))
+        rounds = len(recorded_rounds(path))
+        duplicate = fingerprint is not None and any(
+            copy != path for copy in self.copies(fingerprint)
+        )
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO replays VALUES (?, ?, ?, ?)",
+                (path, fingerprint, rounds, os.path.getsize(path)),
+            )
+        canonical = self.canonical(fingerprint) if fingerprint is not None else path
+        return IndexedReplay(path, fingerprint, rounds, canonical, duplicate)
+
+    def remove(self, file_path: Union[str, Path]) -> None:
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM replays WHERE path = ?", (str(file_path),)
+            )
+
+    def canonical(self, fingerprint: str) -> Optional[str]:
+        copies = self.copies(fingerprint, limit=1)
+        return copies[0] if copies else None
+
+    def copies(self, fingerprint: str, limit: int = -1) -> List[str]:
+        """Paths of the copies of a battle, the most complete first."""
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT path FROM replays WHERE fingerprint = ? "
+                "ORDER BY rounds DESC, size DESC, path LIMIT ?",
+                (fingerprint, limit),
+            )
+        ]
+
+    def duplicates(self) -> Iterator[Tuple[str, List[str]]]:
+        """Yields (fingerprint, copies) for every battle with more than one copy."""
+        fingerprints = self.connection.execute(
+            "SELECT fingerprint FROM replays WHERE fingerprint IS NOT NULL "
+            "GROUP BY fingerprint HAVING COUNT(*) > 1 ORDER BY fingerprint"
+        ).fetchall()
+        for (fingerprint,) in fingerprints:
+            yield fingerprint, self.copies(fingerprint)
+
+    def merged(self, fingerprint: str, **parse_kwargs) -> Optional[BattleRecord]:
+        """Parses every copy of a battle and merges them, see merge_battle_records."""
+        copies = self.copies(fingerprint)
+        if not copies:
+            return None
+        return merge_battle_records(
+            [parse_battle_record(Path(path), **parse_kwargs) for path in copies]
+        )
+
+
+def merge_battle_records(battle_records: Sequence[BattleRecord]) -> BattleRecord:
+    """Combines copies of one battle into a record holding every round any copy has.
+
+    Players are matched by id. When several copies hold a round, the one from the copy
+    with the most rounds for that player is kept. Deployments are rebuilt from the
+    merged rounds and the starting units come from the earliest round after round 0.
+    """
+    copies: Dict[str, List[PlayerRecord]] = {}
+    for battle_record in battle_records:
+        for player in battle_record.player_records:
+            copies.setdefault(player.id, []).append(player)
+
+    player_records = []
+    for players in copies.values():
+        players = sorted(players, key=lambda player: -len(player.round_records))
+        rounds: Dict[int, PlayerRoundRecord] = {}
+        for player in players:
+            for round_record in player.round_records:
+                rounds.setdefault(round_record.round, round_record)
+        # The copy seeing the earliest round after round 0 has the real starting units.
+        starting = min(
+            players,
+            key=lambda player: min(
+                (r.round for r in player.round_records if r.round > 0),
+                default=float("inf"),
+            ),
+        )
+        player_records.append(
+            PlayerRecord(
+                version=players[0].version,
+                id=players[0].id,
+                name=players[0].name,
+                round_records=[rounds[number] for number in sorted(rounds)],
+                starting_units=starting.starting_units,
+                starting_officer=starting.starting_officer,
+                tech_choices=players[0].tech_choices,
+            )
+        )
+    return BattleRecord(
+        version=battle_records[0].version, player_records=player_records
+    )
+
+
+@dataclass
+class RoundDifference:
+    player_id: str
+    round: int
+    # "missing_in_first", "missing_in_second" or "changed".
+    kind: str
+    # Fields of the round record that differ, for changed rounds.
+    fields: Tuple[str, ...] = ()
+
+
+_COMPARED_ROUND_FIELDS = ("player_hp", "starting_units", "actions")
+
+
+def diff_battle_records(
+    first: BattleRecord, second: BattleRecord
+) -> List[RoundDifference]:
+    """Lists the rounds that only one of two copies has, or that they disagree on."""
+    differences = []
+    first_players = {player.id: player for player in first.player_records}
+    second_players = {player.id: player for player in second.player_records}
+    for player_id in dict.fromkeys([*first_players, *second_players]):
+        first_rounds = _rounds_by_number(first_players.get(player_id))
+        second_rounds = _rounds_by_number(second_players.get(player_id))
+        for round_number in sorted(first_rounds.keys() | second_rounds.keys()):
+            first_round = first_rounds.get(round_number)
+            second_round = second_rounds.get(round_number)
+            if first_round is None:
+                differences.append(
+                    RoundDifference(player_id, round_number, "missing_in_first")
+                )
+            elif second_round is None:
+                differences.append(
+                    RoundDifference(player_id, round_number, "missing_in_second")
+                )
+            else:
+                fields = tuple(
+                    name
+                    for name in _COMPARED_ROUND_FIELDS
+                    if getattr(first_round, name) != getattr(second_round, name)
+                )
+                if fields:
+                    differences.append(
+                        RoundDifference(player_id, round_number, "changed", fields)
+                    )
+    return differences
+
+
+def _rounds_by_number(
+    player: Optional[PlayerRecord],
+) -> Dict[int, PlayerRoundRecord]:
+    if player is None:
+        return {}
+    return {round_record.round: round_record for round_record in player.round_records}
@@ -0,0 +1,356 @@
+import json
+import os
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from . import (
+    BattleRecord,
+    BuyAction,
+    CommandCenterTowerAction,
+    DeviceAction,
+    MoveUnitAction,
+    PlayerAction,
+    ReinforcementSelection,
+    ResearchCenterTowerAction,
+    SkillAction,
+    TechAction,
+    UnitDrop,
+    UnlockAction,
+    UpgradeAction,
+)
+
+INT = "int"
+STR = "str"
+
+# Column names and types of every exported table. Every table starts with the replay
+# identifier given to ColumnarWriter.write and the player id so tables can be joined.
+TABLES: Dict[str, List[Tuple[str, str]]] = {
+    "rounds": [
+        ("replay", STR),
+        ("player_id", STR),
+        ("player_name", STR),
+        ("round", INT),
+        ("player_hp", INT),
+        ("deployment_count", INT),
+        ("deployment_value", INT),
+        ("action_count", INT),
+    ],
+    "actions": [
+        ("replay", STR),
+        ("player_id", STR),
+        ("round", INT),
+        ("sequence", INT),
+        ("action_type", STR),
+        ("subject", STR),
+        ("detail", STR),
+        ("count", INT),
+        ("level", INT),
+        ("unit_index", INT),
+        ("x", INT),
+        ("y", INT),
+    ],
+    "units": [
+        ("replay", STR),
+        ("player_id", STR),
+        ("round", INT),
+        ("unit_index", INT),
+        ("unit_name", STR),
+        ("ident", INT),
+        ("sell_supply", INT),
+        ("x", INT),
+        ("y", INT),
+    ],
+    "techs": [
+        ("replay", STR),
+        ("player_id", STR),
+        ("unit", STR),
+        ("position", INT),
+        ("tech", STR),
+    ],
+}
+
+FORMATS = ("parquet", "arrow", "columns")
+
+# The columns format has no null bitmap, missing integers are stored as this value.
+INT_NULL = -(2**63)
+
+Row = Tuple[Any, ...]
+
+
+def _text(value: Any) -> Optional[str]:
+    # Lookups fall back to the raw id when a name is unknown.
+    return None if value is None else str(value)
+
+
+def _action_row(action: PlayerAction) -> Tuple[Optional[str], ...]:
+    """Flattens an action into (subject, detail, count, level, unit_index, x, y)."""
+    if isinstance(action, (BuyAction, UnlockAction)):
+        return _text(action.unit), None, None, None, None, None, None
+    if isinstance(action, DeviceAction):
+        return _text(action.device), None, None, None, None, None, None
+    if isinstance(action, TechAction):
+        return _text(action.unit), _text(action.tech), None, None, None, None, None
+    if isinstance(action, UpgradeAction):
+        return _text(action.unit.unit_name), None, None, None, None, None, None
+    if isinstance(action, (CommandCenterTowerAction, ResearchCenterTowerAction)):
+        return _text(action.skill_name), None, None, None, None, None, None
+    if isinstance(action, UnitDrop):
+        return _text(action.unit), None, action.count, action.level, None, None, None
+    if isinstance(action, ReinforcementSelection):
+        return _text(action.card_name), None, None, None, None, None, None
+    if isinstance(action, SkillAction):
+        return (
+            _text(action.skill_name),
+            None,
+            None,
+            None,
+            action.target_unit_index,
+            None,
+            None,
+        )
+    if isinstance(action, MoveUnitAction):
+        return (
+            None,
+            "rotate" if action.rotate else None,
+            None,
+            None,
+            action.unit_index,
+            action.position.x,
+            action.position.y,
+        )
+    return None, None, None, None, None, None, None
+
+
+def battle_record_rows(
+    replay: str, battle_record: BattleRecord
+) -> Dict[str, List[Row]]:
+    """Flattens a BattleRecord into rows for each table in TABLES."""
+    rows = {name: [] for name in TABLES}
+    for player in battle_record.player_records:
+        player_id = player.id
+        for unit, techs in (player.tech_choices or {}).items():
+            for position, tech in enumerate(techs):
+                rows["techs"].append(
+                    (replay, player_id, _text(unit), position, _text(tech))
+                )
+
+        for record_number, round_record in enumerate(player.round_records):
+            rows["rounds"].append(
+                (
+                    replay,
+                    player_id,
+                    player.name,
+                    round_record.round,
+                    round_record.player_hp,
+                    player.deployments.count[record_number],
+                    player.deployments.value[record_number],
+                    len(round_record.actions),
+                )
+            )
+            for sequence, action in enumerate(round_record.actions):
+                rows["actions"].append(
+                    (
+                        replay,
+                        player_id,
+                        round_record.round,
+                        sequence,
+                        type(action).__name__,
+                    )
+                    + _action_row(action)
+                )
+            for unit_index, unit in player.deployments.units[
+                record_number
+            ].units.items():
+                position = unit.position
+                rows["units"].append(
+                    (
+                        replay,
+                        player_id,
+                        round_record.round,
+                        unit_index,
+                        unit.unit_name,
+                        unit.ident,
+                        unit.sell_supply,
+                        position.x if position else None,
+                        position.y if position else None,
+                    )
+                )
+    return rows
+
+
+class ColumnarWriter:
+    """Appends flattened battle records to one columnar dataset per table in TABLES.
+
+    Rows are buffered and written out every batch_rows rows, so a single writer can take
+    any number of replays. Each table is a directory below path:
+
+    parquet / arrow: every writer adds its own part file (Parquet, or Arrow IPC file) to
+    the table directory, read the directory back as a dataset with pyarrow. These
+    formats need the optional pyarrow dependency.
+
+    columns: dependency free. Every column is a raw array of int64 values appended in
+    place, strings are dictionary encoded with the dictionary stored one JSON string per
+    line next to the codes. Missing integers are stored as INT_NULL. Use read_columns to
+    load a table back.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        format: str = "parquet",
+        batch_rows: int = 64 * 1024,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}, use one of {FORMATS}.")
+        if format != "columns":
+            try:
+                import pyarrow
+            except ImportError as error:
+                raise ImportError(
+                    f"The {format} export format needs pyarrow, install it with the "
+                    "arrow extra or use format='columns'."
+                ) from error
+
+        self.path = Path(path)
+        self.format = format
+        self.batch_rows = batch_rows
+        self._buffers = {name: [] for name in TABLES}
+        self._writers = {}
+        self._dictionaries = {}
+        self._part_name = f"part-{time.time_ns()}-{os.getpid()}"
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, replay: str, battle_record: BattleRecord) -> None:
+        for name, rows in battle_record_rows(replay, battle_record).items():
+            buffer = self._buffers[name]
+            buffer.extend(rows)
+            if len(buffer) >= self.batch_rows:
+                self._flush_table(name)
+
+    def flush(self) -> None:
+        for name in TABLES:
+            self._flush_table(name)
+
+    def close(self) -> None:
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def _flush_table(self, name: str) -> None:
+        rows = self._buffers[name]
+        if not rows:
+            return
+        self._buffers[name] = []
+        table_path = self.path / name
+        table_path.mkdir(parents=True, exist_ok=True)
+        columns = list(zip(*rows))
+        if self.format == "columns":
+            self._append_columns(name, table_path, columns)
+        else:
+            self._write_arrow_batch(name, table_path, columns)
+
+    def _write_arrow_batch(self, name: str, table_path: Path, columns) -> None:
+        import pyarrow
+
+        schema = pyarrow.schema(
+            [
+                (column, pyarrow.int64() if kind == INT else pyarrow.string())
+                for column, kind in TABLES[name]
+            ]
+        )
+        batch = pyarrow.RecordBatch.from_arrays(
+            [
+                pyarrow.array(values, type=field.type)
+                for values, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+        writer = self._writers.get(name)
+        if writer is None:
+            if self.format == "parquet":
+                import pyarrow.parquet
+
+                writer = pyarrow.parquet.ParquetWriter(
+                    table_path / f"{self._part_name}.parquet", schema
+                )
+            else:
+                import pyarrow.ipc
+
+                writer = pyarrow.ipc.new_file(
+                    str(table_path / f"{self._part_name}.arrow"), schema
+                )
+            self._writers[name] = writer
+        writer.write_batch(batch)
+
+    def _append_columns(self, name: str, table_path: Path, columns) -> None:
+        for (column, kind), values in zip(TABLES[name], columns):
+            if kind == INT:
+                data = array("q", (INT_NULL if v is None else v for v in values))
+            else:
+                data = array("q", self._encode_strings(table_path, column, values))
+            with open(table_path / f"{column}.bin", "ab") as file:
+                data.tofile(file)
+
+    def _encode_strings(self, table_path: Path, column: str, values) -> List[int]:
+        dictionary_path = table_path / f"{column}.dict"
+        codes = self._dictionaries.get(dictionary_path)
+        if codes is None:
+            codes = {
+                value: code
+                for code, value in enumerate(_read_dictionary(dictionary_path))
+            }
+            self._dictionaries[dictionary_path] = codes
+
+        new_values = []
+        encoded = []
+        for value in values:
+            if value is None:
+                encoded.append(INT_NULL)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                new_values.append(value)
+            encoded.append(code)
+        if new_values:
+            with open(dictionary_path, "a", encoding="utf-8") as file:
+                file.writelines(json.dumps(value) + "\n" for value in new_values)
+        return encoded
+
+
+def _read_dictionary(dictionary_path: Path) -> List[str]:
+    if not dictionary_path.exists():
+        return []
+    with open(dictionary_path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def read_columns(path: Union[str, Path], table: str) -> Dict[str, Union[array, list]]:
+    """Loads a table written with format='columns'.
+
+    Integer columns come back as array('q') with INT_NULL for missing values, string
+    columns as lists of str and None.
+    """
+    table_path = Path(path) / table
+    columns = {}
+    for column, kind in TABLES[table]:
+        data = array("q")
+        column_path = table_path / f"{column}.bin"
+        if column_path.exists():
+            data.frombytes(column_path.read_bytes())
+        if kind == STR:
+            dictionary = _read_dictionary(table_path / f"{column}.dict")
+            columns[column] = [
+                None if code == INT_NULL else dictionary[code] for code in data
+            ]
+        else:
+            columns[column] = data
+    return columns
@@ -0,0 +1,239 @@
+import json
+import marshal
+import os
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+DATA_DIR = Path(__file__).parent / "data"
+
+# Bump together with the "format" field of lookups.json when its layout changes.
+LOOKUPS_FORMAT = 1
+
+# Directory for the precompiled marshal copy of the data files, disabled when unset.
+CACHE_DIR_ENV = "MECHABELLUM_LOOKUP_CACHE"
+
+# Tables whose keys are game ids, JSON stores them as strings.
+INT_KEYED_TABLES = (
+    "command_tower_skills",
+    "research_tower_skills",
+    "officers",
+    "skills",
+    "items",
+    "contraptions",
+    "units",
+    "techs",
+)
+
+
+@dataclass(frozen=True)
+class LookupTables:
+    command_tower_skills: Dict[int, str]
+    research_tower_skills: Dict[int, str]
+    officers: Dict[int, str]
+    skills: Dict[int, str]
+    items: Dict[int, str]
+    contraptions: Dict[int, str]
+    units: Dict[int, str]
+    techs: Dict[int, str]
+    unit_data: Dict[str, Dict[str, Any]]
+    # Pool of all reinforcement card selections a player can make not including unit
+    # reinforcements, derived from the items, skills and officers.
+    cards: Dict[int, str]
+
+    @classmethod
+    def from_tables(cls, tables: Dict[str, dict]) -> "LookupTables":
+        cards = {0: "Skip", **tables["items"], **tables["skills"], **tables["officers"]}
+        return cls(cards=cards, **tables)
+
+
+@dataclass(frozen=True)
+class LookupOverride:
+    """Replaces entries of some tables for the game versions min_version to max_version.
+
+    Both bounds are inclusive and either may be None to leave that side open.
+    """
+
+    tables: Dict[str, dict]
+    min_version: Optional[int] = None
+    max_version: Optional[int] = None
+
+    def applies_to(self, version: int) -> bool:
+        return (self.min_version is None or version >= self.min_version) and (
+            self.max_version is None or version <= self.max_version
+        )
+
+
+class LookupRegistry:
+    """Loads the id to name lookup tables from the data directory on first use.
+
+    The tables live in lookups.json and unit_data.json. Nothing is read at import, the
+    files are loaded the first time base or for_version is used. With a cache_dir the
+    parsed tables are also stored there with marshal and later loads read that copy
+    instead, as long as the data files have not changed.
+
+    Overrides replace table entries for a range of game versions. They are read from the
+    "overrides" list of lookups.json and can be added at runtime with add_override.
+    """
+
+    def __init__(
+        self,
+        data_dir: Union[str, Path] = DATA_DIR,
+        cache_dir: Optional[Union[str, Path]] = None,
+    ):
+        self.data_dir = Path(data_dir)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self._base = None
+        self._overrides = None
+        self._by_version = {}
+
+    @property
+    def data_files(self) -> List[Path]:
+        return [self.data_dir / "lookups.json", self.data_dir / "unit_data.json"]
+
+    @property
+    def base(self) -> LookupTables:
+        """The tables without any version overrides applied."""
+        if self._base is None:
+            self._load()
+        return self._base
+
+    @property
+    def overrides(self) -> List[LookupOverride]:
+        if self._overrides is None:
+            self._load()
+        return self._overrides
+
+    def for_version(self, version: Optional[Union[str, int]]) -> LookupTables:
+        """The tables with every override covering the given game version applied."""
+        if version is None or not self.overrides:
+            return self.base
+        tables = self._by_version.get(version)
+        if tables is None:
+            tables = self._by_version[version] = self._apply_overrides(int(version))
+        return tables
+
+    def add_override(
+        self,
+        tables: Dict[str, dict],
+        min_version: Optional[int] = None,
+        max_version: Optional[int] = None,
+    ) -> None:
+        unknown = set(tables) - set(INT_KEYED_TABLES) - {"unit_data"}
+        if unknown:
+            raise ValueError(f"Unknown lookup tables {sorted(unknown)}.")
+        self.overrides.append(LookupOverride(tables, min_version, max_version))
+        self._by_version = {}
+
+    def digest(self) -> str:
+        """Identifies the content of the tables and overrides, for the cache key."""
+        # Imported here as hashlib alone is a noticeable part of the import time.
+        import hashlib
+
+        encoded = json.dumps(
+            [self._raw_tables(self.base), [vars(o) for o in self.overrides]],
+            sort_keys=True,
+            default=str,
+        ).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _apply_overrides(self, version: int) -> LookupTables:
+        matching = [o for o in self.overrides if o.applies_to(version)]
+        if not matching:
+            return self.base
+        tables = self._raw_tables(self.base)
+        for override in matching:
+            for name, entries in override.tables.items():
+                tables[name] = {**tables[name], **entries}
+        return LookupTables.from_tables(tables)
+
+    @staticmethod
+    def _raw_tables(lookup_tables: LookupTables) -> Dict[str, dict]:
+        tables = dict(vars(lookup_tables))
+        del tables["cards"]
+        return tables
+
+    def _load(self) -> None:
+        data = self._read_cache()
+        if data is None:
+            data = self._read_data_files()
+            self._write_cache(data)
+        self._base = LookupTables.from_tables(data["tables"])
+        self._overrides = [
+            LookupOverride(
+                override["tables"],
+                override.get("min_version"),
+                override.get("max_version"),
+            )
+            for override in data["overrides"]
+        ]
+
+    def _read_data_files(self) -> Dict[str, Any]:
+        lookups_path, unit_data_path = self.data_files
+        with open(lookups_path) as file:
+            lookups = json.load(file)
+        if lookups.get("format") != LOOKUPS_FORMAT:
+            raise ValueError(
+                f"Unsupported lookups format {lookups.get('format')!r} "
+                f"in {lookups_path}."
+            )
+        with open(unit_data_path) as file:
+            unit_data = json.load(file)
+
+        tables = _int_keys(lookups["tables"])
+        tables["unit_data"] = unit_data
+        overrides = [
+            {**override, "tables": _int_keys(override["tables"])}
+            for override in lookups.get("overrides", [])
+        ]
+        return {"tables": tables, "overrides": overrides}
+
+    def _cache_path(self) -> Path:
+        # The marshal format may change between interpreters.
+        return self.cache_dir / f"lookups-{sys.implementation.cache_tag}.marshal"
+
+    def _source_stamp(self) -> List[Any]:
+        stamp = [LOOKUPS_FORMAT]
+        for path in self.data_files:
+            stat = os.stat(path)
+            stamp += [str(path), stat.st_size, stat.st_mtime_ns]
+        return stamp
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(), "rb") as file:
+                stamp, data = marshal.load(file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return data if stamp == self._source_stamp() else None
+
+    def _write_cache(self, data: Dict[str, Any]) -> None:
+        if self.cache_dir is None:
+            return
+        cache_path = self._cache_path()
+        temporary_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(temporary_path, "wb") as file:
+                marshal.dump((self._source_stamp(), data), file)
+            os.replace(temporary_path, cache_path)
+        except OSError:
+            # The cache is only an optimisation, a read only location is not an error.
+            pass
+
+
+def _int_keys(tables: Dict[str, dict]) -> Dict[str, dict]:
+    return {
+        name: (
+            {int(key): value for key, value in entries.items()}
+            if name in INT_KEYED_TABLES
+            else entries
+        )
+        for name, entries in tables.items()
+    }
+
+
+LOOKUPS = LookupRegistry(cache_dir=os.environ.get(CACHE_DIR_ENV) or None)
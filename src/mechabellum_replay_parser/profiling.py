@@ -0,0 +1,117 @@
+import functools
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, Optional
+
+# The profile of the parse running in this context, None when profiling is off.
+ACTIVE_PROFILE: ContextVar[Optional["ParseProfile"]] = ContextVar(
+    "mechabellum_parse_profile", default=None
+)
+
+_NO_STAGE = nullcontext()
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall_ns: int = 0
+    # Net change in the number of memory blocks held by the Python allocator while the
+    # stage ran, see sys.getallocatedblocks. Freed blocks count against it.
+    allocated_blocks: int = 0
+
+
+@dataclass
+class ParseProfile:
+    """Timings and counters collected by parse_battle_record(profile=...).
+
+    Stages nest, the time of a stage includes the stages run inside it: extract_xml,
+    lookups, fromstring (or feed when streaming, which includes the round parsing),
+    reinforce_rounds, player_rounds (once per round record), actions (once per round)
+    and deployments (once per player). Counters are elements, the number of XML elements
+    in the document, and actions, the number of actions decoded.
+
+    With lazy=True the rounds, actions and deployments are profiled when they are
+    loaded, which may be after parse_battle_record returned.
+    """
+
+    file_path: Optional[str] = None
+    wall_ns: int = 0
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    counters: Dict[str, int] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        blocks = sys.getallocatedblocks()
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            stats.wall_ns += time.perf_counter_ns() - start
+            stats.allocated_blocks += sys.getallocatedblocks() - blocks
+            stats.calls += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def metrics(self) -> Dict[str, int]:
+        """Flattens the profile into name to number pairs for a metrics backend."""
+        metrics = {"wall_ns": self.wall_ns}
+        for name, stats in self.stages.items():
+            metrics[f"stage.{name}.calls"] = stats.calls
+            metrics[f"stage.{name}.wall_ns"] = stats.wall_ns
+            metrics[f"stage.{name}.allocated_blocks"] = stats.allocated_blocks
+        for name, value in self.counters.items():
+            metrics[f"count.{name}"] = value
+        return metrics
+
+
+ProfileCallback = Callable[[ParseProfile], Any]
+
+
+def profile_stage(name: str) -> ContextManager[None]:
+    """Times a stage in the active profile, a shared no-op when profiling is off."""
+    profile = ACTIVE_PROFILE.get()
+    if profile is None:
+        return _NO_STAGE
+    return profile.stage(name)
+
+
+def profiled(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording every call of the function as a stage."""
+
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = ACTIVE_PROFILE.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            with profile.stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def profile_count(name: str, amount: int = 1) -> None:
+    profile = ACTIVE_PROFILE.get()
+    if profile is not None:
+        profile.count(name, amount)
+
+
+def count_end_events(events: Iterable, profile: ParseProfile) -> Iterator:
+    """Passes pull parser events through, counting one element per end event."""
+    ends = 0
+    try:
+        for event in events:
+            if event[0] == "end":
+                ends += 1
+            yield event
+    finally:
+        profile.count("elements", ends)
@@ -0,0 +1,300 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from . import BattleRecord
+from .bulk import parse_battle_records
+
+# Receives the path and the parse result of every new replay. The result is the
+# transformed BattleRecord, or the exception raised while parsing it.
+WatchSink = Callable[[str, Union[BattleRecord, Any, Exception]], Any]
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+# A file counts as fully written once its size and mtime have not changed for this long.
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Replaced files keep their directory entry and do not change the directory mtime, and
+# a listing after a directory change only stats new names. A full scan this often stats
+# every replay to pick up the changed ones.
+DEFAULT_FULL_SCAN_INTERVAL = 60.0
+
+FileStat = Tuple[int, int]
+
+
+class WatchManifest:
+    """Remembers the size and mtime of every replay the watcher has processed.
+
+    Stored in a small sqlite file so that recording a replay is a single insert no
+    matter how many replays were processed before. Replays that failed to parse are
+    recorded too and only retried once the file changes.
+
+    The rollback journal is kept between writes rather than deleted, so a manifest
+    inside the watched directory does not change the directory's mtime on every record.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=PERSIST")
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (name TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, error TEXT)"
+            )
+        self.files: Dict[str, FileStat] = {
+            name: (size, mtime_ns)
+            for name, size, mtime_ns in self.connection.execute(
+                "SELECT name, size, mtime_ns FROM files"
+            )
+        }
+
+    def __enter__(self) -> "WatchManifest":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def record(self, entries: List[Tuple[str, FileStat, Optional[str]]]) -> None:
+        """Records (name, stat, error) entries, error being None for parsed replays."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                [(name, *stat, error) for name, stat, error in entries],
+            )
+        for name, stat, _ in entries:
+            self.files[name] = stat
+
+    def errors(self) -> Dict[str, str]:
+        return dict(
+            self.connection.execute(
+                "SELECT name, error FROM files WHERE error IS NOT NULL"
+            )
+        )
+
+
+@dataclass
+class _Pending:
+    stat: FileStat
+    seen_at: float
+
+
+class ReplayWatcher:
+    """Parses the replays that appear in a directory, handing each result to a sink.
+
+    Every poll looks for .grbr files that are not in the manifest or changed since they
+    were recorded. A new file is only parsed once its size and mtime stayed the same
+    between two polls at least settle_seconds apart, so a replay that is still being
+    copied is left alone until the copy is done. Files that cannot be opened yet, as
+    happens on Windows while another program writes them, are retried on a later poll.
+
+    The directory is only listed again when its mtime changed, and then only the names
+    not seen before are stat'ed. Otherwise a poll just stats the files still waiting to
+    settle, so its cost grows with the new files rather than with the archive. A full
+    scan every full_scan_interval seconds stats every replay to pick up the ones
+    overwritten in place.
+
+    New replays are parsed on a process pool kept for the lifetime of the watcher, with
+    workers=1 they are parsed in this process. A pool left broken by a worker that died
+    is replaced and its replays are retried on the next poll. transform and any other
+    keyword arguments are passed on to parse_battle_records.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        sink: WatchSink,
+        manifest: Union[str, Path, WatchManifest],
+        workers: Optional[int] = None,
+        transform: Optional[Callable[[BattleRecord], Any]] = None,
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        full_scan_interval: float = DEFAULT_FULL_SCAN_INTERVAL,
+        **parse_kwargs,
+    ):
+        self.directory = Path(directory)
+        self.sink = sink
+        self.manifest = (
+            manifest if isinstance(manifest, WatchManifest) else WatchManifest(manifest)
+        )
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.transform = transform
+        self.settle_seconds = settle_seconds
+        self.full_scan_interval = full_scan_interval
+        self.parse_kwargs = parse_kwargs
+        self._executor: Optional[Executor] = None
+        self._pending: Dict[str, _Pending] = {}
+        self._directory_mtime = None
+        self._full_scan_at = None
+
+    def __enter__(self) -> "ReplayWatcher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._close_pool()
+        self.manifest.close()
+
+    def skip_existing(self) -> int:
+        """Records every replay currently in the directory without parsing it."""
+        entries = [
+            (name, stat, None)
+            for name, stat in self._changed_files()
+            if name not in self._pending
+        ]
+        self.manifest.record(entries)
+        return len(entries)
+
+    def poll(self) -> int:
+        """Parses the new replays that settled, returns how many went to the sink."""
+        now = time.monotonic()
+        for name, stat in self._changed_files(now):
+            pending = self._pending.get(name)
+            if pending is None or pending.stat != stat:
+                self._pending[name] = _Pending(stat, now)
+
+        ready = self._settled(now)
+        if not ready:
+            return 0
+
+        paths = {str(self.directory / name): name for name in ready}
+        entries = []
+        broken = False
+        try:
+            for path, result in parse_battle_records(
+                paths,
+                workers=self.workers,
+                transform=self.transform,
+                executor=self._pool(),
+                **self.parse_kwargs,
+            ):
+                name = paths[path]
+                if isinstance(result, BrokenProcessPool):
+                    # A worker died, the replay stays pending and is parsed again.
+                    broken = True
+                    continue
+                if isinstance(result, FileNotFoundError):
+                    del self._pending[name]
+                    continue
+                if isinstance(result, OSError):
+                    # Most likely still locked by the program writing it.
+                    self._pending[name].seen_at = time.monotonic()
+                    continue
+                error = str(result) if isinstance(result, Exception) else None
+                stat = self._pending.pop(name).stat
+                self.sink(path, result)
+                entries.append((name, stat, error))
+        except BrokenProcessPool:
+            # Raised when submitting to a pool that already broke.
+            broken = True
+        finally:
+            # Replays already handed to the sink are not processed again, even when the
+            # sink raised for a later one.
+            self.manifest.record(entries)
+        if broken:
+            # Replaced by a new pool on the next poll.
+            self._close_pool()
+        return len(entries)
+
+    def run(
+        self,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        stop: Optional[threading.Event] = None,
+    ) -> None:
+        """Polls until stop is set, or forever without one."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            self.poll()
+            stop.wait(poll_interval)
+
+    def _pool(self) -> Optional[Executor]:
+        if self.workers <= 1:
+            return None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def _close_pool(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def _settled(self, now: float) -> List[str]:
+        ready = []
+        for name, pending in list(self._pending.items()):
+            try:
+                stat = _file_stat(os.stat(self.directory / name))
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if stat != pending.stat:
+                self._pending[name] = _Pending(stat, now)
+            elif now > pending.seen_at and now - pending.seen_at >= self.settle_seconds:
+                ready.append(name)
+        return ready
+
+    def _changed_files(
+        self, now: Optional[float] = None
+    ) -> Iterator[Tuple[str, FileStat]]:
+        now = time.monotonic() if now is None else now
+        directory_mtime = os.stat(self.directory).st_mtime_ns
+        full_scan = (
+            self._full_scan_at is None
+            or now - self._full_scan_at >= self.full_scan_interval
+        )
+        if (
+            not full_scan
+            and directory_mtime == self._directory_mtime
+            # Some file systems store mtimes with a resolution of seconds, a change
+            # right after the last scan would not show.
+            and time.time_ns() - directory_mtime > self.settle_seconds * 1e9
+        ):
+            return
+        self._directory_mtime = directory_mtime
+        if full_scan:
+            self._full_scan_at = now
+
+        files = self.manifest.files
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".grbr"):
+                    continue
+                # Pending files are stat'ed as they settle and known ones are left to
+                # the full scan.
+                if not full_scan and (
+                    entry.name in files or entry.name in self._pending
+                ):
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = _file_stat(entry.stat())
+                if files.get(entry.name) != stat:
+                    yield entry.name, stat
+
+
+def _file_stat(stat: os.stat_result) -> FileStat:
+    return stat.st_size, stat.st_mtime_ns
+
+
+def watch_directory(
+    directory: Union[str, Path],
+    sink: WatchSink,
+    manifest: Union[str, Path, WatchManifest],
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    stop: Optional[threading.Event] = None,
+    **watcher_kwargs,
+) -> None:
+    """Hands new replays in directory to sink until stop is set, see ReplayWatcher."""
+    with ReplayWatcher(directory, sink, manifest, **watcher_kwargs) as watcher:
+        watcher.run(poll_interval, stop)
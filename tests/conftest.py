@@ -0,0 +1,11 @@
+from pathlib import Path
+
+import pytest
+from synthetic import build_replay_bytes, replay_file_name
+
+
+@pytest.fixture
+def replay_path(tmp_path: Path) -> Path:
+    path = tmp_path / replay_file_name()
+    path.write_bytes(build_replay_bytes())
+    return path
@@ -0,0 +1,195 @@
+"""Synthetic replays for tests and benchmarks.
+
+The replays only contain the elements the parser reads, framed the way extract_xml
+expects: a binary header, the XML document and a footer holding the player names.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+XSI = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+
+# Actions repeated to pad a round up to actions_per_round. Skills are left out since
+# repeating Field Recovery would sell the same unit twice.
+_FILLER_ACTIONS = (
+    '<MatchActionData xsi:type="PAD_BuyUnit"><UID>9</UID></MatchActionData>',
+    '<MatchActionData xsi:type="PAD_MoveUnit">'
+    "<moveUnitDatas><MoveUnitData><unitIndex>2</unitIndex>"
+    "<isRotate>true</isRotate><position><x>15</x><y>-60</y></position>"
+    "</MoveUnitData></moveUnitDatas></MatchActionData>",
+    '<MatchActionData xsi:type="PAD_UpgradeTechnology">'
+    "<UID>9</UID><TechID>2710</TechID></MatchActionData>",
+    '<MatchActionData xsi:type="PAD_ActiveBlueprint"><ID>4</ID></MatchActionData>',
+)
+
+
+def _unit_xml(index: int, ident: int, sell_supply: int, x: int, y: int) -> str:
+    return (
+        "<NewUnitData>"
+        f"<id>{ident}</id><SellSupply>{sell_supply}</SellSupply>"
+        f"<Position><x>{x}</x><y>{y}</y></Position><Index>{index}</Index>"
+        "</NewUnitData>"
+    )
+
+
+def _round_xml(
+    round_number: int,
+    unit_count: int,
+    reinforce_rounds: Sequence[int],
+    actions_per_round: Optional[int],
+) -> str:
+    units = "".join(
+        _unit_xml(i, 9 if i % 2 else 12, 200, i * 10, -i * 20 - round_number)
+        for i in range(unit_count)
+    )
+    actions = [
+        '<MatchActionData xsi:type="PAD_BuyUnit"><UID>9</UID></MatchActionData>',
+        '<MatchActionData xsi:type="PAD_UpgradeUnit"><UIDX>1</UIDX></MatchActionData>',
+        '<MatchActionData xsi:type="PAD_UpgradeTechnology">'
+        "<UID>9</UID><TechID>10510</TechID></MatchActionData>",
+        '<MatchActionData xsi:type="PAD_ActiveBlueprint"><ID>2</ID></MatchActionData>',
+        '<MatchActionData xsi:type="PAD_ReleaseCommanderSkill">'
+        "<SkillIndex>0</SkillIndex><UnitIndex>0</UnitIndex></MatchActionData>",
+        '<MatchActionData xsi:type="PAD_MoveUnit">'
+        "<moveUnitDatas><MoveUnitData><unitIndex>1</unitIndex>"
+        "<isRotate>false</isRotate>"
+        f"<position><x>5</x><y>{-40 - round_number}</y></position>"
+        "</MoveUnitData></moveUnitDatas></MatchActionData>",
+    ]
+    if actions_per_round is not None:
+        del actions[actions_per_round:]
+        actions += [
+            _FILLER_ACTIONS[i % len(_FILLER_ACTIONS)]
+            for i in range(actions_per_round - len(actions))
+        ]
+    if round_number in reinforce_rounds:
+        actions.append(
+            '<MatchActionData xsi:type="PAD_ChooseReinforceItem">'
+            f"<ID>1{round_number:02d}2216</ID></MatchActionData>"
+        )
+    elif round_number > 0:
+        actions.append(
+            '<MatchActionData xsi:type="PAD_ChooseReinforceItem">'
+            "<ID>13030001</ID></MatchActionData>"
+        )
+    return (
+        "<PlayerRoundRecord>"
+        f"<round>{round_number}</round>"
+        "<playerData>"
+        f"<reactorCore>{4000 - round_number * 100}</reactorCore>"
+        f"<units>{units}</units><unitIndex>{unit_count}</unitIndex>"
+        "<commanderSkills><CommanderSkillData><index>0</index><id>900001</id>"
+        "</CommanderSkillData></commanderSkills>"
+        "<officers><int>20039</int></officers>"
+        "</playerData>"
+        f"<actionRecords>{''.join(actions)}</actionRecords>"
+        "</PlayerRoundRecord>"
+    )
+
+
+def _player_xml(
+    player_id: int,
+    name: str,
+    rounds: List[int],
+    unit_count: int,
+    reinforce_rounds: Sequence[int],
+    actions_per_round: Optional[int],
+) -> str:
+    round_records = "".join(
+        _round_xml(round_number, unit_count, reinforce_rounds, actions_per_round)
+        for round_number in rounds
+    )
+    return (
+        "<PlayerRecord>"
+        f"<id>{player_id}</id><name>{name}</name>"
+        "<data><unitDatas>"
+        '<unitData><id>9</id><techs><tech data="10510" /><tech data="2710" /></techs>'
+        "</unitData>"
+        '<unitData><id>2001</id><techs><tech data="1" /></techs></unitData>'
+        "</unitDatas></data>"
+        f"<playerRoundRecords>{round_records}</playerRoundRecords>"
+        "</PlayerRecord>"
+    )
+
+
+def build_replay_bytes(
+    rounds: int = 6,
+    unit_count: int = 4,
+    first_round: int = 0,
+    reinforce_rounds: Sequence[int] = (4,),
+    match_datas_first: bool = False,
+    actions_per_round: Optional[int] = None,
+    version: str = "1571",
+    players: Sequence[str] = ("Alice", "Bob"),
+) -> bytes:
+    """Builds a replay of rounds rounds, each with unit_count units on the board.
+
+    A first_round above 1 gives the replay of an observer that joined late: round 0 is
+    followed directly by first_round. Every round holds one of each action the parser
+    decodes plus a reinforcement choice, with actions_per_round the list is cut or
+    padded to that many actions before the reinforcement choice.
+    """
+    round_numbers = [0] + list(range(max(first_round, 1), rounds))
+    player_records = "".join(
+        _player_xml(
+            1001 + number,
+            name,
+            round_numbers,
+            unit_count,
+            reinforce_rounds,
+            actions_per_round,
+        )
+        for number, name in enumerate(players)
+    )
+    snapshots = "".join(
+        "<MatchSnapshotData><unitReinforceRounds>"
+        + "".join(f"<int>{r}</int>" for r in reinforce_rounds if r <= round_number)
+        + "</unitReinforceRounds></MatchSnapshotData>"
+        for round_number in round_numbers
+    )
+    match_datas = f"<matchDatas>{snapshots}</matchDatas>"
+    player_records = f"<playerRecords>{player_records}</playerRecords>"
+    body = (
+        match_datas + player_records
+        if match_datas_first
+        else player_records + match_datas
+    )
+    xml = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f"<BattleRecord {XSI}><Version>{version}</Version>{body}</BattleRecord>"
+    )
+    header = b"\x00\x01GRBR\x00" + len(xml).to_bytes(4, "little")
+    footer = b"\x00" + b"\x00".join(
+        len(name).to_bytes(1, "little") + name.encode("utf-8") for name in players
+    )
+    return header + xml.encode("utf-8") + footer + b"\x00"
+
+
+def replay_file_name(
+    version: str = "1571",
+    date: str = "20250101",
+    match_id: int = 123456,
+    players: Sequence[str] = ("Alice", "Bob"),
+) -> str:
+    """A file name in the game's naming scheme, see REPLAY_FILE_NAME_REGEX."""
+    names = "VS".join(f"[{name}]" for name in players)
+    return f"{version}_{date}--{match_id}_{names}.grbr"
+
+
+def write_replays(
+    directory: Union[str, Path], count: int, **replay_kwargs
+) -> List[Path]:
+    """Writes count replays made by build_replay_bytes(**replay_kwargs) to directory."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    content = build_replay_bytes(**replay_kwargs)
+    paths = []
+    for match_id in range(100000, 100000 + count):
+        path = directory / replay_file_name(
+            version=replay_kwargs.get("version", "1571"),
+            match_id=match_id,
+            players=replay_kwargs.get("players", ("Alice", "Bob")),
+        )
+        path.write_bytes(content)
+        paths.append(path)
+    return paths
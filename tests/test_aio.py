@@ -0,0 +1,194 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from synthetic import build_replay_bytes
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.aio import (
+    ReplayScheduler,
+    iter_directory_async,
+    parse_battle_record_async,
+    serve_http,
+)
+
+
+def player_names(battle_record):
+    return [player.name for player in battle_record.player_records]
+
+
+def test_parse_battle_record_async(replay_path):
+    async def parse_both():
+        async with ReplayScheduler(workers=2) as scheduler:
+            return await asyncio.gather(
+                parse_battle_record_async(replay_path, scheduler),
+                parse_battle_record_async(replay_path.read_bytes(), scheduler),
+            )
+
+    from_path, from_bytes = asyncio.run(parse_both())
+    assert from_path == from_bytes == parse_battle_record(replay_path)
+
+
+def test_iter_directory_async(tmp_path):
+    for rounds in (3, 4, 5):
+        (tmp_path / f"{rounds}.grbr").write_bytes(build_replay_bytes(rounds=rounds))
+    (tmp_path / "broken.grbr").write_bytes(b"not a replay")
+
+    async def collect():
+        scheduler = ReplayScheduler(executor=ThreadPoolExecutor(2))
+        return {
+            path: result
+            async for path, result in iter_directory_async(
+                tmp_path, scheduler, transform=player_names
+            )
+        }
+
+    results = asyncio.run(collect())
+    assert isinstance(results.pop(str(tmp_path / "broken.grbr")), ValueError)
+    assert results == {
+        str(tmp_path / f"{rounds}.grbr"): ["Alice", "Bob"] for rounds in (3, 4, 5)
+    }
+
+
+def test_parse_many_backpressure_and_cancellation(replay_path):
+    release = threading.Event()
+    taken = []
+
+    def sources():
+        for number in range(10):
+            taken.append(number)
+            yield replay_path
+
+    def blocking_names(battle_record):
+        release.wait(5)
+        return player_names(battle_record)
+
+    async def run():
+        executor = ThreadPoolExecutor(4)
+        scheduler = ReplayScheduler(max_concurrency=2, executor=executor)
+        results = scheduler.parse_many(sources(), transform=blocking_names)
+        first = asyncio.ensure_future(anext(results))
+        await asyncio.sleep(0.2)
+        # Only as many sources as there are slots, plus the one waiting for a slot.
+        assert len(taken) == 3
+        release.set()
+        assert (await first)[1] == ["Alice", "Bob"]
+        await results.aclose()
+
+        # A caller cancelled while waiting for a slot does not hold on to it.
+        release.clear()
+        running = [asyncio.ensure_future(scheduler.parse(replay_path, blocking_names))]
+        running.append(
+            asyncio.ensure_future(scheduler.parse(replay_path, blocking_names))
+        )
+        waiting = asyncio.ensure_future(scheduler.parse(replay_path, blocking_names))
+        await asyncio.sleep(0.1)
+        assert scheduler.waiting == 1
+        waiting.cancel()
+        release.set()
+        assert await asyncio.gather(*running) == [["Alice", "Bob"]] * 2
+        assert await scheduler.parse(replay_path, player_names) == ["Alice", "Bob"]
+        executor.shutdown()
+
+    asyncio.run(run())
+
+
+async def start_server(**serve_kwargs):
+    started = asyncio.get_running_loop().create_future()
+    scheduler = ReplayScheduler(executor=ThreadPoolExecutor(1))
+    server = asyncio.ensure_future(
+        serve_http(
+            "127.0.0.1",
+            0,
+            scheduler,
+            transform=player_names,
+            started=started.set_result,
+            **serve_kwargs,
+        )
+    )
+    return server, (await started).sockets[0].getsockname()[1]
+
+
+async def send_request(port, request):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def status_and_payload(response):
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+@pytest.mark.parametrize(
+    "request_line, body, status",
+    [
+        ("POST /parse", build_replay_bytes(), 200),
+        ("POST /parse", b"not a replay", 422),
+        ("GET /", b"", 404),
+    ],
+)
+def test_serve_http(request_line, body, status):
+    async def request():
+        server, port = await start_server()
+        response = await send_request(
+            port,
+            f"{request_line} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+            + body,
+        )
+        server.cancel()
+        return response
+
+    response_status, payload = status_and_payload(asyncio.run(request()))
+    assert response_status == status
+    if status == 200:
+        assert payload == ["Alice", "Bob"]
+    else:
+        assert "error" in payload
+
+
+@pytest.mark.parametrize(
+    "raw_request, status",
+    [
+        (b"POST /parse HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+        (b"POST /parse HTTP/1.1\r\n" + b"X-Padding: 1\r\n" * 101 + b"\r\n", 431),
+        # The body never arrives in full.
+        (b"POST /parse HTTP/1.1\r\nContent-Length: 10\r\n\r\nshort", 408),
+        (b"POST /parse HTTP/1.1\r\nContent-Length: 10\r\n", 408),
+    ],
+    ids=["negative length", "too many headers", "short body", "unfinished head"],
+)
+def test_serve_http_refuses_bad_requests(raw_request, status):
+    async def send():
+        server, port = await start_server(read_timeout=0.2)
+        response = await send_request(port, raw_request)
+        server.cancel()
+        return response
+
+    assert status_and_payload(asyncio.run(send()))[0] == status
+
+
+def test_serve_http_counts_uploads_still_being_received():
+    body = build_replay_bytes()
+    head = f"POST /parse HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+
+    async def send():
+        server, port = await start_server(max_waiting=1)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head)
+        await asyncio.sleep(0.1)
+        # The first upload holds the only place while its body is still on the way.
+        refused = await send_request(port, head + body)
+        writer.write(body)
+        accepted = await reader.read()
+        writer.close()
+        server.cancel()
+        return refused, accepted
+
+    refused, accepted = asyncio.run(send())
+    assert status_and_payload(refused)[0] == 503
+    assert status_and_payload(accepted) == (200, ["Alice", "Bob"])
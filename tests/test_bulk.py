@@ -0,0 +1,120 @@
+import io
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from synthetic import build_replay_bytes
+
+from mechabellum_replay_parser import BattleRecord, parse_battle_record
+from mechabellum_replay_parser.bulk import parse_archive_records, parse_battle_records
+
+
+def player_names(battle_record):
+    return [player.name for player in battle_record.player_records]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_battle_records(tmp_path, workers):
+    paths = []
+    for rounds in range(3, 8):
+        path = tmp_path / f"{rounds}.grbr"
+        path.write_bytes(build_replay_bytes(rounds=rounds))
+        paths.append(str(path))
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+
+    results = dict(parse_battle_records(paths + [str(broken)], workers=workers))
+
+    assert isinstance(results.pop(str(broken)), ValueError)
+    assert results == {path: parse_battle_record(path) for path in paths}
+    assert all(isinstance(result, BattleRecord) for result in results.values())
+
+
+def test_parse_battle_records_transform(replay_path):
+    [(path, result)] = parse_battle_records(
+        [replay_path], workers=2, transform=player_names
+    )
+    assert path == str(replay_path)
+    assert result == ["Alice", "Bob"]
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Records how many chunks were submitted and the most that were pending at once."""
+
+    def __init__(self, workers):
+        super().__init__(workers)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.pending = 0
+        self.most_pending = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            self.submitted += 1
+            self.pending += 1
+            self.most_pending = max(self.most_pending, self.pending)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+
+
+def test_parse_battle_records_spreads_small_batches(tmp_path, monkeypatch):
+    # Two chunks ahead per worker, with one file per chunk there are more than that.
+    monkeypatch.setattr("mechabellum_replay_parser.bulk.MAX_CHUNK_FILES", 1)
+    paths = []
+    for number in range(30):
+        path = tmp_path / f"{number}.grbr"
+        path.write_bytes(build_replay_bytes(rounds=3))
+        paths.append(path)
+
+    with CountingExecutor(3) as executor:
+        results = list(parse_battle_records(paths, workers=3, executor=executor))
+
+    assert len(results) == 30
+    assert executor.submitted == 30
+    assert executor.most_pending <= 6
+
+
+def test_small_batches_are_split_across_workers(tmp_path):
+    paths = []
+    for number in range(30):
+        path = tmp_path / f"{number}.grbr"
+        path.write_bytes(build_replay_bytes(rounds=3))
+        paths.append(path)
+
+    with CountingExecutor(4) as executor:
+        list(parse_battle_records(paths, workers=4, executor=executor))
+
+    # 30 small replays fit in one chunk by size, they are split between the workers.
+    assert executor.submitted == 4
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_archive_records(monkeypatch, workers):
+    # One member per chunk so that the pool has more chunks than it takes ahead.
+    monkeypatch.setattr("mechabellum_replay_parser.bulk.MAX_CHUNK_FILES", 1)
+    stream = io.BytesIO()
+    members = {
+        f"{rounds}.grbr": build_replay_bytes(rounds=rounds) for rounds in range(3, 9)
+    }
+    members["broken.grbr"] = b"not a replay"
+    with tarfile.open(fileobj=stream, mode="w|gz") as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    stream.seek(0)
+
+    results = dict(
+        parse_archive_records(stream, workers=workers, transform=player_names)
+    )
+
+    assert isinstance(results.pop("broken.grbr"), ValueError)
+    assert results == {
+        name: ["Alice", "Bob"] for name in members if name != "broken.grbr"
+    }
@@ -0,0 +1,90 @@
+import os
+
+from synthetic import build_replay_bytes
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.bulk import parse_battle_records
+from mechabellum_replay_parser.cache import ParseCache
+
+
+def test_cache_round_trip(tmp_path, replay_path):
+    with ParseCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get(replay_path) is None
+        battle_record = cache.parse_battle_record(replay_path)
+        assert (
+            cache.get(replay_path) == battle_record == parse_battle_record(replay_path)
+        )
+
+
+def test_cache_misses_after_file_changes(tmp_path, replay_path):
+    with ParseCache(tmp_path / "cache.sqlite") as cache:
+        cache.parse_battle_record(replay_path)
+        replay_path.write_bytes(build_replay_bytes(rounds=3))
+        stat = replay_path.stat()
+        os.utime(replay_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert cache.get(replay_path) is None
+
+
+def test_cache_content_key_survives_copies(tmp_path, replay_path):
+    copy_path = tmp_path / "copy.grbr"
+    copy_path.write_bytes(replay_path.read_bytes())
+    with ParseCache(tmp_path / "cache.sqlite", key="content") as cache:
+        cache.parse_battle_record(replay_path)
+        assert cache.get(copy_path) is not None
+
+
+def test_cache_hashes_a_missed_replay_once(tmp_path, replay_path, monkeypatch):
+    with ParseCache(tmp_path / "cache.sqlite", key="content") as cache:
+        keys = []
+        entry_key = cache.entry_key
+        monkeypatch.setattr(
+            cache, "entry_key", lambda path: keys.append(path) or entry_key(path)
+        )
+        cache.parse_battle_record(replay_path)
+        assert keys == [replay_path]
+        assert cache.get(replay_path) is not None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f"{index}.grbr"
+        path.write_bytes(build_replay_bytes())
+        paths.append(path)
+
+    with ParseCache(tmp_path / "cache.sqlite") as cache:
+        cache.parse_battle_record(paths[0])
+        cache.parse_battle_record(paths[1])
+        cache.get(paths[0])
+        cache.max_bytes = cache.total_bytes()
+        cache.parse_battle_record(paths[2])
+
+        assert cache.get(paths[0]) is not None
+        assert cache.get(paths[1]) is None
+        assert cache.total_bytes() <= cache.max_bytes
+
+
+def test_cache_shared_with_workers(tmp_path, replay_path):
+    cache = ParseCache(tmp_path / "cache.sqlite")
+    [(_, first)] = parse_battle_records([replay_path], workers=2, cache=cache)
+    assert cache.get(replay_path) == first
+    cache.close()
+
+
+def test_cache_total_matches_stored_records(tmp_path, replay_path, monkeypatch):
+    def stored_sum(cache):
+        return cache.connection.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+
+    with ParseCache(tmp_path / "cache.sqlite") as cache:
+        battle_record = cache.parse_battle_record(replay_path)
+        # Stored again under the same key, the total must not count it twice.
+        cache.put(replay_path, battle_record)
+        assert cache.total_bytes() == stored_sum(cache)
+
+    # Opened by a newer parser, the old records are purged and the total follows.
+    monkeypatch.setattr(
+        "mechabellum_replay_parser.cache.parser_fingerprint", lambda: "newer"
+    )
+    with ParseCache(tmp_path / "cache.sqlite") as cache:
+        assert cache.get(replay_path) is None
+        assert cache.total_bytes() == 0
@@ -0,0 +1,211 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from synthetic import build_replay_bytes, replay_file_name
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.cli import RENDERERS, _in_input_order, main
+
+
+def test_in_input_order():
+    results = [("c", 3), ("a", 1), ("a", 4), ("b", 2)]
+
+    assert list(_in_input_order(["a", "b", "c", "a"], results)) == [
+        ("a", 1),
+        ("b", 2),
+        ("c", 3),
+        ("a", 4),
+    ]
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_tech_json(tmp_path, monkeypatch, capsys, jobs):
+    for rounds in (3, 4, 5):
+        (tmp_path / f"{rounds}.grbr").write_bytes(build_replay_bytes(rounds=rounds))
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "mechabellum-replay-parser",
+            "tech",
+            str(tmp_path / "*.grbr"),
+            "--jobs",
+            jobs,
+            "--format",
+            "json",
+        ],
+    )
+
+    main()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line["replay"] for line in lines] == [
+        str(tmp_path / f"{rounds}.grbr") for rounds in (3, 4, 5)
+    ]
+    battle_record = parse_battle_record(tmp_path / "3.grbr")
+    assert lines[0]["players"][0]["techs"] == (
+        battle_record.player_records[0].tech_choices
+    )
+
+
+def _worker_pid(battle_record):
+    # Held up a little so one worker cannot take every chunk before the other starts.
+    time.sleep(0.1)
+    return {"pid": os.getpid()}
+
+
+def test_tech_jobs_spread_over_workers(tmp_path, monkeypatch, capsys):
+    for rounds in range(3, 11):
+        (tmp_path / f"{rounds}.grbr").write_bytes(build_replay_bytes(rounds=rounds))
+    monkeypatch.setitem(RENDERERS["tech"], "json", _worker_pid)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "mechabellum-replay-parser",
+            "tech",
+            str(tmp_path / "*.grbr"),
+            "--jobs",
+            "2",
+            "--format",
+            "json",
+        ],
+    )
+
+    main()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(lines) == 8
+    pids = {line["pid"] for line in lines}
+    assert os.getpid() not in pids
+    assert len(pids) == 2
+
+
+def test_battle_reports_failures(replay_path, tmp_path, monkeypatch, capsys):
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["mechabellum-replay-parser", "battle", str(replay_path), str(broken)],
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 1
+    output = capsys.readouterr()
+    assert output.out.startswith(f"{replay_path.absolute()}\n")
+    assert f"Failed to parse {broken.absolute()}" in output.err
+
+
+def test_export_reports_failures(replay_path, tmp_path, monkeypatch, capsys):
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+    output = tmp_path / "tables"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "mechabellum-replay-parser",
+            "export",
+            str(replay_path),
+            str(broken),
+            "--output",
+            str(output),
+            "--format",
+            "columns",
+            "--jobs",
+            "1",
+        ],
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert f"Failed to parse {broken}" in captured.err
+    assert "1 replays could not be exported." in captured.err
+    assert any(output.iterdir())
+
+
+def test_ingest_reports_failures(replay_path, tmp_path, monkeypatch, capsys):
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "mechabellum-replay-parser",
+            "ingest",
+            str(replay_path),
+            str(broken),
+            "--database",
+            str(tmp_path / "replays.sqlite"),
+            "--jobs",
+            "1",
+        ],
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+
+    assert exit_info.value.code == 1
+    captured = capsys.readouterr()
+    assert f"Failed to parse {broken}" in captured.err
+    assert captured.out.startswith("Ingested 1 replays, skipped 0 already")
+    assert captured.out.endswith(", 1 failed.\n")
+
+
+def test_dedup_reports_unreadable_replays(tmp_path, monkeypatch, capsys):
+    content = build_replay_bytes()
+    name = content.index(b"<name>", content.index(b"<PlayerRecord"))
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(content[:name] + b"<name><" + content[name + 6 :])
+    # Copies of one battle are grouped by the match id in the game's file name.
+    for copy, replay in (
+        ("full", content),
+        ("late", build_replay_bytes(first_round=3)),
+    ):
+        (tmp_path / copy).mkdir()
+        (tmp_path / copy / replay_file_name()).write_bytes(replay)
+    paths = [str(tmp_path / folder) for folder in ("full", "late")] + [str(broken)]
+    monkeypatch.setattr(sys, "argv", ["mechabellum-replay-parser", "dedup", *paths])
+
+    main()
+
+    output = capsys.readouterr().out
+    assert f"Failed to read {broken}: not well-formed" in output
+    assert "1 battles have more than one copy" in output
+
+
+def test_cli_import_leaves_subcommand_modules_alone():
+    # Checked in a fresh interpreter, the test session has imported everything already.
+    modules = [
+        "asyncio",
+        "sqlite3",
+        "concurrent.futures.process",
+        "wcwidth",
+        "tarfile",
+        "zipfile",
+        "datetime",
+        "mechabellum_replay_parser.export",
+    ]
+    loaded = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, mechabellum_replay_parser.cli; "
+            f"print([name for name in {modules!r} if name in sys.modules])",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert loaded.strip() == "[]"
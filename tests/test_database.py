@@ -0,0 +1,38 @@
+from synthetic import build_replay_bytes
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.database import connect, ingest_replays
+
+
+def test_ingest_replays(tmp_path):
+    paths = []
+    for rounds in (4, 5):
+        path = tmp_path / f"{rounds}.grbr"
+        path.write_bytes(build_replay_bytes(rounds=rounds))
+        paths.append(path)
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+    database = tmp_path / "replays.sqlite"
+
+    report = ingest_replays(database, paths + [broken], workers=1, batch_battles=1)
+    assert sorted(report.ingested) == sorted(map(str, paths))
+    assert list(report.failed) == [str(broken)]
+
+    report = ingest_replays(database, paths, workers=1)
+    assert report.ingested == []
+    assert sorted(report.skipped) == sorted(map(str, paths))
+
+    connection = connect(database)
+    battle_record = parse_battle_record(paths[1])
+    assert connection.execute(
+        "SELECT name, starting_officer, last_round FROM players "
+        "JOIN battles ON battles.id = players.battle_id WHERE file_name = ?",
+        ("5.grbr",),
+    ).fetchall() == [
+        (player.name, player.starting_officer, player.round_records[-1].round)
+        for player in battle_record.player_records
+    ]
+    assert connection.execute(
+        "SELECT COUNT(*) FROM actions WHERE action_type = 'UnitDrop'"
+    ).fetchone() == (2,)
+    connection.close()
@@ -0,0 +1,75 @@
+from synthetic import build_replay_bytes, replay_file_name
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.dedup import (
+    DedupIndex,
+    RoundDifference,
+    diff_battle_records,
+    merge_battle_records,
+    recorded_rounds,
+)
+
+
+def write_copy(directory, match_id=123456, **replay_kwargs):
+    directory.mkdir(exist_ok=True)
+    path = directory / replay_file_name(match_id=match_id)
+    path.write_bytes(build_replay_bytes(**replay_kwargs))
+    return path
+
+
+def test_merge_partial_copies(tmp_path):
+    full = write_copy(tmp_path / "full", rounds=8)
+    early = write_copy(tmp_path / "early", rounds=5)
+    late = write_copy(tmp_path / "late", rounds=8, first_round=3)
+
+    merged = merge_battle_records(
+        [parse_battle_record(late), parse_battle_record(early)]
+    )
+
+    assert merged == parse_battle_record(full)
+
+
+def test_diff_battle_records(tmp_path):
+    full = parse_battle_record(write_copy(tmp_path / "full", rounds=6))
+    late = parse_battle_record(write_copy(tmp_path / "late", rounds=6, first_round=4))
+    late.player_records[1].round_records[-1].player_hp = 1
+
+    assert diff_battle_records(full, late) == [
+        RoundDifference(player_id, round_number, "missing_in_second")
+        for player_id in ("1001", "1002")
+        for round_number in (1, 2, 3)
+    ] + [RoundDifference("1002", 5, "changed", ("player_hp",))]
+
+
+def test_recorded_rounds_skip_snapshots(tmp_path):
+    # A late copy can hold snapshots of rounds its player records miss.
+    content = build_replay_bytes(rounds=6, first_round=4).replace(
+        b"<MatchSnapshotData>", b"<MatchSnapshotData><round>2</round>"
+    )
+    path = tmp_path / "late.grbr"
+    path.write_bytes(content)
+
+    assert recorded_rounds(path) == {0, 4, 5}
+
+
+def test_dedup_index(tmp_path):
+    late = write_copy(tmp_path / "late", rounds=8, first_round=5)
+    full = write_copy(tmp_path / "full", rounds=8)
+    other = write_copy(tmp_path / "other", match_id=654321)
+
+    with DedupIndex(tmp_path / "index.sqlite") as index:
+        first = index.add(late)
+        assert not first.duplicate
+        assert first.canonical == str(late)
+
+        second = index.add(full)
+        assert second.duplicate
+        assert second.canonical == str(full)
+        assert second.fingerprint == first.fingerprint
+        assert second.rounds > first.rounds
+
+        assert not index.add(other).duplicate
+        # Adding a known replay again does not make it its own duplicate.
+        assert not index.add(other).duplicate
+        assert list(index.duplicates()) == [(first.fingerprint, [str(full), str(late)])]
+        assert index.merged(first.fingerprint) == parse_battle_record(full)
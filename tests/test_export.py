@@ -0,0 +1,56 @@
+import pytest
+
+from mechabellum_replay_parser import parse_battle_record
+from mechabellum_replay_parser.export import (
+    INT_NULL,
+    TABLES,
+    ColumnarWriter,
+    battle_record_rows,
+    read_columns,
+)
+
+
+def test_battle_record_rows(replay_path):
+    battle_record = parse_battle_record(replay_path)
+    rows = battle_record_rows("replay", battle_record)
+
+    assert {name: len(row) for name in rows for row in rows[name][:1]} == {
+        name: len(columns) for name, columns in TABLES.items()
+    }
+    assert ("replay", "1001", "fang", 0, "Mechanical rage") in rows["techs"]
+    assert len(rows["rounds"]) == sum(
+        len(player.round_records) for player in battle_record.player_records
+    )
+    drops = [row for row in rows["actions"] if row[4] == "UnitDrop"]
+    assert drops[0][5:9] == ("phoenix", None, 2, 2)
+
+
+def test_columns_format_appends(tmp_path, replay_path):
+    battle_record = parse_battle_record(replay_path)
+    for replay in ("first", "second"):
+        with ColumnarWriter(tmp_path, format="columns", batch_rows=7) as writer:
+            writer.write(replay, battle_record)
+
+    expected = battle_record_rows("first", battle_record)["actions"]
+    actions = read_columns(tmp_path, "actions")
+    assert actions["replay"] == ["first"] * len(expected) + ["second"] * len(expected)
+    assert list(actions["x"][: len(expected)]) == [
+        INT_NULL if row[10] is None else row[10] for row in expected
+    ]
+    assert actions["subject"][: len(expected)] == [row[5] for row in expected]
+
+
+@pytest.mark.parametrize("export_format", ["parquet", "arrow"])
+def test_arrow_formats(tmp_path, replay_path, export_format):
+    dataset = pytest.importorskip("pyarrow.dataset")
+    battle_record = parse_battle_record(replay_path)
+    with ColumnarWriter(tmp_path, format=export_format) as writer:
+        writer.write("first", battle_record)
+        writer.write("second", battle_record)
+
+    table = dataset.dataset(
+        tmp_path / "units", format="ipc" if export_format == "arrow" else "parquet"
+    ).to_table()
+    assert table.num_rows == 2 * len(
+        battle_record_rows("first", battle_record)["units"]
+    )
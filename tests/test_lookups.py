@@ -0,0 +1,70 @@
+import pytest
+
+import mechabellum_replay_parser
+from mechabellum_replay_parser import (
+    CARD_LOOKUP,
+    UNIT_LOOKUP,
+    LookupRegistry,
+    TechAction,
+    parse_battle_record,
+    scan_replay_header,
+)
+from mechabellum_replay_parser.lookups import LOOKUPS
+
+
+def test_module_level_tables_come_from_the_registry():
+    assert UNIT_LOOKUP is LOOKUPS.base.units
+    assert UNIT_LOOKUP[9] == "fang"
+    assert CARD_LOOKUP[0] == "Skip"
+    assert CARD_LOOKUP[13030001] == "Laser Sights"
+
+
+def test_marshal_cache_round_trips(tmp_path, monkeypatch):
+    first = LookupRegistry(cache_dir=tmp_path)
+    assert first.base == LOOKUPS.base
+    assert list(tmp_path.glob("lookups-*.marshal"))
+
+    second = LookupRegistry(cache_dir=tmp_path)
+
+    def fail():
+        raise AssertionError("data files read despite the cache")
+
+    monkeypatch.setattr(second, "_read_data_files", fail)
+    assert second.base == first.base
+
+
+@pytest.mark.parametrize(
+    "parse_kwargs", [{}, {"streaming": True}, {"lazy": True}, {"memory_map": True}]
+)
+@pytest.mark.parametrize(
+    "min_version, max_version, expected",
+    [(1571, None, "Frenzy"), (None, 1570, "Mechanical rage")],
+)
+def test_version_overrides(
+    monkeypatch, replay_path, parse_kwargs, min_version, max_version, expected
+):
+    registry = LookupRegistry()
+    registry.add_override({"techs": {10510: "Frenzy"}}, min_version, max_version)
+    monkeypatch.setattr(mechabellum_replay_parser, "LOOKUPS", registry)
+
+    battle_record = parse_battle_record(replay_path, **parse_kwargs)
+    actions = [
+        action
+        for round_record in battle_record.player_records[0].round_records
+        for action in round_record.actions
+    ]
+    assert TechAction("fang", expected) in actions
+
+
+def test_version_overrides_apply_to_header_scan(monkeypatch, replay_path):
+    registry = LookupRegistry()
+    registry.add_override({"officers": {20039: "Renamed Specialist"}}, 1571)
+    monkeypatch.setattr(mechabellum_replay_parser, "LOOKUPS", registry)
+
+    header = scan_replay_header(replay_path)
+    assert header.players[0].starting_officer == "Renamed Specialist"
+
+
+def test_unknown_override_table():
+    with pytest.raises(ValueError):
+        LookupRegistry().add_override({"spells": {}})
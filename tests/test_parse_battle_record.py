@@ -0,0 +1,297 @@
+import datetime
+import io
+import pickle
+import sys
+import tarfile
+import zipfile
+
+import pytest
+from synthetic import build_replay_bytes
+
+import mechabellum_replay_parser
+from mechabellum_replay_parser import (
+    ACTION_DECODERS,
+    ArchiveMember,
+    UnitDrop,
+    battle_record_to_string,
+    extract_xml,
+    extract_xml_view,
+    get_reinforce_rounds,
+    iter_archive_replays,
+    parse_battle_record,
+    register_action_decoder,
+    scan_replay_header,
+    write_battle_record,
+)
+
+
+@pytest.mark.parametrize(
+    "replay_kwargs",
+    [
+        {},
+        {"match_datas_first": True},
+        {"first_round": 3},  # Observer that joined late.
+    ],
+)
+def test_streaming_matches_tree_parser(tmp_path, replay_kwargs):
+    path = tmp_path / "replay.grbr"
+    path.write_bytes(build_replay_bytes(**replay_kwargs))
+
+    assert parse_battle_record(path, streaming=True) == parse_battle_record(path)
+
+
+def test_streaming_resolves_unit_drops(replay_path):
+    battle_record = parse_battle_record(replay_path, streaming=True)
+    round_4 = battle_record.player_records[0].round_records[4]
+    assert UnitDrop(2, 2, "phoenix", 4) in round_4.actions
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_registered_action_decoder(monkeypatch, replay_path, streaming):
+    monkeypatch.setattr(
+        mechabellum_replay_parser, "ACTION_DECODERS", dict(ACTION_DECODERS)
+    )
+    register_action_decoder(
+        "PAD_ActiveBlueprint",
+        lambda fields, context: ("blueprint", context.round_number, fields["ID"].text),
+    )
+
+    battle_record = parse_battle_record(replay_path, streaming=streaming)
+    assert ("blueprint", 2, "2") in battle_record.player_records[0].round_records[
+        2
+    ].actions
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_memory_map_matches_read(replay_path, streaming):
+    assert parse_battle_record(
+        replay_path, streaming=streaming, memory_map=True
+    ) == parse_battle_record(replay_path)
+
+
+def test_extract_xml_view_matches_extract_xml(replay_path):
+    with extract_xml_view(replay_path) as view:
+        assert bytes(view).decode("utf-8") == extract_xml(replay_path)
+
+
+def test_extract_xml_view_rejects_files_without_xml(tmp_path):
+    path = tmp_path / "empty.grbr"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        with extract_xml_view(path):
+            pass
+
+
+def write_archive(path, members):
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+    else:
+        with tarfile.open(path, "w:gz") as archive:
+            for name, content in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                archive.addfile(info, io.BytesIO(content))
+
+
+@pytest.mark.parametrize("source", ["bytes", "memoryview", "file", "zip", "tar.gz"])
+def test_parse_from_sources(tmp_path, replay_path, source):
+    content = replay_path.read_bytes()
+    if source == "bytes":
+        replay = content
+    elif source == "memoryview":
+        # Viewed as 32 bit integers, it is parsed as the bytes underneath.
+        replay = memoryview(bytearray(content + b"\0" * (-len(content) % 4))).cast("I")
+    elif source == "file":
+        replay = io.BytesIO(content)
+    else:
+        archive = tmp_path / f"replays.{source}"
+        write_archive(archive, {f"replays/{replay_path.name}": content})
+        replay = ArchiveMember(archive, f"replays/{replay_path.name}")
+
+    assert parse_battle_record(replay) == parse_battle_record(replay_path)
+    if source == "file":
+        replay.seek(0)
+    assert extract_xml(replay) == extract_xml(replay_path)
+    if source == "file":
+        replay.seek(0)
+    header = scan_replay_header(replay)
+    assert header.players == scan_replay_header(replay_path).players
+    # Only archive members keep a file name to read the match id from.
+    assert (header.match_id is not None) == (source in ("zip", "tar.gz"))
+
+
+@pytest.mark.parametrize("suffix", ["zip", "tar.gz"])
+def test_iter_archive_replays(tmp_path, suffix):
+    members = {
+        "a.grbr": build_replay_bytes(rounds=3),
+        "notes.txt": b"not a replay",
+        "more/b.grbr": build_replay_bytes(rounds=4),
+    }
+    archive = tmp_path / f"replays.{suffix}"
+    write_archive(archive, members)
+
+    assert list(iter_archive_replays(archive)) == [
+        ("a.grbr", members["a.grbr"]),
+        ("more/b.grbr", members["more/b.grbr"]),
+    ]
+    with pytest.raises(FileNotFoundError):
+        parse_battle_record(ArchiveMember(archive, "missing.grbr"))
+
+
+def test_iter_archive_replays_closes_tar_on_early_stop(tmp_path, monkeypatch):
+    archive = tmp_path / "replays.tar.gz"
+    write_archive(archive, {"a.grbr": b"first", "b.grbr": b"second"})
+    opened = []
+    open_tar = tarfile.open
+
+    def recording_open(*args, **kwargs):
+        opened.append(open_tar(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(tarfile, "open", recording_open)
+
+    replays = iter_archive_replays(archive)
+    assert next(replays) == ("a.grbr", b"first")
+    replays.close()
+
+    [tar_archive] = opened
+    assert tar_archive.closed
+    assert tar_archive.fileobj.closed
+
+
+def test_lazy_matches_eager(replay_path):
+    battle_record = parse_battle_record(replay_path, lazy=True)
+    player = battle_record.player_records[0]
+    assert "round_records" not in vars(player)
+    assert player.name == "Alice"
+
+    assert battle_record == parse_battle_record(replay_path)
+
+
+def test_lazy_deployments_without_round_access(replay_path):
+    eager = parse_battle_record(replay_path).player_records[1]
+    lazy = parse_battle_record(replay_path, lazy=True).player_records[1]
+    assert lazy.deployments == eager.deployments
+    assert lazy.starting_officer == eager.starting_officer
+
+
+def test_lazy_records_pickle(replay_path):
+    battle_record = parse_battle_record(replay_path, lazy=True)
+    assert pickle.loads(pickle.dumps(battle_record)) == parse_battle_record(replay_path)
+
+
+@pytest.mark.parametrize("first_round", [0, 3])
+def test_scan_replay_header_matches_full_parse(tmp_path, first_round):
+    path = tmp_path / "1571_20250101--123456_[Alice]VS[Bob].grbr"
+    path.write_bytes(build_replay_bytes(first_round=first_round))
+
+    header = scan_replay_header(path)
+    battle_record = parse_battle_record(path)
+
+    assert header.version == battle_record.version
+    assert header.date == datetime.date(2025, 1, 1)
+    assert header.match_id == "123456"
+    assert [
+        (player.id, player.name, player.starting_officer) for player in header.players
+    ] == [
+        (player.id, player.name, player.starting_officer)
+        for player in battle_record.player_records
+    ]
+
+
+def test_scan_replay_header_stops_after_players():
+    content = build_replay_bytes(players=("Alice", "Bob", "Carol"))
+
+    assert [player.name for player in scan_replay_header(content).players] == [
+        "Alice",
+        "Bob",
+    ]
+    assert [
+        player.name for player in scan_replay_header(content, players=None).players
+    ] == ["Alice", "Bob", "Carol"]
+    # Bytes past the second player's header are never looked at.
+    start = content.index(b"<name>Bob</name>")
+    end = content.index(b"</PlayerRecord>", start)
+    truncated = content[:end] + b"</playerRecords></BattleRecord>"
+    assert scan_replay_header(truncated).players == scan_replay_header(content).players
+
+
+@pytest.mark.parametrize(
+    "reinforce_rounds, rounds, expected",
+    [((4,), 6, [4]), ((2, 4, 9), 6, [2, 4]), ((), 6, [])],
+)
+@pytest.mark.parametrize("window", [None, 40])
+def test_get_reinforce_rounds(
+    monkeypatch, tmp_path, reinforce_rounds, rounds, expected, window
+):
+    if window is not None:
+        # Small enough for the tag to cross window boundaries.
+        monkeypatch.setattr(mechabellum_replay_parser, "REVERSE_SCAN_WINDOW", window)
+    path = tmp_path / "replay.grbr"
+    path.write_bytes(
+        build_replay_bytes(rounds=rounds, reinforce_rounds=reinforce_rounds)
+    )
+    assert get_reinforce_rounds(path) == expected
+
+
+@pytest.mark.parametrize("match_datas_first", [False, True])
+def test_reinforce_rounds_ignore_elements_outside_match_datas(
+    tmp_path, match_datas_first
+):
+    content = build_replay_bytes(match_datas_first=match_datas_first)
+    # A list of the same name after the snapshots, but not inside matchDatas.
+    decoy = b"<unitReinforceRounds><int>2</int></unitReinforceRounds>"
+    head, tag, tail = content.rpartition(b"</BattleRecord>")
+    path = tmp_path / "replay.grbr"
+    path.write_bytes(head + decoy + tag + tail)
+
+    assert get_reinforce_rounds(path) == [4]
+    for streaming in (False, True):
+        battle_record = parse_battle_record(path, streaming=streaming)
+        drops = [
+            action
+            for round_record in battle_record.player_records[0].round_records
+            for action in round_record.actions
+            if isinstance(action, UnitDrop)
+        ]
+        assert [drop.round for drop in drops] == [4]
+
+
+@pytest.mark.parametrize("players", [("Alice", "Bob"), ("玩家", "Bob"), ("", "Bob")])
+def test_write_battle_record(tmp_path, players):
+    path = tmp_path / "replay.grbr"
+    path.write_bytes(build_replay_bytes(rounds=5, players=players))
+    battle_record = parse_battle_record(path)
+    # A player missing the last rounds leaves empty cells.
+    del battle_record.player_records[1].round_records[3:]
+
+    output = io.StringIO()
+    write_battle_record(battle_record, output)
+    assert output.getvalue() == f"{battle_record_to_string(battle_record)}\n"
+
+    output = io.StringIO()
+    write_battle_record(battle_record, output, plain=True)
+    lines = output.getvalue().splitlines()
+    assert len(lines) == 2 * 5
+    # An empty name is read as None and shown as such, as in the table.
+    name = battle_record.player_records[0].name
+    assert lines[2] == (
+        f"1 {name}: HP: 3900; Buy fang; Upgrade fang; Tech fang Mechanical rage; "
+        "Research Tower Field Recovery; Use Skill: Field Recovery 0; "
+        "Select Card: Laser Sights; Deployment Total: 5; Value on board: 600"
+    )
+    assert lines[-1] == "4 Bob: "
+
+
+def test_write_battle_record_without_wcwidth(tmp_path, monkeypatch):
+    path = tmp_path / "replay.grbr"
+    path.write_bytes(build_replay_bytes(rounds=3, players=("玩家", "プレイヤー")))
+    battle_record = parse_battle_record(path)
+    expected = f"{battle_record_to_string(battle_record)}\n"
+    monkeypatch.setitem(sys.modules, "wcwidth", None)
+
+    output = io.StringIO()
+    write_battle_record(battle_record, output)
+    assert output.getvalue() == expected
@@ -0,0 +1,46 @@
+import pytest
+
+from mechabellum_replay_parser import ParseProfile, parse_battle_record
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_profile_records_stages_and_counts(replay_path, streaming):
+    profile = ParseProfile()
+    battle_record = parse_battle_record(
+        replay_path, streaming=streaming, profile=profile
+    )
+
+    round_count = sum(len(p.round_records) for p in battle_record.player_records)
+    action_count = sum(
+        len(r.actions) for p in battle_record.player_records for r in p.round_records
+    )
+    assert profile.file_path == str(replay_path)
+    assert profile.stages["extract_xml"].calls == 1
+    assert profile.stages["player_rounds"].calls == round_count
+    assert profile.stages["actions"].calls == round_count
+    assert profile.stages["deployments"].calls == len(battle_record.player_records)
+    assert profile.stages["fromstring" if not streaming else "feed"].calls == 1
+    assert profile.counters["actions"] == action_count
+    assert profile.wall_ns >= profile.stages["player_rounds"].wall_ns > 0
+    assert profile.metrics()["count.actions"] == action_count
+
+
+def test_profiles_match_between_parsers(replay_path):
+    tree, streaming = ParseProfile(), ParseProfile()
+    parse_battle_record(replay_path, profile=tree)
+    parse_battle_record(replay_path, streaming=True, profile=streaming)
+    assert tree.counters == streaming.counters
+
+
+def test_profile_callback(replay_path, tmp_path):
+    profiles = []
+    parse_battle_record(replay_path, profile=profiles.append)
+    assert len(profiles) == 1
+    assert profiles[0].counters["elements"] > 0
+
+    broken = tmp_path / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+    with pytest.raises(ValueError):
+        parse_battle_record(broken, profile=profiles.append)
+    assert len(profiles) == 2
+    assert "fromstring" not in profiles[1].stages
@@ -0,0 +1,71 @@
+import statistics
+import sys
+from pathlib import Path
+
+import pytest
+from synthetic import build_replay_bytes, replay_file_name
+
+from mechabellum_replay_parser import parse_battle_record
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+import stats
+
+
+@pytest.fixture
+def replay_directory(tmp_path: Path) -> Path:
+    replays = [
+        (3, 4, ("Alice", "Bob")),
+        (5, 2, ("Alice", "Carol")),
+        (4, 3, ("Bob", "Carol")),
+    ]
+    for match_id, (rounds, unit_count, players) in enumerate(replays):
+        (tmp_path / replay_file_name(match_id=match_id, players=players)).write_bytes(
+            build_replay_bytes(rounds=rounds, unit_count=unit_count, players=players)
+        )
+    return tmp_path
+
+
+def _table_rows(output: str):
+    rows = [
+        tuple(cell.strip() for cell in line.split(" | "))
+        for line in output.splitlines()
+        if line.count(" | ") == 3
+    ]
+    return rows[1:]
+
+
+def _last_round_rows(directory: Path, player_filter=None):
+    """The rows as the report worked them out before the positions became columns."""
+    rows = []
+    for path in directory.glob("*.grbr"):
+        battle_record = parse_battle_record(path)
+        if player_filter and all(
+            player.name != player_filter for player in battle_record.player_records
+        ):
+            continue
+        for player in battle_record.player_records:
+            y_positions = [
+                abs(unit.position.y)
+                for unit in player.deployments.units[-1].units.values()
+                if unit.position
+            ]
+            mean_y = statistics.mean(y_positions)
+            style = "aggro" if mean_y < stats.AGGRO_MEAN_Y_DISTANCE else "standard"
+            rows.append((path.name, player.name, str(round(mean_y, 2)), style))
+    return rows
+
+
+@pytest.mark.parametrize("player_filter", [None, "Carol"])
+def test_report_without_numpy(replay_directory, monkeypatch, capsys, player_filter):
+    monkeypatch.setattr(stats, "numpy", None)
+
+    stats.process_replay_files(
+        str(replay_directory), player_filter=player_filter, workers=1
+    )
+
+    output = capsys.readouterr().out
+    assert sorted(_table_rows(output)) == sorted(
+        _last_round_rows(replay_directory, player_filter)
+    )
+    replays = 3 if player_filter is None else 2
+    assert f"Successful: {replays}\n" in output
@@ -0,0 +1,27 @@
+from synthetic import write_replays
+
+from mechabellum_replay_parser import (
+    REPLAY_FILE_NAME_REGEX,
+    ReinforcementSelection,
+    UnitDrop,
+    parse_battle_record,
+    scan_replay_header,
+)
+
+
+def test_write_replays(tmp_path):
+    paths = write_replays(
+        tmp_path, 3, rounds=10, unit_count=7, actions_per_round=20, first_round=4
+    )
+    assert len(paths) == 3
+    assert all(REPLAY_FILE_NAME_REGEX.match(path.name) for path in paths)
+
+    battle_record = parse_battle_record(paths[0])
+    player = battle_record.player_records[0]
+    assert [r.round for r in player.round_records] == [0, 4, 5, 6, 7, 8, 9]
+    assert [len(r.starting_units.units) for r in player.round_records] == [7] * 7
+    # The reinforcement choice comes on top of actions_per_round.
+    assert len(player.round_records[1].actions) == 21
+    assert isinstance(player.round_records[1].actions[-1], UnitDrop)
+    assert isinstance(player.round_records[2].actions[-1], ReinforcementSelection)
+    assert scan_replay_header(paths[0]).match_id == "100000"
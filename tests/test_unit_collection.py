@@ -0,0 +1,135 @@
+import pickle
+
+import pytest
+
+from mechabellum_replay_parser import (
+    DeploymentTracker,
+    Point,
+    Unit,
+    UnitAdded,
+    UnitCollection,
+    UnitMoved,
+    UnitRemoved,
+    parse_battle_record,
+)
+
+
+def test_copy_shares_units_until_changed():
+    units = UnitCollection()
+    units.add_unit(Unit.from_name("fang"))
+    units.add_unit(Unit.from_name("crawler"))
+
+    snapshot = units.copy()
+    assert snapshot.units is units.units
+
+    snapshot.move_unit(0, Point(10, 20))
+    snapshot.add_unit(Unit.from_name("arclight"))
+    snapshot.delete_unit(1)
+
+    assert snapshot.units is not units.units
+    assert units.get_unit(0).position == Point(0, 0)
+    assert snapshot.get_unit(0).position == Point(10, 20)
+    assert [unit.unit_name for unit in units.units.values()] == ["fang", "crawler"]
+    assert [unit.unit_name for unit in snapshot.units.values()] == ["fang", "arclight"]
+
+
+def test_original_changes_do_not_leak_into_copies():
+    units = UnitCollection()
+    units.add_unit(Unit.from_name("fang"))
+    snapshot = units.copy()
+
+    units.add_unit(Unit.from_name("crawler"))
+
+    assert 1 not in snapshot
+    assert snapshot.next_index == 1
+
+
+def test_units_are_slotted():
+    unit = Unit.from_name("fang")
+    assert not hasattr(unit, "__dict__")
+    assert not hasattr(unit.position, "__dict__")
+
+
+@pytest.mark.parametrize(
+    "version, round_number",
+    [("1502", 2), ("1503", 2), ("1527", 2), ("1528", 1), ("1532", 1), ("1533", 3)],
+)
+def test_special_case_spawns_by_version(version, round_number):
+    for round_to_check in range(1, 5):
+        units = UnitCollection()
+        DeploymentTracker._pre_action_unit_setup(
+            version, round_to_check, "Sabertooth Specialist", units
+        )
+        expected = ["sabertooth"] if round_to_check == round_number else []
+        assert [unit.unit_name for unit in units.units.values()] == expected
+
+
+def test_special_case_spawns_are_new_units():
+    first, second = UnitCollection(), UnitCollection()
+    for units in (first, second):
+        DeploymentTracker._pre_action_unit_setup(
+            "1571", 2, "Marksman Specialist", units
+        )
+
+    assert first.get_unit(0) == second.get_unit(0)
+    assert first.get_unit(0) is not second.get_unit(0)
+    assert first.get_unit(0).sell_supply == 200
+
+
+def test_deployment_boards_rebuilt_from_deltas(replay_path):
+    player = parse_battle_record(replay_path).player_records[0]
+    tracker = player.deployments
+    boards = list(tracker.units)
+
+    assert len(boards) == len(player.round_records)
+    # Every round buys a fang, sells unit 0 with Field Recovery and moves unit 1.
+    assert [type(delta) for delta in tracker.deltas[2]] == [
+        UnitAdded,
+        UnitRemoved,
+        UnitMoved,
+    ]
+    assert tracker.keyframes[2] is player.round_records[2].starting_units
+    for record_number in (3, 0, -1, 1):
+        assert tracker.board(record_number) == boards[record_number]
+    assert boards[2].get_unit(1).position == Point(5, -42)
+    assert boards[2].get_unit(boards[2].next_index - 1).unit_name == "fang"
+
+    unpickled = pickle.loads(pickle.dumps(tracker))
+    assert unpickled == tracker
+    assert list(unpickled.units) == boards
+
+
+def test_deployment_tracker_extend(replay_path):
+    player = parse_battle_record(replay_path).player_records[0]
+    records = player.round_records
+
+    tracker = DeploymentTracker.from_record_list(
+        player.version, player.starting_officer, records[:3]
+    )
+    tracker.extend(records[3:])
+
+    assert tracker == player.deployments
+    assert list(tracker.units) == list(player.deployments.units)
+
+
+def test_deployment_tracker_accepts_boards_as_units(replay_path):
+    boards = list(parse_battle_record(replay_path).player_records[0].deployments.units)
+
+    tracker = DeploymentTracker([5], [700], boards)
+
+    assert list(tracker.units) == boards
+    assert tracker.deltas == [[] for _ in boards]
+    tracker.units = boards[:2]
+    assert list(tracker.units) == boards[:2]
+
+
+def test_deployment_board_changes_leave_tracker_alone(replay_path):
+    tracker = parse_battle_record(replay_path).player_records[0].deployments
+    expected = tracker.board(2).units.copy()
+
+    for board in (tracker.board(2), tracker.board(2)):
+        board.add_unit(board.get_unit(0))
+        board.delete_unit(1)
+
+    assert tracker.board(2).units == expected
+    assert tracker.units[2].units == expected
@@ -0,0 +1,161 @@
+import os
+import time
+from functools import partial
+
+from synthetic import build_replay_bytes
+
+from mechabellum_replay_parser import BattleRecord, parse_battle_record
+from mechabellum_replay_parser.watch import ReplayWatcher, WatchManifest
+
+
+def make_watcher(tmp_path, results, **kwargs):
+    return ReplayWatcher(
+        tmp_path / "replays",
+        lambda path, result: results.append((path, result)),
+        tmp_path / "manifest.sqlite",
+        workers=1,
+        settle_seconds=0,
+        **kwargs,
+    )
+
+
+def test_watcher_parses_new_replays_once(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    first = directory / "first.grbr"
+    first.write_bytes(build_replay_bytes())
+    (directory / "notes.txt").write_text("not a replay")
+
+    results = []
+    with make_watcher(tmp_path, results) as watcher:
+        # Seen once, parsed on the next poll after its size and mtime held.
+        assert watcher.poll() == 0
+        assert watcher.poll() == 1
+        assert watcher.poll() == 0
+
+    assert results == [(str(first), parse_battle_record(first))]
+
+    second = directory / "second.grbr"
+    second.write_bytes(build_replay_bytes(rounds=5))
+    results = []
+    with make_watcher(tmp_path, results) as watcher:
+        watcher.poll()
+        watcher.poll()
+    assert [path for path, _ in results] == [str(second)]
+
+
+def test_watcher_waits_for_copies_to_finish(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    content = build_replay_bytes()
+    replay = directory / "replay.grbr"
+    replay.write_bytes(content[:100])
+
+    results = []
+    with make_watcher(tmp_path, results) as watcher:
+        watcher.poll()
+        with open(replay, "ab") as file:
+            file.write(content[100:])
+        # The directory did not change, the growing file is still picked up.
+        assert watcher.poll() == 0
+        assert watcher.poll() == 1
+
+    [(_path, battle_record)] = results
+    assert isinstance(battle_record, BattleRecord)
+
+
+def test_watcher_records_failures_until_changed(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    broken = directory / "broken.grbr"
+    broken.write_bytes(b"not a replay")
+
+    results = []
+    with make_watcher(tmp_path, results, full_scan_interval=0) as watcher:
+        watcher.poll()
+        watcher.poll()
+        watcher.poll()
+        assert [type(result) for _, result in results] == [ValueError]
+        assert list(watcher.manifest.errors()) == ["broken.grbr"]
+
+        broken.write_bytes(build_replay_bytes())
+        os.utime(broken, ns=(0, 0))
+        watcher.poll()
+        watcher.poll()
+        assert isinstance(results[-1][1], BattleRecord)
+        assert watcher.manifest.errors() == {}
+
+
+def test_skip_existing(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    (directory / "old.grbr").write_bytes(build_replay_bytes())
+
+    results = []
+    with make_watcher(tmp_path, results) as watcher:
+        assert watcher.skip_existing() == 1
+        watcher.poll()
+        watcher.poll()
+    assert results == []
+    with WatchManifest(tmp_path / "manifest.sqlite") as manifest:
+        assert list(manifest.files) == ["old.grbr"]
+
+
+def test_directory_changes_only_stat_new_files(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    known = directory / "known.grbr"
+    known.write_bytes(build_replay_bytes())
+
+    results = []
+    with make_watcher(tmp_path, results) as watcher:
+        watcher.poll()
+        watcher.poll()
+        known.write_bytes(build_replay_bytes(rounds=5))
+        new = directory / "new.grbr"
+        new.write_bytes(build_replay_bytes())
+        watcher.poll()
+        watcher.poll()
+        # The rewritten replay waits for the next full scan.
+        assert [path for path, _ in results] == [str(known), str(new)]
+
+        watcher.full_scan_interval = 0
+        watcher.poll()
+        watcher.poll()
+        assert [path for path, _ in results[2:]] == [str(known)]
+
+
+def test_manifest_writes_leave_the_directory_mtime_alone(tmp_path):
+    with WatchManifest(tmp_path / "manifest.sqlite") as manifest:
+        manifest.record([("first.grbr", (1, 1), None)])
+        directory_mtime = os.stat(tmp_path).st_mtime_ns
+        time.sleep(0.05)
+        manifest.record([("second.grbr", (1, 1), None)])
+        assert os.stat(tmp_path).st_mtime_ns == directory_mtime
+
+
+def _exit_once(marker, battle_record):
+    try:
+        os.unlink(marker)
+    except FileNotFoundError:
+        return battle_record.player_records[0].name
+    os._exit(1)
+
+
+def test_watcher_replaces_a_broken_pool(tmp_path):
+    directory = tmp_path / "replays"
+    directory.mkdir()
+    replay = directory / "replay.grbr"
+    replay.write_bytes(build_replay_bytes())
+    marker = tmp_path / "exit"
+    marker.touch()
+
+    results = []
+    transform = partial(_exit_once, str(marker))
+    with make_watcher(tmp_path, results, transform=transform) as watcher:
+        watcher.workers = 2
+        watcher.poll()
+        assert watcher.poll() == 0
+        assert not marker.exists()
+        assert watcher.poll() == 1
+    assert results == [(str(replay), "Alice")]